@@ -0,0 +1,1294 @@
+"""
+Banc de charge hors-ligne pour Coinsbot.
+
+Appelle directement les callbacks des commandes de main.py avec de fausses
+interactions Discord, contre une base SQLite temporaire (aucune connexion
+Discord). Exemple :
+
+    python loadtest.py commands --concurrency 50 --duration 10
+    python loadtest.py commands --mix daily,slots,bj --users 200 --json
+    python loadtest.py commands --store memory
+    python loadtest.py locks --tasks 500 --hold-ms 2
+    python loadtest.py clan-economy --clans 100000
+    python loadtest.py backup --fill-rows 500000 --pages 256
+    python loadtest.py chat --rate 10000 --users 20000
+    python loadtest.py reminders --reminders 1000000 --spread 21600
+    python loadtest.py drop --clicks 5000 --users 2000 --winners 100
+    python loadtest.py seasons --rows 1000000 --days 60 --store sqlite
+    python loadtest.py embeds --iterations 100000
+"""
+import os
+import sys
+import json
+import atexit
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import subprocess
+import threading
+import tempfile
+import resource
+import timeit
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Optional, Dict, List, Callable, Awaitable
+
+import discord
+
+import main
+
+
+# =========================
+# STUBS DISCORD
+# =========================
+class FakeAsset:
+    def __init__(self, url: str):
+        self.url = url
+
+
+class FakePermissions:
+    def __init__(self, administrator: bool = False):
+        self.administrator = administrator
+
+
+class FakeMember:
+    def __init__(self, user_id: int, admin: bool = False):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.display_name = f"Joueur {user_id}"
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+        self.display_avatar = FakeAsset(f"https://cdn.example/avatars/{user_id}.png")
+        self.guild_permissions = FakePermissions(administrator=admin)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int = 1):
+        self.id = guild_id
+        self.members: Dict[int, FakeMember] = {}
+
+    def member(self, user_id: int) -> FakeMember:
+        m = self.members.get(user_id)
+        if m is None:
+            m = self.members[user_id] = FakeMember(user_id)
+        return m
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        return self.members.get(user_id)
+
+    async def fetch_member(self, user_id: int) -> FakeMember:
+        return self.member(user_id)
+
+
+# latence simulée d'un aller-retour vers l'API Discord (0 = simple cession de la boucle)
+API_LATENCY = 0.0
+# tours par session pour l'opération autoplay
+AUTOPLAY_ROUNDS = 20
+
+
+async def fake_api_call():
+    await asyncio.sleep(API_LATENCY)
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content=None, *, embed=None, view=None, file=None, ephemeral=False, **kwargs):
+        self._done = True
+        self._interaction._record(content, embed, view, ephemeral)
+        await fake_api_call()
+
+    async def edit_message(self, *, content=None, embed=None, view=None, **kwargs):
+        self._done = True
+        self._interaction._record(content, embed, view, False)
+        await fake_api_call()
+
+    async def defer(self, *, ephemeral=False, thinking=False):
+        self._done = True
+        await fake_api_call()
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content=None, *, embed=None, view=None, file=None, ephemeral=False, **kwargs):
+        self._interaction._record(content, embed, view, ephemeral)
+        await fake_api_call()
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeMember, guild: Optional[FakeGuild]):
+        self.user = user
+        self.guild = guild
+        self.guild_id = guild.id if guild else None
+        self.channel_id = None
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.last_view: Optional[discord.ui.View] = None
+        self.last_embed: Optional[discord.Embed] = None
+        self.ephemeral = False
+
+    def _record(self, content, embed, view, ephemeral):
+        if embed is not None:
+            self.last_embed = embed
+        if view is not None:
+            self.last_view = view
+        self.ephemeral = ephemeral
+
+
+# =========================
+# SCÉNARIOS
+# =========================
+@dataclass
+class World:
+    guild: FakeGuild
+    users: List[int]
+    rng: random.Random
+
+    def interaction(self, user_id: int) -> FakeInteraction:
+        return FakeInteraction(self.guild.member(user_id), self.guild)
+
+
+async def op_daily(w: World, uid: int):
+    await main.daily.callback(w.interaction(uid))
+
+
+async def op_collect(w: World, uid: int):
+    await main.collect.callback(w.interaction(uid))
+
+
+async def op_roulette(w: World, uid: int):
+    choix = w.rng.choice(["rouge", "noir", str(w.rng.randint(0, 36))])
+    await main.roulette.callback(w.interaction(uid), mise=10, choix=choix)
+
+
+async def op_roulette_slip(w: World, uid: int):
+    choix = f"rouge:10 {w.rng.randint(0, 36)}:5 d{w.rng.randint(1, 3)}:5 impair:10"
+    await main.roulette.callback(w.interaction(uid), choix=choix)
+
+
+async def op_autoplay(w: World, uid: int):
+    # une session de AUTOPLAY_ROUNDS tours = une interaction, une écriture
+    game = w.rng.choice(["roulette", "slots", "cf"])
+    if game == "roulette":
+        await main.roulette.callback(w.interaction(uid), choix="rouge", mise=10, tours=AUTOPLAY_ROUNDS)
+    else:
+        await getattr(main, game).callback(w.interaction(uid), mise=10, tours=AUTOPLAY_ROUNDS)
+
+
+async def op_slots(w: World, uid: int):
+    await main.slots.callback(w.interaction(uid), mise=10)
+
+
+async def op_cf(w: World, uid: int):
+    await main.cf.callback(w.interaction(uid), mise=10)
+
+
+async def op_bj(w: World, uid: int):
+    inter = w.interaction(uid)
+    await main.bj.callback(inter, mise=10)
+    view = inter.last_view
+    if not isinstance(view, main.BlackjackView):
+        return
+    if w.rng.random() < 0.5:
+        await view.hit.callback(w.interaction(uid))
+    if not view.is_finished():
+        await view.stand.callback(w.interaction(uid))
+
+
+async def op_mines(w: World, uid: int):
+    inter = w.interaction(uid)
+    await main.mines.callback(inter, mise=10)
+    view = inter.last_view
+    if not isinstance(view, main.MinesView):
+        return
+    for pos in w.rng.sample(range(1, 10), w.rng.randint(1, 4)):
+        if view.is_finished():
+            return
+        await view._reveal(w.interaction(uid), pos)
+    if not view.is_finished():
+        await view.claim.callback(w.interaction(uid))
+
+
+async def op_profil(w: World, uid: int):
+    await main.profil.callback(w.interaction(uid))
+
+
+async def op_top(w: World, uid: int):
+    await main.top.callback(w.interaction(uid), limit=10)
+
+
+async def op_clan(w: World, uid: int):
+    # un cycle complet : création, invitation, dépôt, infos, retrait, suppression
+    owner, guest = uid, uid + 10_000_000
+    name = f"c{uid}-{w.rng.randrange(1_000_000)}"
+    await main.clan_create.callback(w.interaction(owner), nom=name[:20])
+    await main.clan_invite.callback(w.interaction(owner), membre=w.guild.member(guest))
+    await main.clan_accept.callback(w.interaction(guest))
+    await main.clan_deposit.callback(w.interaction(guest), montant=50)
+    await main.clan_info.callback(w.interaction(owner))
+    await main.clan_withdraw.callback(w.interaction(owner), montant=25)
+    await main.clan_delete.callback(w.interaction(owner))
+
+
+OPS: Dict[str, Callable[[World, int], Awaitable[None]]] = {
+    "daily": op_daily,
+    "collect": op_collect,
+    "roulette": op_roulette,
+    "roulette_slip": op_roulette_slip,
+    "autoplay": op_autoplay,
+    "slots": op_slots,
+    "cf": op_cf,
+    "bj": op_bj,
+    "mines": op_mines,
+    "clan": op_clan,
+    "profil": op_profil,
+    "top": op_top,
+}
+
+DEFAULT_MIX = "daily,roulette,slots,bj,mines,clan,profil"
+
+
+# =========================
+# MESURES
+# =========================
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+@dataclass
+class Stats:
+    latencies: Dict[str, List[float]] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    loop_lag: List[float] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def record(self, name: str, seconds: float):
+        self.latencies.setdefault(name, []).append(seconds)
+
+    def summary(self) -> dict:
+        total = sum(len(v) for v in self.latencies.values())
+        out = {
+            "elapsed_s": round(self.elapsed, 3),
+            "ops": total,
+            "throughput_ops_s": round(total / self.elapsed, 1) if self.elapsed else 0.0,
+            "loop_lag_ms": {
+                "p50": round(percentile(self.loop_lag, 50) * 1000, 2),
+                "p99": round(percentile(self.loop_lag, 99) * 1000, 2),
+                "max": round(max(self.loop_lag, default=0.0) * 1000, 2),
+            },
+            "commands": {},
+        }
+        for name, lat in sorted(self.latencies.items()):
+            out["commands"][name] = {
+                "ops": len(lat),
+                "errors": self.errors.get(name, 0),
+                "p50_ms": round(percentile(lat, 50) * 1000, 2),
+                "p99_ms": round(percentile(lat, 99) * 1000, 2),
+            }
+        return out
+
+
+async def monitor_loop_lag(stats: Stats, interval: float, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        stats.loop_lag.append(max(0.0, loop.time() - start - interval))
+
+
+def print_summary(title: str, summary: dict):
+    store = summary.get("config", {}).get("store")
+    print(f"== {title}" + (f" [{store}]" if store else ""))
+    print(
+        f"{summary['ops']} ops en {summary['elapsed_s']}s → {summary['throughput_ops_s']} ops/s | "
+        f"lag boucle p50 {summary['loop_lag_ms']['p50']} ms, p99 {summary['loop_lag_ms']['p99']} ms, "
+        f"max {summary['loop_lag_ms']['max']} ms"
+    )
+    print(f"{'commande':<12}{'ops':>8}{'err':>6}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, c in summary["commands"].items():
+        print(f"{name:<12}{c['ops']:>8}{c['errors']:>6}{c['p50_ms']:>10}{c['p99_ms']:>10}")
+    for ev in summary.get("events", ()):
+        if ev["events"] or ev["inline"]:
+            print(
+                f"  bus {ev['name']:<13}{ev['events']:>7} évts en {ev['batches']} lots, "
+                f"{ev['inline']} en ligne, {ev['dropped']} ignorés, {ev['errors']} erreurs"
+            )
+
+
+# =========================
+# ENVIRONNEMENT
+# =========================
+class PgStandIn:
+    """Connexion SQLite qui accepte les paramètres %s : doublure locale de PostgreSQL."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+
+    def execute(self, sql: str, params: tuple = ()):
+        if sql.startswith("LOCK TABLE"):
+            # SQLite n'a qu'un écrivain : aucune transaction en vol à attendre
+            return self.conn.execute("SELECT 1")
+        return self.conn.execute(sql.replace("%s", "?"), params)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+
+STORES = ("sqlite", "memory", "postgres-standin", "remote")
+
+
+def start_store_daemon(path: str) -> str:
+    # démon de stockage dans un process à part, arrêté en fin de banc
+    sock = os.path.join(os.path.dirname(path), "store.sock")
+    proc = subprocess.Popen(
+        [sys.executable, main.__file__, "--db", path, "store-daemon", "--socket", sock],
+        stdout=subprocess.DEVNULL,
+    )
+    atexit.register(proc.terminate)
+    for _ in range(100):
+        if os.path.exists(sock):
+            return sock
+        time.sleep(0.05)
+    raise SystemExit("démon de stockage non démarré")
+
+
+def setup_db(path: Optional[str] = None, store: str = "sqlite") -> str:
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="coinsbot-bench-"), "bench.sqlite3")
+    main.DB_PATH = path
+    main.db_init()
+    if store == "memory":
+        main.STORE = main.MemoryStore()
+    elif store == "remote":
+        main.STORE = main.RemoteStore(start_store_daemon(path))
+    elif store == "postgres-standin":
+        main.STORE = main.PostgresStore(connect=lambda: PgStandIn(path), integrity_error=sqlite3.IntegrityError)
+    else:
+        main.STORE = main.SqliteStore()
+    main.STORE.init()
+    main.CLANS.load()
+    return path
+
+
+def disable_cooldowns():
+    # sinon /daily et /collect ne mesurent plus que le refus après le 1er appel
+    main.CD_DAILY = 0
+    main.CD_COLLECT = 0
+    main.CD_GIFT = 0
+
+
+def seed_users(users: List[int], balance: int):
+    for uid in users:
+        main.STORE.set_balance(uid, balance)
+
+
+# =========================
+# COMMANDES DU BANC
+# =========================
+async def drive_commands(world: World, mix: List[str], args) -> Stats:
+    # concurrency workers tirent des commandes du mix jusqu'à duration / requests
+    stats = Stats()
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(stats, args.lag_interval, stop))
+    deadline = time.perf_counter() + args.duration
+    remaining = [args.requests] if args.requests else None
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            if remaining is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            name = world.rng.choice(mix)
+            uid = world.rng.choice(world.users)
+            t0 = time.perf_counter()
+            try:
+                await OPS[name](world, uid)
+            except Exception:
+                stats.errors[name] = stats.errors.get(name, 0) + 1
+                if args.verbose:
+                    raise
+            stats.record(name, time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    stats.elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+    return stats
+
+
+async def run_commands(args) -> dict:
+    global API_LATENCY
+    API_LATENCY = args.api_latency / 1000.0
+    mix = [name.strip() for name in args.mix.split(",") if name.strip()]
+    unknown = [name for name in mix if name not in OPS]
+    if unknown:
+        raise SystemExit(f"opérations inconnues : {', '.join(unknown)} (dispo : {', '.join(OPS)})")
+
+    path = setup_db(args.db, args.store)
+    if not args.keep_cooldowns:
+        disable_cooldowns()
+
+    rng = random.Random(args.seed)
+    users = list(range(1_000, 1_000 + args.users))
+    seed_users(users, args.balance)
+    world = World(guild=FakeGuild(), users=users, rng=rng)
+
+    if not args.inline_events:
+        main.EVENTS.start()
+    stats = await drive_commands(world, mix, args)
+    await main.EVENTS.stop()
+    summary = stats.summary()
+    summary["events"] = main.EVENTS.stats()
+    summary["config"] = {
+        "mix": mix,
+        "concurrency": args.concurrency,
+        "users": args.users,
+        "api_latency_ms": args.api_latency,
+        "store": args.store,
+        "inline_events": args.inline_events,
+        "db": path,
+    }
+    return summary
+
+
+async def run_locks(args) -> dict:
+    # contention du registre de verrous : même joueur, joueurs distincts, paires ordonnées (/give)
+    hold = args.hold_ms / 1000.0
+    rng = random.Random(args.seed)
+    results = {}
+
+    async def bench(name: str, pick_keys):
+        locks = main.KeyedLocks()
+        waits: List[float] = []
+
+        async def worker(w: int):
+            for _ in range(args.ops):
+                keys = pick_keys(w)
+                t0 = time.perf_counter()
+                if keys is None:
+                    waits.append(0.0)
+                    await asyncio.sleep(hold)
+                    continue
+                async with locks.hold(*keys):
+                    waits.append(time.perf_counter() - t0)
+                    await asyncio.sleep(hold)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(args.tasks)))
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            "ops": len(waits),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_ops_s": round(len(waits) / elapsed, 1),
+            "wait_p50_ms": round(percentile(waits, 50) * 1000, 3),
+            "wait_p99_ms": round(percentile(waits, 99) * 1000, 3),
+            "live_locks_after": len(locks),
+        }
+
+    await bench("sans verrou", lambda w: None)
+    await bench("1 joueur", lambda w: (1,))
+    await bench("joueurs distincts", lambda w: (w,))
+    await bench("paires ordonnées", lambda w: tuple(rng.sample(range(args.pair_users), 2)))
+    return {"config": {"tasks": args.tasks, "ops": args.ops, "hold_ms": args.hold_ms}, "scenarios": results}
+
+
+def print_locks(title: str, summary: dict):
+    print(f"== {title} ({summary['config']})")
+    print(f"{'scénario':<20}{'ops/s':>10}{'attente p50':>14}{'attente p99':>14}{'verrous':>9}")
+    for name, r in summary["scenarios"].items():
+        print(f"{name:<20}{r['throughput_ops_s']:>10}{r['wait_p50_ms']:>12}ms{r['wait_p99_ms']:>12}ms{r['live_locks_after']:>9}")
+
+
+async def run_clan_economy(args) -> dict:
+    # un tick d'intérêts + revenus sur N clans, puis un rattrapage de plusieurs ticks
+    path = setup_db(args.db)
+    rng = random.Random(args.seed)
+    with main.db_connect() as conn:
+        conn.executemany(
+            "INSERT INTO clans(id, name, owner_id, bank) VALUES(?,?,?,?)",
+            [(cid, f"clan{cid}", cid, rng.randint(0, args.max_bank)) for cid in range(1, args.clans + 1)],
+        )
+        conn.executemany(
+            "INSERT INTO clan_members(clan_id, user_id, role) VALUES(?,?,?)",
+            [
+                (cid, cid * 100 + k, "owner" if k == 0 else "member")
+                for cid in range(1, args.clans + 1)
+                for k in range(args.members)
+            ],
+        )
+        conn.commit()
+
+    def probe(stop: threading.Event, waits: List[float]):
+        # une écriture de commande toutes les 10 ms : mesure le blocage subi
+        conn = main.db_connect()
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            conn.execute("UPDATE users SET xp = xp WHERE user_id = 0")
+            conn.commit()
+            waits.append(time.perf_counter() - t0)
+            time.sleep(0.01)
+        conn.close()
+
+    tick = main.CLAN_ECONOMY_TICK
+    start = 1_800_000_000 // tick * tick
+    results = {}
+    for label, now in (
+        ("premier tick", start),
+        ("rejoué (no-op)", start),
+        ("tick suivant", start + tick),
+        (f"rattrapage {args.catchup} ticks", start + (1 + args.catchup) * tick),
+    ):
+        stop, waits = threading.Event(), []
+        writer = threading.Thread(target=probe, args=(stop, waits))
+        writer.start()
+        t0 = time.perf_counter()
+        totals = main.apply_clan_economy(now)
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        writer.join()
+        results[label] = {"ms": round(elapsed * 1000, 1), "write_wait_max_ms": round(max(waits, default=0) * 1000, 1), **totals}
+    return {"config": {"clans": args.clans, "members": args.members, "db": path}, "runs": results}
+
+
+def print_clan_economy(title: str, summary: dict):
+    print(f"== {title} ({summary['config']})")
+    for label, r in summary["runs"].items():
+        print(
+            f"{label:<24}{r['ms']:>10} ms  écriture bloquée max {r['write_wait_max_ms']} ms  "
+            f"ticks={r['ticks']} intérêts={r['interest']} revenus={r['income']}"
+        )
+
+
+async def run_backup(args) -> dict:
+    # latence des commandes sans puis pendant des sauvegardes à chaud en boucle
+    global API_LATENCY
+    API_LATENCY = args.api_latency / 1000.0
+    mix = [name.strip() for name in args.mix.split(",") if name.strip()]
+    path = setup_db(args.db)
+    disable_cooldowns()
+    main.BACKUP_DIR = os.path.join(os.path.dirname(path), "backups")
+
+    # remplissage : la taille de la base fixe la durée d'une copie
+    with main.db_connect() as conn:
+        conn.executemany(
+            "INSERT INTO logs(user_id, action, delta) VALUES(?,?,?)",
+            ((i % 1000, "bench_fill", i) for i in range(args.fill_rows)),
+        )
+        conn.commit()
+
+    rng = random.Random(args.seed)
+    users = list(range(1_000, 1_000 + args.users))
+    seed_users(users, args.balance)
+    world = World(guild=FakeGuild(), users=users, rng=rng)
+
+    phases = {}
+    phases["sans sauvegarde"] = (await drive_commands(world, mix, args)).summary()
+
+    stop = asyncio.Event()
+    backups: List[main.BackupResult] = []
+
+    async def backup_worker():
+        while not stop.is_set():
+            backups.append(await asyncio.to_thread(main.backup_db, None, args.pages, args.step_sleep / 1000.0))
+            main.rotate_backups(1)
+
+    task = asyncio.create_task(backup_worker())
+    phases["pendant sauvegarde"] = (await drive_commands(world, mix, args)).summary()
+    stop.set()
+    await task
+
+    return {
+        "config": {
+            "mix": mix,
+            "concurrency": args.concurrency,
+            "pages": args.pages,
+            "step_sleep_ms": args.step_sleep,
+            "db_mb": round(os.path.getsize(path) / 1e6, 1),
+            "db": path,
+        },
+        "phases": phases,
+        "backups": {
+            "count": len(backups),
+            "avg_s": round(sum(b.seconds for b in backups) / len(backups), 2) if backups else 0.0,
+            "restarts": sum(b.restarts for b in backups),
+        },
+    }
+
+
+def print_backup(title: str, summary: dict):
+    print(f"== {title} ({summary['config']})")
+    b = summary["backups"]
+    print(f"{b['count']} sauvegarde(s), {b['avg_s']}s en moyenne, {b['restarts']} reprise(s)")
+    print(f"{'phase':<20}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'lag p99':>10}{'lag max':>10}")
+    for label, r in summary["phases"].items():
+        # pire commande du mix
+        p50 = max((c["p50_ms"] for c in r["commands"].values()), default=0.0)
+        p99 = max((c["p99_ms"] for c in r["commands"].values()), default=0.0)
+        print(f"{label:<20}{r['throughput_ops_s']:>10}{p50:>10}{p99:>10}{r['loop_lag_ms']['p99']:>10}{r['loop_lag_ms']['max']:>10}")
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+
+class FakeMessage:
+    def __init__(self, author: FakeMember, guild: FakeGuild, channel: FakeChannel, content: str):
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+        self.content = content
+
+
+class CountingChatXp(main.ChatXp):
+    # garde le total distribué par joueur pour vérifier les niveaux en base
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.totals: Dict[int, int] = {}
+
+    def hit(self, user_id, channel_id, now=None):
+        xp = super().hit(user_id, channel_id, now)
+        if xp:
+            self.totals[user_id] = self.totals.get(user_id, 0) + xp
+        return xp
+
+
+def cumulative_xp(level: int, xp: int) -> int:
+    return sum(main.need_for_level(lv) for lv in range(1, level)) + xp
+
+
+async def run_chat(args) -> dict:
+    # flux de messages à débit fixe à travers le listener, flush par lots en fond
+    path = setup_db(args.db, args.store)
+    main.CHAT_XP_ENABLED = True
+    main.CHAT_XP = chat = CountingChatXp(cooldown=args.cooldown)
+    rng = random.Random(args.seed)
+    guild = FakeGuild()
+    users = list(range(1_000, 1_000 + args.users))
+    seed_users(users, args.balance)
+    authors = [guild.member(uid) for uid in users]
+    channels = [FakeChannel(9_000 + i) for i in range(8)]
+    contents = ["salut", "gg", "quelqu'un pour un bj ?", "ok", "mdr la roulette", "ce serveur est top"]
+    messages = [FakeMessage(rng.choice(authors), guild, rng.choice(channels), rng.choice(contents)) for _ in range(65536)]
+
+    main.EVENTS.start()
+    flusher = asyncio.create_task(chat.run(args.flush_every))
+    stats = Stats()
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(stats, args.lag_interval, stop))
+    tick_costs: List[float] = []
+    sent = 0
+    started = time.perf_counter()
+    while (elapsed := time.perf_counter() - started) < args.duration:
+        due = int(args.rate * elapsed) - sent
+        t0 = time.perf_counter()
+        for i in range(due):
+            await main.chat_xp_listener(messages[(sent + i) & 65535])
+        sent += due
+        tick_costs.append(time.perf_counter() - t0)
+        await asyncio.sleep(0.01)
+    stats.elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+    flusher.cancel()
+    t0 = time.perf_counter()
+    chat.flush()
+    await main.EVENTS.stop()
+    drain = time.perf_counter() - t0
+
+    # vérification : xp cumulé et bonus de palier en base == distribué
+    wrong = 0
+    for uid in users:
+        u = main.STORE.get_user(uid)
+        level, xp = int(u["level"]), int(u["xp"])
+        bonus = sum(main.LEVEL_BONUS_AMOUNT for lv in range(2, level + 1) if lv % main.LEVEL_BONUS_EVERY == 0)
+        if cumulative_xp(level, xp) != chat.totals.get(uid, 0) or int(u["balance"]) != args.balance + bonus:
+            wrong += 1
+
+    return {
+        "config": {
+            "rate": args.rate, "users": args.users, "cooldown_s": args.cooldown,
+            "flush_every_s": args.flush_every, "store": args.store, "db": path,
+        },
+        "messages": sent,
+        "elapsed_s": round(stats.elapsed, 3),
+        "throughput_msg_s": round(sent / stats.elapsed, 1),
+        "us_per_message": round(sum(tick_costs) / max(1, sent) * 1e6, 2),
+        "awarded": chat.awarded,
+        "flushes": chat.flushes,
+        "loop_lag_ms": {
+            "p50": round(percentile(stats.loop_lag, 50) * 1000, 2),
+            "p99": round(percentile(stats.loop_lag, 99) * 1000, 2),
+            "max": round(max(stats.loop_lag, default=0.0) * 1000, 2),
+        },
+        "drain_ms": round(drain * 1000, 1),
+        "events": main.EVENTS.stats(),
+        "mismatched_users": wrong,
+    }
+
+
+def print_chat(title: str, summary: dict):
+    c = summary["config"]
+    print(f"== {title} [{c['store']}] ({c['rate']} msg/s visés, {c['users']} joueurs, cooldown {c['cooldown_s']}s)")
+    lag = summary["loop_lag_ms"]
+    print(
+        f"{summary['messages']} messages en {summary['elapsed_s']}s → {summary['throughput_msg_s']} msg/s, "
+        f"{summary['us_per_message']} µs/message | lag boucle p50 {lag['p50']} ms, p99 {lag['p99']} ms, max {lag['max']} ms"
+    )
+    print(f"{summary['awarded']} gains en {summary['flushes']} flush(s), vidage final {summary['drain_ms']} ms")
+    for ev in summary["events"]:
+        if ev["events"] or ev["inline"]:
+            print(f"  bus {ev['name']:<13}{ev['events']:>7} évts en {ev['batches']} lots, {ev['inline']} en ligne")
+    print(f"joueurs incohérents (xp / bonus) : {summary['mismatched_users']}")
+
+
+async def run_reminders(args) -> dict:
+    # roue de rappels seule : armement, avance seconde par seconde, rechargement depuis la base
+    rng = random.Random(args.seed)
+    start = int(time.time())
+    keys = main.REMINDER_KEYS
+    plan = [
+        (1_000 + i // len(keys), keys[i % len(keys)], start + rng.randrange(1, args.spread), rng.choice((1, 2)))
+        for i in range(args.reminders)
+    ]
+
+    reminders = main.Reminders()
+    reminders.wheel = main.TimerWheel(start)
+    # pic RSS (Ko sous Linux) : le plan est déjà en mémoire, l'écart est la roue
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    for user_id, key, due, mode in plan:
+        reminders.arm(user_id, key, due, mode, 9_000 + (user_id & 7))
+    arm_s = time.perf_counter() - t0
+    mem = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0) * 1024
+
+    # avance d'une seconde à la fois, comme la tâche du bot, en vidant la boîte d'envoi
+    ticks: List[float] = []
+    fired = 0
+    backlog = 0
+    t0 = time.perf_counter()
+    for now in range(start + 1, start + args.spread + 1):
+        t = time.perf_counter()
+        fired += reminders.tick(now)
+        ticks.append(time.perf_counter() - t)
+        backlog = max(backlog, len(reminders.outbox))
+        reminders.outbox.clear()
+    advance_s = time.perf_counter() - t0
+
+    load = {}
+    if not args.skip_db:
+        setup_db(args.db, "sqlite")
+        with main.db_connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cooldowns(user_id, key, next_ts, remind, remind_channel) VALUES(?,?,?,?,?)",
+                ((uid, key, due, mode, 9_000 + (uid & 7)) for uid, key, due, mode in plan),
+            )
+            conn.commit()
+        fresh = main.Reminders()
+        t0 = time.perf_counter()
+        rows = main.STORE.pending_reminders()
+        read_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        stale = fresh.load(rows, start)
+        load = {"rows": len(rows), "read_s": round(read_s, 2), "arm_s": round(time.perf_counter() - t0, 2),
+                "stale": len(stale)}
+
+    return {
+        "config": {"reminders": args.reminders, "spread_s": args.spread, "db": args.db},
+        "arm_s": round(arm_s, 2),
+        "arm_us": round(arm_s / max(1, args.reminders) * 1e6, 2),
+        "wheel_mb": round(mem / 1e6, 1),
+        "advance_s": round(advance_s, 2),
+        "tick_us": {
+            "p50": round(percentile(ticks, 50) * 1e6, 1),
+            "p99": round(percentile(ticks, 99) * 1e6, 1),
+            "max": round(max(ticks, default=0.0) * 1e6, 1),
+        },
+        "fired": fired,
+        "max_per_tick": backlog,
+        "lost": args.reminders - fired,
+        "load": load,
+    }
+
+
+def print_reminders(title: str, summary: dict):
+    c = summary["config"]
+    print(f"== {title} ({c['reminders']} rappels sur {c['spread_s']}s)")
+    print(f"armement {summary['arm_s']}s ({summary['arm_us']} µs/rappel), roue en mémoire {summary['wheel_mb']} Mo")
+    t = summary["tick_us"]
+    print(
+        f"{c['spread_s']} ticks en {summary['advance_s']}s | tick p50 {t['p50']} µs, p99 {t['p99']} µs, max {t['max']} µs"
+        f" | {summary['fired']} déclenchés, max {summary['max_per_tick']} par tick, {summary['lost']} perdus"
+    )
+    if summary["load"]:
+        ld = summary["load"]
+        print(f"rechargement : {ld['rows']} lignes lues en {ld['read_s']}s, armées en {ld['arm_s']}s ({ld['stale']} périmées)")
+
+
+class FakeDropMessage:
+    def __init__(self):
+        self.edits = 0
+
+    async def edit(self, *, embed=None, view=None, **kwargs):
+        self.edits += 1
+        await fake_api_call()
+
+
+async def run_drop(args) -> dict:
+    # rafale de clics sur le bouton Réclamer, tous dans la même fenêtre, doublons compris
+    global API_LATENCY
+    API_LATENCY = args.api_latency / 1000.0
+    path = setup_db(args.db, args.store)
+    main.EVENTS.start()
+    rng = random.Random(args.seed)
+    guild = FakeGuild()
+    users = list(range(1_000, 1_000 + args.users))
+    seed_users(users, args.balance)
+    clickers = [rng.choice(users) for _ in range(args.clicks)]
+
+    manager = main.DropManager(edit_interval=args.edit_interval)
+    mode = main.DROP_GIVEAWAY if args.giveaway else main.DROP_FIRST
+    drop = manager.create(mode, args.amount, args.winners, args.window / 60.0, 1)
+    message = FakeDropMessage()
+    manager.start(drop, message)
+    task = manager._tasks[drop.id]
+
+    stats = Stats()
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(stats, args.lag_interval, stop))
+
+    async def click(uid: int, at: float):
+        await asyncio.sleep(at)
+        t0 = time.perf_counter()
+        inter = FakeInteraction(guild.member(uid), guild)
+        await main.drop_click(drop, inter)
+        stats.record("click", time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    # tous les clics tombent dans la même seconde
+    await asyncio.gather(*(click(uid, rng.random() * args.burst) for uid in clickers))
+    if args.giveaway:
+        drop.ends_at = 0  # on n'attend pas la fin du chrono
+    await task
+    stats.elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+    await main.EVENTS.stop()
+
+    balances = {uid: int(main.STORE.get_user(uid)["balance"]) for uid in users}
+    paid = [uid for uid, bal in balances.items() if bal == args.balance + args.amount]
+    # payé exactement une fois, et seulement les gagnants
+    winners = set(drop.winners)
+    wrong = [uid for uid, bal in balances.items() if bal != args.balance + (args.amount if uid in winners else 0)]
+    if isinstance(main.STORE, main.MemoryStore):
+        ledger = sum(1 for row in main.STORE.ledger if row[1] in ("drop", "giveaway"))
+    else:
+        # sqlite, doublure postgres et démon écrivent tous dans le fichier du banc
+        with main.db_connect() as conn:
+            ledger = conn.execute("SELECT COUNT(*) FROM logs WHERE action IN ('drop', 'giveaway')").fetchone()[0]
+
+    r = stats.summary()
+    return {
+        "config": {
+            "clicks": args.clicks, "users": args.users, "winners": args.winners, "mode": mode,
+            "burst_s": args.burst, "edit_interval_s": args.edit_interval, "store": args.store, "db": path,
+        },
+        "elapsed_s": r["elapsed_s"],
+        "click_ms": r["commands"]["click"],
+        "loop_lag_ms": r["loop_lag_ms"],
+        "distinct_clickers": len(set(clickers)),
+        "entrants": len(drop.order),
+        "winners": len(drop.winners),
+        "distinct_winners": len(set(drop.winners)),
+        "paid": len(paid),
+        "wrong_balances": len(wrong),
+        "ledger_rows": ledger,
+        "message_edits": message.edits,
+    }
+
+
+def print_drop(title: str, summary: dict):
+    c = summary["config"]
+    print(f"== {title} [{c['store']}] ({c['clicks']} clics de {summary['distinct_clickers']} joueurs en {c['burst_s']}s, "
+          f"{c['winners']} gagnants, mode {c['mode']})")
+    k, lag = summary["click_ms"], summary["loop_lag_ms"]
+    print(f"clic p50 {k['p50_ms']} ms, p99 {k['p99_ms']} ms | lag boucle p99 {lag['p99']} ms, max {lag['max']} ms")
+    print(
+        f"{summary['entrants']} inscrits, {summary['winners']} gagnants ({summary['distinct_winners']} distincts), "
+        f"{summary['paid']} payés, {summary['wrong_balances']} soldes faux, ledger {summary['ledger_rows']} ligne(s)"
+    )
+    print(f"{summary['message_edits']} édition(s) du message pour {c['clicks']} clics")
+
+
+SEASON_BENCH_ACTIONS = ("roulette", "slots", "cf", "nombre", "mines_bet", "mines_win", "cf_autoplay")
+
+
+def season_rows(rng: random.Random, count: int, users: int, first_ts: int, last_ts: int, first_id: int = 1) -> list:
+    # lignes de jeu (seed_id posé) et quelques lignes hors jeu, ignorées par le cumul
+    rows = []
+    for i in range(count):
+        action = rng.choice(SEASON_BENCH_ACTIONS) if i % 10 else "daily"
+        delta = rng.randint(-500, 600) if action != "mines_bet" else -rng.randint(1, 500)
+        seed_id, client_seed = (None, None) if action == "daily" else (1, "")
+        rounds = rng.randint(1, 50) if action.endswith("_autoplay") else (None if action == "daily" else 1)
+        rows.append((
+            1_000 + rng.randrange(users), action, delta, rng.randint(first_ts, last_ts),
+            seed_id, first_id + i, client_seed, rounds,
+        ))
+    return rows
+
+
+def write_season_rows(rows: list, clan_rows: list):
+    if isinstance(main.STORE, main.MemoryStore):
+        main.STORE.ledger.extend(rows)
+        main.STORE.clan_ledger.extend(clan_rows)
+        return
+    # sqlite, doublure postgres et démon partagent le fichier du banc
+    with main.db_connect() as conn:
+        conn.executemany(
+            "INSERT INTO logs(user_id, action, delta, ts, seed_id, nonce, client_seed, rounds) VALUES(?,?,?,?,?,?,?,?)",
+            rows,
+        )
+        conn.executemany("INSERT INTO clan_logs(clan_id, action, delta, ts) VALUES(?,?,?,?)", clan_rows)
+        conn.commit()
+
+
+async def run_seasons(args) -> dict:
+    # cumul du ledger, calcul des classements, passage de saison, puis lectures /top saison
+    path = setup_db(args.db, args.store)
+    rng = random.Random(args.seed)
+    now = int(time.time())
+    first_ts = now - args.days * 86400
+    if isinstance(main.STORE, main.MemoryStore):
+        clan_ids = [main.STORE.clan_create(f"clan{i}", 500_000 + i) for i in range(args.clans)]
+    else:
+        with main.db_connect() as conn:
+            conn.executemany(
+                "INSERT INTO clans(id, name, owner_id, bank) VALUES(?,?,?,0)",
+                [(i, f"clan{i}", 500_000 + i) for i in range(1, args.clans + 1)],
+            )
+            conn.commit()
+        clan_ids = list(range(1, args.clans + 1))
+    rows = season_rows(rng, args.rows, args.users, first_ts, now)
+    clan_rows = [
+        (rng.choice(clan_ids), "deposit", rng.randint(-200, 1_000), rng.randint(first_ts, now))
+        for _ in range(args.rows // 20)
+    ]
+    write_season_rows(rows, clan_rows)
+
+    runs = {}
+
+    def timed(label: str, at: int):
+        t0 = time.perf_counter()
+        totals = main.refresh_seasons(at)
+        runs[label] = {"ms": round((time.perf_counter() - t0) * 1000, 1), "rows": totals["rows"],
+                       "boards": totals["boards"], "closed": totals["closed"]}
+
+    timed(f"historique ({args.days} j)", now)
+    timed("passage à vide", now)
+    tail = season_rows(rng, args.tail, args.users, now - 60, now, args.rows + 1)
+    write_season_rows(tail, [])
+    timed(f"+{args.tail} lignes", now)
+    # semaine suivante : clôture de la saison en cours + nouvelle saison vide
+    timed("passage de saison", now + 7 * 86400)
+    # lignes de la saison close arrivées après la clôture : reprises au passage suivant
+    late = season_rows(rng, args.tail, args.users, now - 60, now, args.rows + args.tail + 1)
+    write_season_rows(late, [])
+    timed("passage suivant", now + 7 * 86400)
+
+    # attendu : mêmes agrégats (saison close), calculés à la main sur les lignes générées
+    season, start, end = main.season_bounds("semaine", now)
+    expected: Dict[str, Dict[int, int]] = {"gains": {}, "parties": {}}
+    for uid, action, delta, ts, seed_id, _, _, rounds in rows + tail + late:
+        if seed_id is not None and start <= ts // 86400 < end:
+            expected["gains"][uid] = expected["gains"].get(uid, 0) + delta
+            if action not in main.SEASON_PAYOUT_ACTIONS:
+                expected["parties"][uid] = expected["parties"].get(uid, 0) + rounds
+    mismatches = {}
+    for board, totals in expected.items():
+        best = sorted(((v, -uid) for uid, v in totals.items() if v > 0), reverse=True)[: main.SEASON_BOARD_SIZE]
+        got = await main.STORE.season_board("semaine", season, board, main.SEASON_BOARD_SIZE)
+        mismatches[board] = sum(
+            1 for (v, uid), r in zip(best, got) if (-uid, v) != (int(r["entity_id"]), int(r["value"]))
+        ) + abs(len(best) - len(got))
+
+    reads: List[float] = []
+    for _ in range(args.reads):
+        t0 = time.perf_counter()
+        await main.STORE.season_board("semaine", season, "gains", 10)
+        reads.append(time.perf_counter() - t0)
+    ondemand: List[float] = []
+    if not isinstance(main.STORE, main.MemoryStore):
+        # ce que /top saison coûterait sans instantané : agrégat de logs à chaque appel
+        with main.db_connect() as conn:
+            for _ in range(max(1, args.reads // 100)):
+                t0 = time.perf_counter()
+                conn.execute(
+                    "SELECT user_id, SUM(delta) AS v FROM logs WHERE ts >= ? AND ts < ? AND seed_id IS NOT NULL "
+                    "GROUP BY user_id ORDER BY v DESC LIMIT 10",
+                    (start * 86400, end * 86400),
+                ).fetchall()
+                ondemand.append(time.perf_counter() - t0)
+
+    def ms(values: List[float]) -> dict:
+        return {"p50": round(percentile(values, 50) * 1000, 3), "p99": round(percentile(values, 99) * 1000, 3)}
+
+    return {
+        "config": {"rows": args.rows, "users": args.users, "clans": args.clans, "days": args.days,
+                   "store": args.store, "db": path},
+        "runs": runs,
+        "mismatches": mismatches,
+        "read_ms": ms(reads),
+        "ondemand_ms": ms(ondemand) if ondemand else None,
+    }
+
+
+def print_seasons(title: str, summary: dict):
+    c = summary["config"]
+    print(f"== {title} [{c['store']}] ({c['rows']} lignes de ledger sur {c['days']} j, "
+          f"{c['users']} joueurs, {c['clans']} clans)")
+    for label, r in summary["runs"].items():
+        closed = f", close {', '.join(r['closed'])}" if r["closed"] else ""
+        print(f"{label:<24}{r['ms']:>10} ms  lignes={r['rows']} classements={r['boards']}{closed}")
+    rd = summary["read_ms"]
+    line = f"/top saison : p50 {rd['p50']} ms, p99 {rd['p99']} ms"
+    if summary["ondemand_ms"]:
+        od = summary["ondemand_ms"]
+        line += f" | agrégat de logs à la demande : p50 {od['p50']} ms, p99 {od['p99']} ms"
+    print(line)
+    for board, n in summary["mismatches"].items():
+        print(f"classement {board} de la semaine : {n} écart(s) avec l'agrégat attendu")
+
+
+def legacy_embed(title: str, description: str = "", user=None) -> discord.Embed:
+    # base_embed d'avant les gabarits : __init__ + set_author + set_footer
+    e = discord.Embed(title=title, description=description, color=0x3498db)
+    if user:
+        e.set_author(name=user.display_name, icon_url=user.display_avatar.url)
+    e.set_footer(text="Coinsbot • Casino")
+    return e
+
+
+def allocations(build: Callable[[], object], count: int) -> tuple:
+    # blocs / octets encore alloués par appel (embeds gardés en vie, comme jusqu'à l'envoi)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [build() for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    del keep
+    return sum(d.count_diff for d in diff) / count, sum(d.size_diff for d in diff) / count
+
+
+async def run_embeds(args) -> dict:
+    # construction des embeds seule : ancien chemin (add_field par réponse) contre embeds figés / gabarits
+    user = FakeMember(1_000)
+    help_fields = main.HELP_EMBED.data["fields"]
+    values = ("🍒 | 🍋 | 🔔", f"Perdu **-{main.fmt_int(250)}** {main.CURRENCY_EMOJI}", main.fmt_money(1_234_567))
+    footer = f"{main.EMBED_FOOTER} • partie slots #12:3456 (/equite)"
+
+    def help_legacy():
+        e = legacy_embed("Coinsbot • Aide", user=user)
+        for f in help_fields:
+            e.add_field(name=f["name"], value=f["value"], inline=f["inline"])
+        return e
+
+    def slots_legacy():
+        e = legacy_embed("Machine à sous", user=user)
+        e.add_field(name="Tirage", value=values[0], inline=False)
+        e.add_field(name="Résultat", value=values[1], inline=False)
+        e.add_field(name="Solde", value=values[2], inline=False)
+        e.set_footer(text=footer)
+        return e
+
+    def base_legacy():
+        e = legacy_embed("Banque du clan", user=user)
+        e.add_field(name="Dépôt", value=values[1], inline=False)
+        return e
+
+    def base_new():
+        e = main.base_embed("Banque du clan", user=user)
+        e.add_field(name="Dépôt", value=values[1], inline=False)
+        return e
+
+    cases = {
+        "/help": (help_legacy, lambda: main.HELP_EMBED.get(user)),
+        "résultat de jeu": (slots_legacy, lambda: main.SLOTS_EMBED.render(user, *values, footer=footer)),
+        "base_embed + champ": (base_legacy, base_new),
+        "fmt_int (< 1000)": (lambda: f"{250:,}".replace(",", " "), lambda: main.fmt_int(250)),
+    }
+    results = {}
+    for label, (old, new) in cases.items():
+        row = {"same_payload": old().to_dict() == new().to_dict() if label != "fmt_int (< 1000)" else old() == new()}
+        for name, fn in (("old", old), ("new", new)):
+            us = timeit.timeit(fn, number=args.iterations) / args.iterations * 1e6
+            blocks, size = allocations(fn, args.keep)
+            row[name] = {"us": round(us, 3), "blocks": round(blocks, 1), "bytes": round(size)}
+        results[label] = row
+    return {"config": {"iterations": args.iterations, "keep": args.keep}, "cases": results}
+
+
+def print_embeds(title: str, summary: dict):
+    c = summary["config"]
+    print(f"== {title} ({c['iterations']} appels chronométrés, allocations sur {c['keep']} objets gardés)")
+    print(f"{'cas':<22}{'avant µs':>10}{'après µs':>10}{'blocs':>14}{'octets':>16}  payload")
+    for label, r in summary["cases"].items():
+        old, new = r["old"], r["new"]
+        print(
+            f"{label:<22}{old['us']:>10}{new['us']:>10}{old['blocks']:>7}→{new['blocks']:<6}"
+            f"{old['bytes']:>8}→{new['bytes']:<7}  {'identique' if r['same_payload'] else 'DIFFÉRENT'}"
+        )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Banc de charge hors-ligne Coinsbot")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("commands", help="Rejoue un mélange de commandes à concurrence donnée")
+    p.add_argument("--mix", default=DEFAULT_MIX, help=f"opérations séparées par des virgules ({', '.join(OPS)})")
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--users", type=int, default=100)
+    p.add_argument("--duration", type=float, default=5.0, help="durée max en secondes")
+    p.add_argument("--requests", type=int, default=0, help="nombre total d'opérations (0 = jusqu'à la durée)")
+    p.add_argument("--balance", type=int, default=10_000_000)
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--db", default=None, help="base SQLite à utiliser (défaut : fichier temporaire)")
+    p.add_argument("--keep-cooldowns", action="store_true")
+    p.add_argument("--store", choices=STORES, default="sqlite", help="backend de stockage")
+    p.add_argument("--inline-events", action="store_true", help="bus arrêté : effets de bord traités dans la commande")
+    p.add_argument("--api-latency", type=float, default=0.0, help="latence simulée de l'API Discord (ms)")
+    p.add_argument("--lag-interval", type=float, default=0.01)
+    p.add_argument("--json", action="store_true", help="sortie JSON")
+    p.add_argument("--verbose", action="store_true", help="remonte la 1re exception")
+    p.set_defaults(func=run_commands, title="commandes", printer=print_summary)
+
+    p = sub.add_parser("locks", help="Contention des verrous par joueur (KeyedLocks)")
+    p.add_argument("--tasks", type=int, default=200)
+    p.add_argument("--ops", type=int, default=20, help="opérations par tâche")
+    p.add_argument("--hold-ms", type=float, default=1.0, help="durée de détention simulée")
+    p.add_argument("--pair-users", type=int, default=1000, help="taille du pool pour les paires")
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=run_locks, title="verrous", printer=print_locks)
+
+    p = sub.add_parser("clan-economy", help="Durée d'un tick d'intérêts/revenus de clan")
+    p.add_argument("--clans", type=int, default=100_000)
+    p.add_argument("--members", type=int, default=1, help="membres par clan")
+    p.add_argument("--max-bank", type=int, default=3_000_000)
+    p.add_argument("--catchup", type=int, default=24, help="ticks manqués à rattraper")
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--db", default=None)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=run_clan_economy, title="économie de clan", printer=print_clan_economy)
+
+    p = sub.add_parser("backup", help="Latence des commandes pendant une sauvegarde à chaud")
+    p.add_argument("--mix", default="daily,roulette,slots,profil")
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--users", type=int, default=100)
+    p.add_argument("--duration", type=float, default=5.0, help="durée de chaque phase")
+    p.add_argument("--requests", type=int, default=0)
+    p.add_argument("--balance", type=int, default=10_000_000)
+    p.add_argument("--fill-rows", type=int, default=500_000, help="lignes de logs pour grossir la base")
+    p.add_argument("--pages", type=int, default=main.BACKUP_PAGES, help="pages par pas (-1 = d'un bloc)")
+    p.add_argument("--step-sleep", type=float, default=main.BACKUP_STEP_SLEEP * 1000, help="pause entre pas (ms)")
+    p.add_argument("--api-latency", type=float, default=0.0)
+    p.add_argument("--lag-interval", type=float, default=0.01)
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--db", default=None)
+    p.add_argument("--json", action="store_true")
+    p.add_argument("--verbose", action="store_true")
+    p.set_defaults(func=run_backup, title="sauvegarde à chaud", printer=print_backup)
+
+    p = sub.add_parser("chat", help="XP d'activité : flux de messages à débit fixe")
+    p.add_argument("--rate", type=int, default=10_000, help="messages par seconde")
+    p.add_argument("--users", type=int, default=20_000)
+    p.add_argument("--duration", type=float, default=10.0)
+    p.add_argument("--cooldown", type=float, default=main.CHAT_XP_COOLDOWN, help="cooldown par joueur (s)")
+    p.add_argument("--flush-every", type=float, default=main.CHAT_XP_FLUSH_EVERY, help="période des écritures (s)")
+    p.add_argument("--balance", type=int, default=0)
+    p.add_argument("--store", choices=STORES, default="sqlite")
+    p.add_argument("--lag-interval", type=float, default=0.01)
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--db", default=None)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=run_chat, title="xp du chat", printer=print_chat)
+
+    p = sub.add_parser("reminders", help="Roue des rappels de cooldown : armement, ticks, rechargement")
+    p.add_argument("--reminders", type=int, default=1_000_000)
+    p.add_argument("--spread", type=int, default=6 * 3600, help="échéances tirées sur cette durée (s)")
+    p.add_argument("--skip-db", action="store_true", help="ne mesure pas le rechargement depuis SQLite")
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--db", default=None)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=run_reminders, title="rappels", printer=print_reminders)
+
+    p = sub.add_parser("drop", help="Coin drop : rafale de clics simultanés sur Réclamer")
+    p.add_argument("--clicks", type=int, default=5_000)
+    p.add_argument("--users", type=int, default=2_000)
+    p.add_argument("--winners", type=int, default=100)
+    p.add_argument("--amount", type=int, default=1_000)
+    p.add_argument("--burst", type=float, default=1.0, help="fenêtre des clics (s)")
+    p.add_argument("--window", type=float, default=60.0, help="durée du drop (s)")
+    p.add_argument("--giveaway", action="store_true", help="tirage au sort au lieu des premiers arrivés")
+    p.add_argument("--edit-interval", type=float, default=main.DROP_EDIT_INTERVAL)
+    p.add_argument("--balance", type=int, default=0)
+    p.add_argument("--store", choices=STORES, default="sqlite")
+    p.add_argument("--api-latency", type=float, default=0.0, help="latence simulée de l'API Discord (ms)")
+    p.add_argument("--lag-interval", type=float, default=0.01)
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--db", default=None)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=run_drop, title="coin drop", printer=print_drop)
+
+    p = sub.add_parser("seasons", help="Classements saisonniers : cumul du ledger, instantanés, lectures /top saison")
+    p.add_argument("--rows", type=int, default=1_000_000, help="lignes de ledger déjà en base")
+    p.add_argument("--tail", type=int, default=10_000, help="lignes ajoutées entre deux passages")
+    p.add_argument("--users", type=int, default=20_000)
+    p.add_argument("--clans", type=int, default=1_000)
+    p.add_argument("--days", type=int, default=60, help="ancienneté du ledger")
+    p.add_argument("--reads", type=int, default=2_000)
+    p.add_argument("--store", choices=STORES, default="sqlite")
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--db", default=None)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=run_seasons, title="classements saisonniers", printer=print_seasons)
+
+    p = sub.add_parser("embeds", help="Construction des embeds : ancien chemin contre embeds figés et gabarits")
+    p.add_argument("--iterations", type=int, default=100_000)
+    p.add_argument("--keep", type=int, default=2_000, help="objets gardés en vie pour compter les allocations")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=run_embeds, title="embeds", printer=print_embeds)
+    return parser
+
+
+def cli(argv=None):
+    args = build_parser().parse_args(argv)
+    summary = asyncio.run(args.func(args))
+    if getattr(args, "json", False):
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+    else:
+        args.printer(args.title, summary)
+
+
+if __name__ == "__main__":
+    cli(sys.argv[1:])
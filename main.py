@@ -1,10 +1,34 @@
 import os
 import io
+import csv
+import gzip
+import sys
 import time
+import asyncio
+import abc
+import argparse
+import itertools
 import random
+import secrets
+import weakref
+import threading
+import functools
+import contextlib
+import json
 import sqlite3
-from dataclasses import dataclass
-from typing import Optional, Dict, Tuple, List
+import signal
+import socket
+import hashlib
+import hmac
+import heapq
+import subprocess
+import cProfile
+import pstats
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional, Deque, Dict, Tuple, List, Hashable, Iterable, Iterator
 
 import discord
 from discord import app_commands
@@ -19,6 +43,23 @@ from PIL import Image, ImageDraw, ImageFont, ImageFilter
 TOKEN = os.getenv("DISCORD_TOKEN", "MET_TON_TOKEN_ICI")
 
 DB_PATH = "coinsbot.sqlite3"
+# backend de stockage des commandes : sqlite (prod), memory (tests/bancs), postgres (psycopg 3)
+STORE_BACKEND = os.getenv("COINSBOT_STORE", "sqlite")
+PG_DSN = os.getenv("COINSBOT_PG_DSN", "")
+# remote : les process de shards passent par le démon de stockage (python main.py store-daemon)
+STORE_SOCKET = os.getenv("COINSBOT_STORE_SOCKET", "coinsbot-store.sock")
+STORE_LINE_LIMIT = 64 * 1024 * 1024  # une ligne JSON par requête / réponse (instantané des clans compris)
+
+# sharding : COINSBOT_SHARD_COUNT > 0 active AutoShardedBot ; COINSBOT_SHARD_IDS="0,1"
+# limite ce process à une partie des shards (cluster multi-process)
+SHARD_COUNT = int(os.getenv("COINSBOT_SHARD_COUNT", "0") or 0)
+SHARD_IDS = [int(x) for x in os.getenv("COINSBOT_SHARD_IDS", "").split(",") if x.strip()]
+
+# sync des slash commands : seulement si l'arbre a changé depuis le dernier sync
+TREE_HASH_PATH = "coinsbot_tree.json"
+FORCE_TREE_SYNC = os.getenv("COINSBOT_FORCE_SYNC", "0") == "1"
+# serveur de dev : sync instantané par guild au lieu du sync global
+DEV_GUILD_ID = int(os.getenv("COINSBOT_DEV_GUILD", "0") or 0)
 
 CURRENCY_NAME = "Coinsbot Coins"
 CURRENCY_EMOJI = "🪙"
@@ -41,6 +82,21 @@ LEVEL_BONUS_AMOUNT = 5000
 
 # clans
 CLAN_MAX_MODS = 2
+CLAN_INVITE_TTL = 48 * 3600
+CLAN_INVITE_SWEEP_EVERY = 10 * 60
+CLAN_INVITE_SWEEP_BATCH = 1000
+
+# économie de clan : intérêts sur la banque + revenu passif des membres, par tick
+CLAN_ECONOMY_TICK = 3600
+# (banque minimale, intérêt en points de base par tick) — du plus petit au plus grand
+CLAN_INTEREST_TIERS = [
+    (10_000, 5),
+    (100_000, 8),
+    (1_000_000, 10),
+]
+CLAN_MEMBER_INCOME = 20
+# ticks rattrapés au maximum après une coupure
+CLAN_ECONOMY_MAX_CATCHUP = 7 * 24
 
 # profile image
 PROFILE_WIDTH = 920
@@ -55,307 +111,3267 @@ FONT_PATH = None
 # Voile noir (plus bas = fond plus visible)
 PROFILE_OVERLAY_ALPHA = 60
 
+# profiling à la demande (/admin profile)
+PROFILE_DIR = "profiles"
+PROFILE_TOP_N = 12
+PROFILE_MAX_SAMPLES = 200
+
 # Mines total multipliers (after n safes, cashout = bet * mult)
 MINES_MULTS = [0.5, 0.9, 1.2, 1.7, 2.2, 2.7, 3.2, 4]
 
+# autoplay (/roulette, /slots, /cf) : tours calculés en mémoire, une seule écriture par session
+AUTOPLAY_MAX_ROUNDS = 50
+ROULETTE_MAX_BETS = 10  # paris par bulletin
+
+# opérations en masse (airdrop, reset de saison, import) : lots bornés, pause entre lots
+BULK_CHUNK = 5000
+BULK_PAUSE = 0.01
+
+# export pour l'analytique hors-ligne (lecture par pages courtes : les écritures du bot ne sont pas bloquées)
+EXPORT_DIR = "exports"
+EXPORT_TABLES = ("users", "clans", "clan_members", "cooldowns", "logs")
+EXPORT_PAGE = 5000
+
+# sauvegardes à chaud (API backup SQLite, par petits pas pour ne pas bloquer les écritures)
+BACKUP_DIR = "backups"
+BACKUP_EVERY = 6 * 3600
+BACKUP_KEEP = 8
+BACKUP_PAGES = 256  # pages copiées par pas
+BACKUP_STEP_SLEEP = 0.02  # pause entre deux pas (verrou de lecture relâché)
+BACKUP_MAX_RESTARTS = 3  # une écriture pendant la copie la fait repartir de zéro
+
+# lectures lourdes (classements, agrégats) : connexions read-only dans des threads dédiés
+READ_POOL_SIZE = 2
+
+# maintenance SQLite (ANALYZE, incremental_vacuum, checkpoints WAL) aux heures creuses
+MAINT_CHECK_EVERY = 60
+MAINT_QUIET_RATE = 0.2  # commandes/s sur la fenêtre ci-dessous
+MAINT_QUIET_WINDOW = 10 * 60  # à observer en entier (depuis le démarrage) avant toute maintenance lourde
+MAINT_ANALYZE_EVERY = 24 * 3600
+MAINT_VACUUM_PAGES = 2000  # pages libérées par passage
+WAL_TRUNCATE_BYTES = 64 * 1024 * 1024  # au-delà : checkpoint TRUNCATE même hors heures creuses
+
+# bus d'événements : xp/tirages, notices de niveau et classements hors du chemin de réponse
+EVENT_QUEUE_SIZE = 10000  # par abonné ; file pleine = traitement immédiat dans l'appelant
+EVENT_BATCH = 500
+EVENT_LINGER = 0.05  # attente avant de vider une file, pour grouper les événements
+EVENT_RETRIES = 3  # nouvelles tentatives d'un lot xp/tirages en échec (stores transactionnels seulement)
+EVENT_RETRY_DELAY = 0.5  # secondes, doublé à chaque tentative
+LEADERBOARD_CACHE_SIZE = 20
+LEADERBOARD_CACHE_TTL = 60  # filet de sécurité : écritures en masse et autres process
+
+# xp d'activité dans le chat (intent message_content privilégié : à cocher aussi sur le portail)
+CHAT_XP_ENABLED = os.getenv("COINSBOT_CHAT_XP", "0") == "1"
+CHAT_XP_RANGE = (3, 8)
+CHAT_XP_COOLDOWN = 60  # un gain par joueur et par minute
+CHAT_XP_MIN_LENGTH = 3  # anti-spam : messages plus courts ignorés
+CHAT_XP_FLUSH_EVERY = 5  # gains cumulés en mémoire, écrits en un seul lot
+
+# rappels de fin de cooldown (opt-in /rappels) : une seule roue de minuteurs pour tous les joueurs
+REMINDER_KEYS = ("daily", "collect", "gift")
+REMIND_OFF, REMIND_DM, REMIND_CHANNEL = 0, 1, 2
+REMINDER_SENDS_PER_SECOND = 5  # messages (DM ou salon) par seconde, sous les limites Discord
+REMINDER_MAX_LATE = 6 * 3600  # au redémarrage, les rappels plus vieux sont abandonnés
+
+# coin drops / giveaways (/admin drop)
+DROP_MAX_WINNERS = 100
+DROP_MAX_DURATION = 60  # minutes
+DROP_EDIT_INTERVAL = 2.0  # au plus une édition du message par intervalle, quel que soit le nombre de clics
+DROP_PAY_RETRIES = 3  # nouvelles tentatives du paiement groupé en cas d'erreur du store
+DROP_PAY_RETRY_DELAY = 1.0  # secondes, doublé à chaque tentative
+
+# équité vérifiable : une graine serveur par jeu, publiée par son sha256, révélée à la rotation
+RNG_GAMES = ("roulette", "slots", "cf", "bj", "mines", "nombre", "rps")
+RNG_ROTATE_EVERY = 100_000  # parties par graine avant révélation et nouvelle graine
+RNG_CLIENT_SEED_MAX = 64  # longueur max de la graine client choisie par le joueur (/equite)
+# propriétaire des graines créées par ce process : au redémarrage, seules les siennes restées ouvertes sont révélées
+RNG_OWNER = "shards:" + ",".join(map(str, SHARD_IDS)) if SHARD_IDS else "bot"
+
+# classements saisonniers (/top saison) : cumuls journaliers du ledger + classements précalculés
+SEASON_PERIODS = ("semaine", "mois")
+SEASON_BOARD_SIZE = 20  # lignes gardées par classement (= max de /top)
+SEASON_SNAPSHOT_EVERY = 5 * 60
+SEASON_ROLLUP_BATCH = 50_000  # ids de ledger cumulés par transaction
+# règlement d'une partie déjà comptée à la mise (mines_bet, bj_bet)
+SEASON_PAYOUT_ACTIONS = (
+    "mines_claim", "mines_win", "bj_win", "bj_push", "bj_lose", "bj_bust", "bj_blackjack", "bj_forfeit",
+)
+
+# rate limiting en mémoire, vérifié avant tout accès DB
+# commande -> (jetons rechargés par seconde, rafale max)
+RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "default": (1.0, 5),
+    "collect": (0.2, 2),
+    "daily": (0.2, 2),
+    "gift": (0.2, 2),
+    "cf": (1.0, 3),
+    "mines_button": (4.0, 8),
+}
+# surcharges par serveur : guild_id -> {commande: (taux, rafale)}
+GUILD_RATE_LIMITS: Dict[int, Dict[str, Tuple[float, int]]] = {}
+
+# mode surcharge : au-delà de ce lag de boucle (s), on délaisse les commandes lourdes
+OVERLOAD_LAG = 0.25
+OVERLOAD_RECOVER_LAG = 0.10
+LOW_PRIORITY_COMMANDS = {"top", "topclan", "profil"}
+
 
 # =========================
 # DB LAYER + MIGRATIONS
 # =========================
+_DB_LOCAL = threading.local()
+
+
 def db_connect():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    # une connexion par thread, gardée ouverte : sur la boucle asyncio c'est l'unique
+    # connexion d'écriture (les commandes s'y sérialisent), les jobs lancés en thread
+    # (to_thread) ont chacun la leur
+    conn = getattr(_DB_LOCAL, "conn", None)
+    if conn is None or _DB_LOCAL.path != DB_PATH:
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        _DB_LOCAL.conn, _DB_LOCAL.path = conn, DB_PATH
     return conn
 
 
+class ReadPool:
+    """
+    Lectures lourdes hors boucle : chaque thread du pool garde une connexion
+    `mode=ro`. En WAL une lecture longue ne retient pas les écritures.
+    """
+
+    def __init__(self, size: int = READ_POOL_SIZE):
+        self.size = size
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.path != DB_PATH:
+            conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+            self._local.conn, self._local.path = conn, DB_PATH
+        return conn
+
+    def _fetchall(self, sql: str, params: tuple) -> List[sqlite3.Row]:
+        return self._conn().execute(sql, params).fetchall()
+
+    async def fetchall(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="coinsbot-read")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._fetchall, sql, params)
+
+    async def fetchone(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        rows = await self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+
+READS = ReadPool()
+
+
 def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
     rows = conn.execute(f"PRAGMA table_info({table})").fetchall()
     return any(r["name"] == column for r in rows)
 
 
-def db_init():
-    with db_connect() as conn:
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            balance INTEGER NOT NULL DEFAULT 0,
-            xp INTEGER NOT NULL DEFAULT 0,
-            level INTEGER NOT NULL DEFAULT 1,
-            draws INTEGER NOT NULL DEFAULT 0,
-            steals INTEGER NOT NULL DEFAULT 0,
-            cf_streak INTEGER NOT NULL DEFAULT 0,
-            created_at INTEGER NOT NULL DEFAULT (strftime('%s','now'))
-        )
-        """)
-
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS cooldowns (
-            user_id INTEGER NOT NULL,
-            key TEXT NOT NULL,
-            next_ts INTEGER NOT NULL,
-            PRIMARY KEY (user_id, key)
-        )
-        """)
-
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            action TEXT NOT NULL,
-            delta INTEGER NOT NULL,
-            ts INTEGER NOT NULL DEFAULT (strftime('%s','now'))
-        )
-        """)
-
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS clans (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE,
-            owner_id INTEGER NOT NULL,
-            bank INTEGER NOT NULL DEFAULT 0,
-            created_at INTEGER NOT NULL DEFAULT (strftime('%s','now'))
-        )
-        """)
-
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS clan_members (
-            clan_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            role TEXT NOT NULL DEFAULT 'member', -- owner/mod/member
-            joined_at INTEGER NOT NULL DEFAULT (strftime('%s','now')),
-            PRIMARY KEY (clan_id, user_id)
-        )
-        """)
-
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS clan_invites (
-            clan_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            invited_by INTEGER NOT NULL,
-            created_at INTEGER NOT NULL DEFAULT (strftime('%s','now')),
-            PRIMARY KEY (clan_id, user_id)
+# Chaque migration est appliquée une seule fois, dans l'ordre, et la version
+# atteinte est stockée dans PRAGMA user_version. Pour faire évoluer le schéma :
+# ajouter une fonction à la fin de MIGRATIONS (ne jamais modifier les anciennes).
+def _m001_base(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        balance INTEGER NOT NULL DEFAULT 0,
+        xp INTEGER NOT NULL DEFAULT 0,
+        level INTEGER NOT NULL DEFAULT 1,
+        draws INTEGER NOT NULL DEFAULT 0,
+        steals INTEGER NOT NULL DEFAULT 0,
+        cf_streak INTEGER NOT NULL DEFAULT 0,
+        created_at INTEGER NOT NULL DEFAULT (strftime('%s','now'))
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS cooldowns (
+        user_id INTEGER NOT NULL,
+        key TEXT NOT NULL,
+        next_ts INTEGER NOT NULL,
+        PRIMARY KEY (user_id, key)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        delta INTEGER NOT NULL,
+        ts INTEGER NOT NULL DEFAULT (strftime('%s','now'))
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS clans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        owner_id INTEGER NOT NULL,
+        bank INTEGER NOT NULL DEFAULT 0,
+        created_at INTEGER NOT NULL DEFAULT (strftime('%s','now'))
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS clan_members (
+        clan_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        role TEXT NOT NULL DEFAULT 'member', -- owner/mod/member
+        joined_at INTEGER NOT NULL DEFAULT (strftime('%s','now')),
+        PRIMARY KEY (clan_id, user_id)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS clan_invites (
+        clan_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        invited_by INTEGER NOT NULL,
+        created_at INTEGER NOT NULL DEFAULT (strftime('%s','now')),
+        PRIMARY KEY (clan_id, user_id)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_backfills (
+        name TEXT PRIMARY KEY,
+        last_rowid INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    # Colonnes manquantes d'une vieille DB. ADD COLUMN avec une valeur par défaut
+    # constante ne réécrit pas la table ; les valeurs réelles sont remplies
+    # ensuite en tâche de fond par lots (voir BACKFILLS).
+    for column, ddl in (
+        ("xp", "xp INTEGER NOT NULL DEFAULT 0"),
+        ("level", "level INTEGER NOT NULL DEFAULT 1"),
+        ("draws", "draws INTEGER NOT NULL DEFAULT 0"),
+        ("steals", "steals INTEGER NOT NULL DEFAULT 0"),
+        ("cf_streak", "cf_streak INTEGER NOT NULL DEFAULT 0"),
+    ):
+        if not _column_exists(conn, "users", column):
+            conn.execute(f"ALTER TABLE users ADD COLUMN {ddl}")
+
+    if not _column_exists(conn, "users", "created_at"):
+        conn.execute("ALTER TABLE users ADD COLUMN created_at INTEGER NOT NULL DEFAULT 0")
+        schedule_backfill(conn, "users_created_at")
+
+    if not _column_exists(conn, "clans", "bank"):
+        conn.execute("ALTER TABLE clans ADD COLUMN bank INTEGER NOT NULL DEFAULT 0")
+
+    if not _column_exists(conn, "clan_invites", "created_at"):
+        conn.execute("ALTER TABLE clan_invites ADD COLUMN created_at INTEGER NOT NULL DEFAULT 0")
+        schedule_backfill(conn, "clan_invites_created_at")
+
+
+def _m002_hot_indexes(conn: sqlite3.Connection):
+    # /top, /topclan et l'historique d'un joueur
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_balance ON users(balance DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_clans_bank ON clans(bank DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_user_ts ON logs(user_id, ts)")
+
+
+def _m003_clan_members_unique_user(conn: sqlite3.Connection):
+    # un seul clan par joueur : on garde l'appartenance owner, sinon la plus ancienne
+    conn.execute("""
+        DELETE FROM clan_members WHERE rowid IN (
+            SELECT rowid FROM (
+                SELECT rowid, ROW_NUMBER() OVER (
+                    PARTITION BY user_id ORDER BY role = 'owner' DESC, joined_at, clan_id
+                ) AS rn
+                FROM clan_members
+            ) WHERE rn > 1
         )
-        """)
-
-        # Migrations pour users (colonnes manquantes d'une vieille DB)
-        if not _column_exists(conn, "users", "xp"):
-            conn.execute("ALTER TABLE users ADD COLUMN xp INTEGER NOT NULL DEFAULT 0")
-        if not _column_exists(conn, "users", "level"):
-            conn.execute("ALTER TABLE users ADD COLUMN level INTEGER NOT NULL DEFAULT 1")
-        if not _column_exists(conn, "users", "draws"):
-            conn.execute("ALTER TABLE users ADD COLUMN draws INTEGER NOT NULL DEFAULT 0")
-        if not _column_exists(conn, "users", "steals"):
-            conn.execute("ALTER TABLE users ADD COLUMN steals INTEGER NOT NULL DEFAULT 0")
-        if not _column_exists(conn, "users", "cf_streak"):
-            conn.execute("ALTER TABLE users ADD COLUMN cf_streak INTEGER NOT NULL DEFAULT 0")
-        if not _column_exists(conn, "users", "created_at"):
-            conn.execute("ALTER TABLE users ADD COLUMN created_at INTEGER NOT NULL DEFAULT (strftime('%s','now'))")
-
-        # migration si tu avais une vieille DB sans bank
-        if not _column_exists(conn, "clans", "bank"):
-            conn.execute("ALTER TABLE clans ADD COLUMN bank INTEGER NOT NULL DEFAULT 0")
+    """)
+    # user_clan_id & co : recherche par user_id = seek d'index
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_clan_members_user ON clan_members(user_id)")
+    # /clan members : index couvrant pour la pagination par (role, user_id)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_clan_members_roster ON clan_members(clan_id, role, user_id, joined_at)")
+
+
+def _m004_clan_invite_indexes(conn: sqlite3.Connection):
+    # boîte de réception /clan invites et /clan accept
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_clan_invites_user ON clan_invites(user_id, created_at)")
+    # balayage des invitations expirées
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_clan_invites_created ON clan_invites(created_at)")
+
+
+def _m005_clan_economy(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS clan_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        clan_id INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        delta INTEGER NOT NULL,
+        tick INTEGER,
+        ts INTEGER NOT NULL DEFAULT (strftime('%s','now'))
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_clan_logs_clan_ts ON clan_logs(clan_id, ts)")
+    # dernier tick appliqué par job planifié : rejouer un tick déjà fait est un no-op
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS economy_jobs (
+        name TEXT PRIMARY KEY,
+        last_tick INTEGER NOT NULL
+    )
+    """)
+
+
+def _m006_season_snapshots(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS season_snapshots (
+        season TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        balance INTEGER NOT NULL,
+        xp INTEGER NOT NULL,
+        level INTEGER NOT NULL,
+        draws INTEGER NOT NULL,
+        archived_at INTEGER NOT NULL DEFAULT (strftime('%s','now')),
+        PRIMARY KEY (season, user_id)
+    )
+    """)
+
+
+def _m007_cooldown_reminders(conn: sqlite3.Connection):
+    # préférence /rappels par joueur ; rappel armé porté par la ligne de cooldown
+    if not _column_exists(conn, "users", "reminders"):
+        conn.execute("ALTER TABLE users ADD COLUMN reminders INTEGER NOT NULL DEFAULT 0")
+    if not _column_exists(conn, "cooldowns", "remind"):
+        conn.execute("ALTER TABLE cooldowns ADD COLUMN remind INTEGER NOT NULL DEFAULT 0")
+    if not _column_exists(conn, "cooldowns", "remind_channel"):
+        conn.execute("ALTER TABLE cooldowns ADD COLUMN remind_channel INTEGER")
+    # rechargement au démarrage : seules les lignes armées sont indexées
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_cooldowns_remind "
+        "ON cooldowns(next_ts, user_id, key, remind, remind_channel) WHERE remind > 0"
+    )
+
+
+def _m008_fair_rng(conn: sqlite3.Connection):
+    # graines serveur (hash publié avant, graine révélée à la rotation) + référence du tirage dans le ledger
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rng_seeds (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        game TEXT NOT NULL,
+        seed TEXT NOT NULL,
+        commitment TEXT NOT NULL,
+        created_at INTEGER NOT NULL,
+        revealed_at INTEGER
+    )
+    """)
+    if not _column_exists(conn, "logs", "seed_id"):
+        conn.execute("ALTER TABLE logs ADD COLUMN seed_id INTEGER")
+    if not _column_exists(conn, "logs", "nonce"):
+        conn.execute("ALTER TABLE logs ADD COLUMN nonce INTEGER")
+
+
+def _m009_season_boards(conn: sqlite3.Connection):
+    # cumuls par jour UTC (ts / 86400) alimentés depuis logs et clan_logs (curseur dans economy_jobs)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_daily (
+        day INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        net INTEGER NOT NULL DEFAULT 0,
+        games INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, user_id)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS clan_daily (
+        day INTEGER NOT NULL,
+        clan_id INTEGER NOT NULL,
+        growth INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, clan_id)
+    )
+    """)
+    # /top saison : une plage de clé primaire, déjà triée par rang
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+        period TEXT NOT NULL,
+        season TEXT NOT NULL,
+        board TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        entity_id INTEGER NOT NULL,
+        label TEXT,
+        value INTEGER NOT NULL,
+        computed_at INTEGER NOT NULL,
+        PRIMARY KEY (period, season, board, rank)
+    )
+    """)
+
+
+def _m010_client_seeds(conn: sqlite3.Connection):
+    # graine client par joueur (copiée dans chaque ligne de jeu) + propriétaire des graines serveur
+    if not _column_exists(conn, "users", "client_seed"):
+        conn.execute("ALTER TABLE users ADD COLUMN client_seed TEXT NOT NULL DEFAULT ''")
+    if not _column_exists(conn, "logs", "client_seed"):
+        conn.execute("ALTER TABLE logs ADD COLUMN client_seed TEXT")
+    if not _column_exists(conn, "rng_seeds", "owner"):
+        conn.execute("ALTER TABLE rng_seeds ADD COLUMN owner TEXT")
+
+
+def _m011_ledger_rounds(conn: sqlite3.Connection):
+    # tours joués par une ligne de jeu (sessions autoplay) ; NULL = lignes d'avant, comptées pour 1
+    if not _column_exists(conn, "logs", "rounds"):
+        conn.execute("ALTER TABLE logs ADD COLUMN rounds INTEGER")
+
+
+MIGRATIONS = [
+    _m001_base,
+    _m002_hot_indexes,
+    _m003_clan_members_unique_user,
+    _m004_clan_invite_indexes,
+    _m005_clan_economy,
+    _m006_season_snapshots,
+    _m007_cooldown_reminders,
+    _m008_fair_rng,
+    _m009_season_boards,
+    _m010_client_seeds,
+    _m011_ledger_rounds,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+@dataclass
+class Backfill:
+    table: str
+    set_sql: str
+    where_sql: str
+
+
+# remplissages en ligne : lots de BACKFILL_BATCH rowids, commit entre chaque lot
+BACKFILLS: Dict[str, Backfill] = {
+    "users_created_at": Backfill("users", "created_at = strftime('%s','now')", "created_at = 0"),
+    "clan_invites_created_at": Backfill("clan_invites", "created_at = strftime('%s','now')", "created_at = 0"),
+}
+BACKFILL_BATCH = 5000
+BACKFILL_PAUSE = 0.05
 
-        conn.commit()
 
+def schedule_backfill(conn: sqlite3.Connection, name: str):
+    conn.execute("INSERT OR IGNORE INTO schema_backfills(name) VALUES(?)", (name,))
 
-def ensure_user(user_id: int):
+
+def _migrate():
     with db_connect() as conn:
-        row = conn.execute("SELECT 1 FROM users WHERE user_id=?", (user_id,)).fetchone()
-        if not row:
-            conn.execute(
-                "INSERT INTO users(user_id, balance, xp, level) VALUES(?,?,?,?)",
-                (user_id, START_BALANCE, 0, 1),
-            )
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # relu sous verrou : un autre process a pu migrer entre-temps
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, migrate in enumerate(MIGRATIONS, start=1):
+                if target > version:
+                    migrate(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
             conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
 
-def get_user(user_id: int) -> sqlite3.Row:
-    ensure_user(user_id)
+def db_init():
     with db_connect() as conn:
-        return conn.execute("SELECT * FROM users WHERE user_id=?", (user_id,)).fetchone()
+        # base neuve : auto_vacuum doit être posé avant la première table
+        # (une base existante est convertie par la maintenance, cf. run_maintenance)
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # WAL (persistant) : les lectures ne bloquent plus les écritures
+        conn.execute("PRAGMA journal_mode = WAL")
+    _migrate()
 
 
-def add_balance(user_id: int, delta: int, action: str = "unknown") -> int:
-    ensure_user(user_id)
+def backfill_step(name: str) -> bool:
+    """
+    Traite un lot d'un backfill. returns: True s'il reste du travail
+    """
+    bf = BACKFILLS[name]
     with db_connect() as conn:
-        conn.execute("UPDATE users SET balance = balance + ? WHERE user_id=?", (delta, user_id))
-        conn.execute("INSERT INTO logs(user_id, action, delta) VALUES(?,?,?)", (user_id, action, delta))
+        row = conn.execute("SELECT last_rowid, done FROM schema_backfills WHERE name=?", (name,)).fetchone()
+        if not row or row["done"]:
+            return False
+        start = int(row["last_rowid"])
+        end = start + BACKFILL_BATCH
+        conn.execute(
+            f"UPDATE {bf.table} SET {bf.set_sql} WHERE rowid > ? AND rowid <= ? AND {bf.where_sql}",
+            (start, end),
+        )
+        max_rowid = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) AS m FROM {bf.table}").fetchone()["m"]
+        done = end >= max_rowid
+        conn.execute("UPDATE schema_backfills SET last_rowid=?, done=? WHERE name=?", (end, int(done), name))
         conn.commit()
-        bal = conn.execute("SELECT balance FROM users WHERE user_id=?", (user_id,)).fetchone()["balance"]
-        return int(bal)
+        return not done
 
 
-def set_balance(user_id: int, amount: int):
-    ensure_user(user_id)
+def pending_backfills() -> List[str]:
     with db_connect() as conn:
-        conn.execute("UPDATE users SET balance=? WHERE user_id=?", (amount, user_id))
-        conn.commit()
+        rows = conn.execute("SELECT name FROM schema_backfills WHERE done=0").fetchall()
+        return [r["name"] for r in rows if r["name"] in BACKFILLS]
 
 
-def add_draws(user_id: int, n: int = 1):
-    ensure_user(user_id)
-    with db_connect() as conn:
-        conn.execute("UPDATE users SET draws = draws + ? WHERE user_id=?", (n, user_id))
-        conn.commit()
+async def run_backfills():
+    for name in pending_backfills():
+        while backfill_step(name):
+            await asyncio.sleep(BACKFILL_PAUSE)
+        print(f"✅ Backfill {name} terminé")
 
 
-def get_top(limit: int = 10) -> List[sqlite3.Row]:
-    with db_connect() as conn:
-        return conn.execute(
-            "SELECT user_id, balance FROM users ORDER BY balance DESC LIMIT ?",
-            (limit,),
-        ).fetchall()
+# =========================
+# STORAGE (backends)
+# =========================
+# Les commandes passent par STORE (joueurs, cooldowns, ledger, clans) ; le backend
+# est choisi par STORE_BACKEND. Les jobs d'exploitation (migrations, backfills,
+# backups, maintenance, économie de clan, opérations en masse, export) restent
+# propres à SQLite et ne tournent qu'avec SqliteStore.
+class Store(abc.ABC):
+    name = "abstract"
+    # écriture en échec = transaction annulée : le même appel peut être rejoué sans double effet
+    retry_safe = True
+    # appelable depuis un thread de travail pendant que la boucle lit le même store
+    thread_safe = True
+
+    def init(self):
+        pass
 
+    async def run(self, op: str, *args):
+        """
+        Opération de l'interface appelée depuis la boucle asyncio. Backends
+        locaux : appel direct ; RemoteStore : aller-retour asynchrone au démon.
+        """
+        result = getattr(self, op)(*args)
+        return await result if op in STORE_ASYNC_OPS else result
+
+    # --- joueurs + ledger ---
+    @abc.abstractmethod
+    def ensure_user(self, user_id: int):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_user(self, user_id: int):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add_balance(
+        self, user_id: int, delta: int, action: str = "unknown",
+        seed_id: Optional[int] = None, nonce: Optional[int] = None, client_seed: Optional[str] = None,
+        rounds: Optional[int] = None,
+    ) -> int:
+        """
+        Solde et ligne de ledger dans la même transaction. seed_id/nonce/client_seed :
+        tirage vérifiable ; rounds : tours joués (jeux, autoplay compris).
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add_balance_if(
+        self, user_id: int, delta: int, required: int, action: str = "unknown",
+        seed_id: Optional[int] = None, nonce: Optional[int] = None, client_seed: Optional[str] = None,
+        rounds: Optional[int] = None,
+    ) -> Optional[int]:
+        """
+        Écriture conditionnelle (UPDATE ... WHERE balance >= required) : la mise
+        est revérifiée au commit, même si un autre process a dépensé entre-temps.
+        returns: nouveau solde, None si le solde ne couvre plus `required`
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add_balances(self, deltas: List[Tuple[int, int]], action: str) -> List[Tuple[int, int]]:
+        """Crédits groupés, ledger compris, en une transaction. returns: (user_id, nouveau solde)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_balance(self, user_id: int, amount: int):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def create_rng_seed(self, game: str, seed: str, commitment: str, owner: str) -> int:
+        """returns: seed_id"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def reveal_rng_seed(self, seed_id: int):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def reveal_stale_rng_seeds(self, owner: str) -> int:
+        """Graines de `owner` (ou d'avant la colonne) jamais révélées : arrêt brutal. returns: graines révélées"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_client_seed(self, user_id: int) -> str:
+        """returns: graine client du joueur ("" par défaut)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_client_seed(self, user_id: int, client_seed: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_rng_seed(self, seed_id: int):
+        """returns: ligne rng_seeds (id, game, seed, commitment, created_at, revealed_at, owner) ou None"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def revealed_rng_seeds(self, limit: int = 5) -> list:
+        """returns: dernières graines révélées, plus récentes d'abord"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_ledger_row(self, log_id: int):
+        """returns: ligne logs ou None"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_cf_streak(self, user_id: int) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_cf_streak(self, user_id: int, streak: int):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def apply_progress(self, gains: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int, int]]:
+        """
+        gains : (user_id, xp, tirages). Crédite les bonus de palier (ligne de ledger
+        level_bonus dans la même transaction).
+        returns: passages de niveau (user_id, level, bonus, solde)
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def top_users(self, limit: int) -> list:
+        raise NotImplementedError
+
+    # --- cooldowns ---
+    @abc.abstractmethod
+    def get_cd(self, user_id: int, key: str) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_cd(self, user_id: int, key: str, next_ts: int, channel_id: Optional[int] = None) -> int:
+        """Arme aussi le rappel si le joueur l'a demandé. returns: mode de rappel (REMIND_OFF = aucun)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_reminder_mode(self, user_id: int, mode: int, channel_id: Optional[int] = None) -> list:
+        """
+        Préférence /rappels, appliquée aussi aux cooldowns en cours.
+        returns: (key, next_ts, remind_channel) des rappels armés
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def pending_reminders(self) -> list:
+        """returns: (user_id, key, next_ts, remind, remind_channel) des rappels armés"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clear_reminders(self, rows: List[Tuple[int, str, int]]):
+        """rows : (user_id, key, next_ts) traités ; un cooldown réarmé depuis n'est pas touché"""
+        raise NotImplementedError
+
+    # --- clans ---
+    @abc.abstractmethod
+    def clans_snapshot(self) -> Tuple[list, list]:
+        """returns: (clans id/name/owner_id/bank, membres clan_id/user_id/role)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_banks(self) -> List[Tuple[int, int]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def top_clans(self, limit: int) -> list:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_create(self, name: str, owner_id: int) -> Optional[int]:
+        """returns: id du clan, None si le nom (ou le owner) est déjà pris"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_rename(self, clan_id: int, name: str) -> bool:
+        """returns: False si le nom est déjà pris"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_delete(self, clan_id: int):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_bank_add(self, clan_id: int, delta: int, action: str = "unknown", required: int = 0) -> Optional[int]:
+        """
+        Écrit aussi une ligne clan_logs (progression de la banque sur la saison).
+        Conditionnel comme add_balance_if : rien n'est écrit si bank < required.
+        returns: nouvelle banque, None si refusé (ou clan inconnu)
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_invite(self, clan_id: int, user_id: int, invited_by: int):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_invites_for(self, user_id: int, cutoff: int, limit: int) -> list:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_accept(self, clan_id: int, user_id: int):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_leave(self, clan_id: int, user_id: int):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_set_role(self, clan_id: int, user_id: int, role: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_transfer(self, clan_id: int, old_owner: int, new_owner: int):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clan_roster_page(self, clan_id: int, role: Optional[str], after: Optional[Tuple[str, int]], limit: int) -> list:
+        raise NotImplementedError
+
+    # --- classements saisonniers ---
+    @abc.abstractmethod
+    def rollup_ledger(self, batch: int) -> int:
+        """
+        Cumule par jour les lignes de logs (jeux) et clan_logs écrites depuis le
+        passage précédent, au plus `batch` ids par table. returns: ids consommés (0 = à jour)
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def snapshot_season(self, period: str, season: str, start_day: int, end_day: int, size: int) -> int:
+        """
+        Remplace les classements d'une saison par le top `size` des cumuls sur
+        [start_day, end_day). returns: lignes écrites
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def season_board(self, period: str, season: str, board: str, limit: int) -> list:
+        """returns: lignes (rank, entity_id, label, value, computed_at) par rang"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_job_mark(self, name: str) -> Optional[int]:
+        """returns: valeur economy_jobs du job, None s'il n'a jamais tourné"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_job_mark(self, name: str, value: int):
+        raise NotImplementedError
+
+
+_USER_INSERT = (
+    "INSERT INTO users(user_id, balance, xp, level, created_at) VALUES(?,?,0,1,?) "
+    "ON CONFLICT(user_id) DO NOTHING"
+)
+_LEDGER_INSERT = (
+    "INSERT INTO logs(user_id, action, delta, ts, seed_id, nonce, client_seed, rounds) VALUES(?,?,?,?,?,?,?,?)"
+)
+_CLAN_LEDGER_INSERT = "INSERT INTO clan_logs(clan_id, action, delta, ts) VALUES(?,?,?,?)"
+_JOB_MARK_UPSERT = (
+    "INSERT INTO economy_jobs(name, last_tick) VALUES(?, ?) "
+    "ON CONFLICT(name) DO UPDATE SET last_tick=excluded.last_tick"
+)
+# lignes de jeu (seed_id posé) : gain net, et tours joués hors versements de gain
+# (rounds NULL : ligne d'avant la colonne, un tour)
+_LEDGER_ROLLUP = f"""
+    INSERT INTO ledger_daily(day, user_id, net, games)
+    SELECT ts / 86400, user_id, SUM(delta),
+           SUM(CASE WHEN action IN ({", ".join("?" * len(SEASON_PAYOUT_ACTIONS))}) THEN 0 ELSE COALESCE(rounds, 1) END)
+    FROM logs WHERE id > ? AND id <= ? AND seed_id IS NOT NULL
+    GROUP BY ts / 86400, user_id
+    ON CONFLICT(day, user_id) DO UPDATE SET
+        net = ledger_daily.net + excluded.net, games = ledger_daily.games + excluded.games
+"""
+_CLAN_ROLLUP = """
+    INSERT INTO clan_daily(day, clan_id, growth)
+    SELECT ts / 86400, clan_id, SUM(delta)
+    FROM clan_logs WHERE id > ? AND id <= ?
+    GROUP BY ts / 86400, clan_id
+    ON CONFLICT(day, clan_id) DO UPDATE SET growth = clan_daily.growth + excluded.growth
+"""
+# (board, requête) : top des cumuls sur [start_day, end_day), valeurs > 0 seulement
+_SEASON_BOARDS = (
+    ("gains", """
+        SELECT user_id AS entity_id, NULL AS label, SUM(net) AS value FROM ledger_daily
+        WHERE day >= ? AND day < ? GROUP BY user_id HAVING SUM(net) > 0
+        ORDER BY value DESC, entity_id LIMIT ?
+    """),
+    ("parties", """
+        SELECT user_id AS entity_id, NULL AS label, SUM(games) AS value FROM ledger_daily
+        WHERE day >= ? AND day < ? GROUP BY user_id HAVING SUM(games) > 0
+        ORDER BY value DESC, entity_id LIMIT ?
+    """),
+    ("clans", """
+        SELECT d.clan_id AS entity_id, c.name AS label, SUM(d.growth) AS value
+        FROM clan_daily d JOIN clans c ON c.id = d.clan_id
+        WHERE d.day >= ? AND d.day < ? GROUP BY d.clan_id, c.name HAVING SUM(d.growth) > 0
+        ORDER BY value DESC, entity_id LIMIT ?
+    """),
+)
+_SEASON_BOARD_SELECT = (
+    "SELECT rank, entity_id, label, value, computed_at FROM leaderboard_snapshots "
+    "WHERE period=? AND season=? AND board=? ORDER BY rank LIMIT ?"
+)
+
+
+class SqlStore(Store):
+    """
+    SQL commun SQLite / PostgreSQL (ON CONFLICT, RETURNING, comparaisons de tuples),
+    écrit avec des paramètres `?` et traduit selon `placeholder`. Les horodatages
+    sont passés explicitement (pas de DEFAULT strftime côté PostgreSQL).
+    """
 
-def get_cd(user_id: int, key: str) -> int:
-    ensure_user(user_id)
-    with db_connect() as conn:
-        row = conn.execute(
-            "SELECT next_ts FROM cooldowns WHERE user_id=? AND key=?",
-            (user_id, key),
-        ).fetchone()
+    placeholder = "?"
+    integrity_error: type = sqlite3.IntegrityError
+
+    def connect(self):
+        raise NotImplementedError
+
+    def _sql(self, query: str) -> str:
+        return query if self.placeholder == "?" else query.replace("?", self.placeholder)
+
+    def _exec(self, conn, query: str, params: tuple = ()):
+        return conn.execute(self._sql(query), params)
+
+    @contextlib.contextmanager
+    def tx(self):
+        conn = self.connect()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _fetchall(self, query: str, params: tuple = ()) -> list:
+        with self.tx() as conn:
+            return self._exec(conn, query, params).fetchall()
+
+    def _fetchone(self, query: str, params: tuple = ()):
+        with self.tx() as conn:
+            return self._exec(conn, query, params).fetchone()
+
+    # --- joueurs + ledger ---
+    def ensure_user(self, user_id: int):
+        # lecture d'abord : dans le cas courant le joueur existe, pas de verrou d'écriture
+        if self._fetchone("SELECT 1 FROM users WHERE user_id=?", (user_id,)) is None:
+            with self.tx() as conn:
+                self._exec(conn, _USER_INSERT, (user_id, START_BALANCE, now_ts()))
+
+    def get_user(self, user_id: int):
+        self.ensure_user(user_id)
+        return self._fetchone("SELECT * FROM users WHERE user_id=?", (user_id,))
+
+    def add_balance(
+        self, user_id: int, delta: int, action: str = "unknown",
+        seed_id: Optional[int] = None, nonce: Optional[int] = None, client_seed: Optional[str] = None,
+        rounds: Optional[int] = None,
+    ) -> int:
+        ts = now_ts()
+        with self.tx() as conn:
+            self._exec(conn, _USER_INSERT, (user_id, START_BALANCE, ts))
+            row = self._exec(
+                conn, "UPDATE users SET balance = balance + ? WHERE user_id=? RETURNING balance", (delta, user_id)
+            ).fetchone()
+            self._exec(conn, _LEDGER_INSERT, (user_id, action, delta, ts, seed_id, nonce, client_seed, rounds))
+        return int(row["balance"])
+
+    def add_balance_if(
+        self, user_id: int, delta: int, required: int, action: str = "unknown",
+        seed_id: Optional[int] = None, nonce: Optional[int] = None, client_seed: Optional[str] = None,
+        rounds: Optional[int] = None,
+    ) -> Optional[int]:
+        ts = now_ts()
+        with self.tx() as conn:
+            self._exec(conn, _USER_INSERT, (user_id, START_BALANCE, ts))
+            row = self._exec(
+                conn,
+                "UPDATE users SET balance = balance + ? WHERE user_id=? AND balance >= ? RETURNING balance",
+                (delta, user_id, required),
+            ).fetchone()
+            if row is None:
+                return None
+            self._exec(conn, _LEDGER_INSERT, (user_id, action, delta, ts, seed_id, nonce, client_seed, rounds))
+        return int(row["balance"])
+
+    def add_balances(self, deltas: List[Tuple[int, int]], action: str) -> List[Tuple[int, int]]:
+        ts = now_ts()
+        out = []
+        with self.tx() as conn:
+            for user_id, delta in deltas:
+                self._exec(conn, _USER_INSERT, (user_id, START_BALANCE, ts))
+                row = self._exec(
+                    conn, "UPDATE users SET balance = balance + ? WHERE user_id=? RETURNING balance", (delta, user_id)
+                ).fetchone()
+                out.append((user_id, int(row["balance"])))
+            for user_id, delta in deltas:
+                self._exec(conn, _LEDGER_INSERT, (user_id, action, delta, ts, None, None, None, None))
+        return out
+
+    def set_balance(self, user_id: int, amount: int):
+        with self.tx() as conn:
+            self._exec(conn, _USER_INSERT, (user_id, START_BALANCE, now_ts()))
+            self._exec(conn, "UPDATE users SET balance=? WHERE user_id=?", (amount, user_id))
+
+    def create_rng_seed(self, game: str, seed: str, commitment: str, owner: str) -> int:
+        with self.tx() as conn:
+            row = self._exec(
+                conn,
+                "INSERT INTO rng_seeds(game, seed, commitment, created_at, owner) VALUES(?,?,?,?,?) RETURNING id",
+                (game, seed, commitment, now_ts(), owner),
+            ).fetchone()
+        return int(row["id"])
+
+    def reveal_rng_seed(self, seed_id: int):
+        with self.tx() as conn:
+            self._exec(
+                conn, "UPDATE rng_seeds SET revealed_at=? WHERE id=? AND revealed_at IS NULL", (now_ts(), seed_id)
+            )
+
+    def reveal_stale_rng_seeds(self, owner: str) -> int:
+        with self.tx() as conn:
+            rows = self._exec(
+                conn,
+                "UPDATE rng_seeds SET revealed_at=? WHERE revealed_at IS NULL AND (owner=? OR owner IS NULL) RETURNING id",
+                (now_ts(), owner),
+            ).fetchall()
+        return len(rows)
+
+    def get_client_seed(self, user_id: int) -> str:
+        row = self._fetchone("SELECT client_seed FROM users WHERE user_id=?", (user_id,))
+        return row["client_seed"] if row else ""
+
+    def set_client_seed(self, user_id: int, client_seed: str):
+        with self.tx() as conn:
+            self._exec(conn, _USER_INSERT, (user_id, START_BALANCE, now_ts()))
+            self._exec(conn, "UPDATE users SET client_seed=? WHERE user_id=?", (client_seed, user_id))
+
+    def get_rng_seed(self, seed_id: int):
+        return self._fetchone("SELECT * FROM rng_seeds WHERE id=?", (seed_id,))
+
+    def revealed_rng_seeds(self, limit: int = 5) -> list:
+        return self._fetchall(
+            "SELECT * FROM rng_seeds WHERE revealed_at IS NOT NULL ORDER BY id DESC LIMIT ?", (limit,)
+        )
+
+    def get_ledger_row(self, log_id: int):
+        return self._fetchone("SELECT * FROM logs WHERE id=?", (log_id,))
+
+    def get_cf_streak(self, user_id: int) -> int:
+        row = self._fetchone("SELECT cf_streak FROM users WHERE user_id=?", (user_id,))
+        return int(row["cf_streak"]) if row else 0
+
+    def set_cf_streak(self, user_id: int, streak: int):
+        with self.tx() as conn:
+            self._exec(conn, _USER_INSERT, (user_id, START_BALANCE, now_ts()))
+            self._exec(conn, "UPDATE users SET cf_streak = ? WHERE user_id=?", (streak, user_id))
+
+    def apply_progress(self, gains: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int, int]]:
+        ups = []
+        ts = now_ts()
+        with self.tx() as conn:
+            for user_id, xp_gain, draws in gains:
+                self._exec(conn, _USER_INSERT, (user_id, START_BALANCE, ts))
+                # incrément relatif d'abord : la ligne reste verrouillée jusqu'au commit
+                row = self._exec(
+                    conn, "UPDATE users SET xp = xp + ?, draws = draws + ? WHERE user_id=? RETURNING xp, level",
+                    (xp_gain, draws, user_id),
+                ).fetchone()
+                xp, level, bonus = level_progress(int(row["xp"]), int(row["level"]))
+                if level != int(row["level"]):
+                    row = self._exec(
+                        conn, "UPDATE users SET xp=?, level=?, balance = balance + ? WHERE user_id=? RETURNING balance",
+                        (xp, level, bonus, user_id),
+                    ).fetchone()
+                    if bonus > 0:
+                        self._exec(conn, _LEDGER_INSERT, (user_id, "level_bonus", bonus, ts, None, None, None, None))
+                    ups.append((user_id, level, bonus, int(row["balance"])))
+        return ups
+
+    async def top_users(self, limit: int) -> list:
+        return await asyncio.to_thread(
+            self._fetchall, "SELECT user_id, balance FROM users ORDER BY balance DESC LIMIT ?", (limit,)
+        )
+
+    # --- cooldowns ---
+    def get_cd(self, user_id: int, key: str) -> int:
+        row = self._fetchone("SELECT next_ts FROM cooldowns WHERE user_id=? AND key=?", (user_id, key))
         return int(row["next_ts"]) if row else 0
 
+    def set_cd(self, user_id: int, key: str, next_ts: int, channel_id: Optional[int] = None) -> int:
+        with self.tx() as conn:
+            self._exec(conn, _USER_INSERT, (user_id, START_BALANCE, now_ts()))
+            row = self._exec(
+                conn,
+                """
+                INSERT INTO cooldowns(user_id, key, next_ts, remind, remind_channel)
+                VALUES(?, ?, ?, (SELECT reminders FROM users WHERE user_id=?), ?)
+                ON CONFLICT(user_id, key) DO UPDATE SET
+                    next_ts=excluded.next_ts, remind=excluded.remind, remind_channel=excluded.remind_channel
+                RETURNING remind
+                """,
+                (user_id, key, next_ts, user_id, channel_id),
+            ).fetchone()
+        return int(row["remind"])
+
+    def set_reminder_mode(self, user_id: int, mode: int, channel_id: Optional[int] = None) -> list:
+        ts = now_ts()
+        with self.tx() as conn:
+            self._exec(conn, _USER_INSERT, (user_id, START_BALANCE, ts))
+            self._exec(conn, "UPDATE users SET reminders=? WHERE user_id=?", (mode, user_id))
+            if not mode:
+                self._exec(conn, "UPDATE cooldowns SET remind=0 WHERE user_id=? AND remind > 0", (user_id,))
+                return []
+            marks = ",".join("?" * len(REMINDER_KEYS))
+            return self._exec(
+                conn,
+                f"""
+                UPDATE cooldowns SET remind=?, remind_channel=COALESCE(remind_channel, ?)
+                WHERE user_id=? AND next_ts > ? AND key IN ({marks})
+                RETURNING key, next_ts, remind_channel
+                """,
+                (mode, channel_id, user_id, ts, *REMINDER_KEYS),
+            ).fetchall()
+
+    def pending_reminders(self) -> list:
+        return self._fetchall(
+            "SELECT user_id, key, next_ts, remind, remind_channel FROM cooldowns WHERE remind > 0 ORDER BY next_ts"
+        )
 
-def set_cd(user_id: int, key: str, next_ts: int):
-    ensure_user(user_id)
-    with db_connect() as conn:
-        conn.execute("""
-            INSERT INTO cooldowns(user_id, key, next_ts)
-            VALUES(?,?,?)
-            ON CONFLICT(user_id, key) DO UPDATE SET next_ts=excluded.next_ts
-        """, (user_id, key, next_ts))
-        conn.commit()
+    def clear_reminders(self, rows: List[Tuple[int, str, int]]):
+        with self.tx() as conn:
+            for user_id, key, next_ts in rows:
+                self._exec(
+                    conn, "UPDATE cooldowns SET remind=0 WHERE user_id=? AND key=? AND next_ts=?", (user_id, key, next_ts)
+                )
+
+    # --- clans ---
+    def clans_snapshot(self) -> Tuple[list, list]:
+        with self.tx() as conn:
+            clans = self._exec(conn, "SELECT id, name, owner_id, bank FROM clans").fetchall()
+            members = self._exec(conn, "SELECT clan_id, user_id, role FROM clan_members").fetchall()
+        return clans, members
+
+    def clan_banks(self) -> List[Tuple[int, int]]:
+        return [(int(r["id"]), int(r["bank"])) for r in self._fetchall("SELECT id, bank FROM clans")]
+
+    async def top_clans(self, limit: int) -> list:
+        return await asyncio.to_thread(
+            self._fetchall, "SELECT name, bank FROM clans ORDER BY bank DESC LIMIT ?", (limit,)
+        )
+
+    def clan_create(self, name: str, owner_id: int) -> Optional[int]:
+        ts = now_ts()
+        try:
+            with self.tx() as conn:
+                row = self._exec(
+                    conn, "INSERT INTO clans(name, owner_id, bank, created_at) VALUES(?,?,0,?) RETURNING id",
+                    (name, owner_id, ts),
+                ).fetchone()
+                clan_id = int(row["id"])
+                self._exec(
+                    conn, "INSERT INTO clan_members(clan_id, user_id, role, joined_at) VALUES(?,?,?,?)",
+                    (clan_id, owner_id, "owner", ts),
+                )
+        except self.integrity_error:
+            return None
+        return clan_id
+
+    def clan_rename(self, clan_id: int, name: str) -> bool:
+        with self.tx() as conn:
+            if self._exec(conn, "SELECT 1 FROM clans WHERE name=? AND id != ?", (name, clan_id)).fetchone():
+                return False
+            self._exec(conn, "UPDATE clans SET name=? WHERE id=?", (name, clan_id))
+        return True
+
+    def clan_delete(self, clan_id: int):
+        with self.tx() as conn:
+            self._exec(conn, "DELETE FROM clan_invites WHERE clan_id=?", (clan_id,))
+            self._exec(conn, "DELETE FROM clan_members WHERE clan_id=?", (clan_id,))
+            self._exec(conn, "DELETE FROM clans WHERE id=?", (clan_id,))
+
+    def clan_bank_add(self, clan_id: int, delta: int, action: str = "unknown", required: int = 0) -> Optional[int]:
+        with self.tx() as conn:
+            row = self._exec(
+                conn, "UPDATE clans SET bank = bank + ? WHERE id=? AND bank >= ? RETURNING bank", (delta, clan_id, required)
+            ).fetchone()
+            if row is None:
+                return None
+            self._exec(conn, _CLAN_LEDGER_INSERT, (clan_id, action, delta, now_ts()))
+        return int(row["bank"])
+
+    def clan_invite(self, clan_id: int, user_id: int, invited_by: int):
+        with self.tx() as conn:
+            self._exec(
+                conn,
+                """
+                INSERT INTO clan_invites(clan_id, user_id, invited_by, created_at) VALUES(?,?,?,?)
+                ON CONFLICT(clan_id, user_id) DO UPDATE SET invited_by=excluded.invited_by, created_at=excluded.created_at
+                """,
+                (clan_id, user_id, invited_by, now_ts()),
+            )
+
+    def clan_invites_for(self, user_id: int, cutoff: int, limit: int) -> list:
+        return self._fetchall(
+            """
+            SELECT clan_id, invited_by, created_at FROM clan_invites
+            WHERE user_id=? AND (created_at >= ? OR created_at = 0)
+            ORDER BY created_at DESC LIMIT ?
+            """,
+            (user_id, cutoff, limit),
+        )
+
+    def clan_accept(self, clan_id: int, user_id: int):
+        with self.tx() as conn:
+            # les autres invitations restent dans la boîte jusqu'à expiration
+            self._exec(conn, "DELETE FROM clan_invites WHERE clan_id=? AND user_id=?", (clan_id, user_id))
+            self._exec(
+                conn, "INSERT INTO clan_members(clan_id, user_id, role, joined_at) VALUES(?,?,?,?)",
+                (clan_id, user_id, "member", now_ts()),
+            )
+
+    def clan_leave(self, clan_id: int, user_id: int):
+        with self.tx() as conn:
+            self._exec(conn, "DELETE FROM clan_members WHERE clan_id=? AND user_id=?", (clan_id, user_id))
+
+    def clan_set_role(self, clan_id: int, user_id: int, role: str):
+        with self.tx() as conn:
+            self._exec(conn, "UPDATE clan_members SET role=? WHERE clan_id=? AND user_id=?", (role, clan_id, user_id))
+
+    def clan_transfer(self, clan_id: int, old_owner: int, new_owner: int):
+        with self.tx() as conn:
+            self._exec(conn, "UPDATE clan_members SET role='member' WHERE clan_id=? AND user_id=?", (clan_id, old_owner))
+            self._exec(conn, "UPDATE clan_members SET role='owner' WHERE clan_id=? AND user_id=?", (clan_id, new_owner))
+            self._exec(conn, "UPDATE clans SET owner_id=? WHERE id=?", (new_owner, clan_id))
+
+    def clan_roster_page(self, clan_id: int, role: Optional[str], after: Optional[Tuple[str, int]], limit: int) -> list:
+        sql = "SELECT user_id, role, joined_at FROM clan_members WHERE clan_id=?"
+        params: list = [clan_id]
+        if role:
+            # role fixé : la clé se réduit à user_id (pas de tri hors index)
+            sql += " AND role=?"
+            params.append(role)
+            if after:
+                sql += " AND user_id < ?"
+                params.append(after[1])
+            sql += " ORDER BY user_id DESC LIMIT ?"
+        else:
+            if after:
+                sql += " AND (role, user_id) < (?, ?)"
+                params.extend(after)
+            sql += " ORDER BY role DESC, user_id DESC LIMIT ?"
+        params.append(limit)
+        return self._fetchall(sql, tuple(params))
+
+    # --- classements saisonniers ---
+    def _rollup_horizon(self, table: str) -> int:
+        """
+        returns: plus grand id de `table` sous lequel toutes les lignes sont
+        commitées. Un seul écrivain (SQLite, démon) : les ids deviennent visibles
+        dans l'ordre, MAX(id) suffit.
+        """
+        return int(self._fetchone(f"SELECT COALESCE(MAX(id), 0) AS m FROM {table}")["m"])
+
+    def rollup_ledger(self, batch: int) -> int:
+        # horizons lus avant la transaction de cumul : le curseur ne passe jamais devant une ligne en vol
+        tops = {table: self._rollup_horizon(table) for table in ("logs", "clan_logs")}
+        consumed = 0
+        with self.tx() as conn:
+            for job, table, query, extra in (
+                ("ledger_rollup", "logs", _LEDGER_ROLLUP, SEASON_PAYOUT_ACTIONS),
+                ("clan_rollup", "clan_logs", _CLAN_ROLLUP, ()),
+            ):
+                row = self._exec(conn, "SELECT last_tick FROM economy_jobs WHERE name=?", (job,)).fetchone()
+                start = int(row["last_tick"]) if row else 0
+                end = min(tops[table], start + batch)
+                if end <= start:
+                    continue
+                self._exec(conn, query, tuple(extra) + (start, end))
+                self._exec(conn, _JOB_MARK_UPSERT, (job, end))
+                consumed += end - start
+        return consumed
+
+    def snapshot_season(self, period: str, season: str, start_day: int, end_day: int, size: int) -> int:
+        # agrégats lus hors transaction d'écriture : le verrou n'est pris que pour le remplacement
+        with self.tx() as conn:
+            boards = [
+                (board, self._exec(conn, query, (start_day, end_day, size)).fetchall()) for board, query in _SEASON_BOARDS
+            ]
+        ts = now_ts()
+        with self.tx() as conn:
+            # lecteurs : ancien ou nouveau classement, jamais un mélange
+            self._exec(conn, "DELETE FROM leaderboard_snapshots WHERE period=? AND season=?", (period, season))
+            for board, rows in boards:
+                for rank, r in enumerate(rows, start=1):
+                    self._exec(
+                        conn,
+                        "INSERT INTO leaderboard_snapshots"
+                        "(period, season, board, rank, entity_id, label, value, computed_at) VALUES(?,?,?,?,?,?,?,?)",
+                        (period, season, board, rank, int(r["entity_id"]), r["label"], int(r["value"]), ts),
+                    )
+        return sum(len(rows) for _, rows in boards)
+
+    async def season_board(self, period: str, season: str, board: str, limit: int) -> list:
+        return await asyncio.to_thread(self._fetchall, _SEASON_BOARD_SELECT, (period, season, board, limit))
+
+    def get_job_mark(self, name: str) -> Optional[int]:
+        row = self._fetchone("SELECT last_tick FROM economy_jobs WHERE name=?", (name,))
+        return int(row["last_tick"]) if row else None
+
+    def set_job_mark(self, name: str, value: int):
+        with self.tx() as conn:
+            self._exec(conn, _JOB_MARK_UPSERT, (name, value))
+
+
+class SqliteStore(SqlStore):
+    name = "sqlite"
+
+    def init(self):
+        db_init()
+
+    def connect(self):
+        return db_connect()
+
+    async def top_users(self, limit: int) -> list:
+        return await READS.fetchall("SELECT user_id, balance FROM users ORDER BY balance DESC LIMIT ?", (limit,))
+
+    async def top_clans(self, limit: int) -> list:
+        return await READS.fetchall("SELECT name, bank FROM clans ORDER BY bank DESC LIMIT ?", (limit,))
+
+    async def season_board(self, period: str, season: str, board: str, limit: int) -> list:
+        return await READS.fetchall(_SEASON_BOARD_SELECT, (period, season, board, limit))
+
+
+_PG_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        balance BIGINT NOT NULL DEFAULT 0,
+        xp BIGINT NOT NULL DEFAULT 0,
+        level INTEGER NOT NULL DEFAULT 1,
+        draws BIGINT NOT NULL DEFAULT 0,
+        steals BIGINT NOT NULL DEFAULT 0,
+        cf_streak INTEGER NOT NULL DEFAULT 0,
+        created_at BIGINT NOT NULL DEFAULT 0,
+        reminders INTEGER NOT NULL DEFAULT 0,
+        client_seed TEXT NOT NULL DEFAULT ''
+    )""",
+    """CREATE TABLE IF NOT EXISTS cooldowns (
+        user_id BIGINT NOT NULL,
+        key TEXT NOT NULL,
+        next_ts BIGINT NOT NULL,
+        remind INTEGER NOT NULL DEFAULT 0,
+        remind_channel BIGINT,
+        PRIMARY KEY (user_id, key)
+    )""",
+    # bases créées avant les rappels
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS reminders INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE cooldowns ADD COLUMN IF NOT EXISTS remind INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE cooldowns ADD COLUMN IF NOT EXISTS remind_channel BIGINT",
+    """CREATE TABLE IF NOT EXISTS logs (
+        id BIGSERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        action TEXT NOT NULL,
+        delta BIGINT NOT NULL,
+        ts BIGINT NOT NULL,
+        seed_id BIGINT,
+        nonce BIGINT,
+        client_seed TEXT,
+        rounds INTEGER
+    )""",
+    "ALTER TABLE logs ADD COLUMN IF NOT EXISTS seed_id BIGINT",
+    "ALTER TABLE logs ADD COLUMN IF NOT EXISTS nonce BIGINT",
+    """CREATE TABLE IF NOT EXISTS rng_seeds (
+        id BIGSERIAL PRIMARY KEY,
+        game TEXT NOT NULL,
+        seed TEXT NOT NULL,
+        commitment TEXT NOT NULL,
+        created_at BIGINT NOT NULL,
+        revealed_at BIGINT,
+        owner TEXT
+    )""",
+    # bases créées avant les graines client
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS client_seed TEXT NOT NULL DEFAULT ''",
+    "ALTER TABLE logs ADD COLUMN IF NOT EXISTS client_seed TEXT",
+    "ALTER TABLE rng_seeds ADD COLUMN IF NOT EXISTS owner TEXT",
+    "ALTER TABLE logs ADD COLUMN IF NOT EXISTS rounds INTEGER",
+    """CREATE TABLE IF NOT EXISTS clans (
+        id BIGSERIAL PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        owner_id BIGINT NOT NULL,
+        bank BIGINT NOT NULL DEFAULT 0,
+        created_at BIGINT NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS clan_members (
+        clan_id BIGINT NOT NULL,
+        user_id BIGINT NOT NULL UNIQUE,
+        role TEXT NOT NULL DEFAULT 'member',
+        joined_at BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (clan_id, user_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS clan_invites (
+        clan_id BIGINT NOT NULL,
+        user_id BIGINT NOT NULL,
+        invited_by BIGINT NOT NULL,
+        created_at BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (clan_id, user_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS clan_logs (
+        id BIGSERIAL PRIMARY KEY,
+        clan_id BIGINT NOT NULL,
+        action TEXT NOT NULL,
+        delta BIGINT NOT NULL,
+        tick BIGINT,
+        ts BIGINT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS economy_jobs (
+        name TEXT PRIMARY KEY,
+        last_tick BIGINT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS ledger_daily (
+        day BIGINT NOT NULL,
+        user_id BIGINT NOT NULL,
+        net BIGINT NOT NULL DEFAULT 0,
+        games BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, user_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS clan_daily (
+        day BIGINT NOT NULL,
+        clan_id BIGINT NOT NULL,
+        growth BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, clan_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+        period TEXT NOT NULL,
+        season TEXT NOT NULL,
+        board TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        entity_id BIGINT NOT NULL,
+        label TEXT,
+        value BIGINT NOT NULL,
+        computed_at BIGINT NOT NULL,
+        PRIMARY KEY (period, season, board, rank)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_users_balance ON users(balance DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_clans_bank ON clans(bank DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_clan_logs_clan_ts ON clan_logs(clan_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_user_ts ON logs(user_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_clan_members_roster ON clan_members(clan_id, role, user_id, joined_at)",
+    "CREATE INDEX IF NOT EXISTS idx_clan_invites_user ON clan_invites(user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_cooldowns_remind ON cooldowns(next_ts) WHERE remind > 0",
+]
+
+
+class PostgresStore(SqlStore):
+    """
+    Même SQL que SqliteStore avec des paramètres %s. Par défaut psycopg 3 sur
+    PG_DSN (dépendance optionnelle) ; `connect` permet de brancher une doublure
+    locale (loadtest.py --store postgres-standin).
+    """
+
+    name = "postgres"
+    placeholder = "%s"
+
+    def __init__(self, dsn: str = "", connect=None, integrity_error: Optional[type] = None):
+        self.dsn = dsn
+        self._connect = connect
+        self._local = threading.local()
+        if integrity_error is not None:
+            self.integrity_error = integrity_error
+        elif connect is None:
+            import psycopg  # optionnel : seulement avec COINSBOT_STORE=postgres
+            self.integrity_error = psycopg.IntegrityError
+
+    def connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._connect is not None:
+                conn = self._connect()
+            else:
+                import psycopg
+                from psycopg.rows import dict_row
+                conn = psycopg.connect(self.dsn, row_factory=dict_row)
+            self._local.conn = conn
+        return conn
+
+    def _rollup_horizon(self, table: str) -> int:
+        # Plusieurs écrivains : un id est pris à l'INSERT mais visible au commit, un id plus
+        # petit peut donc être encore en vol derrière MAX(id). SHARE attend la fin des
+        # transactions qui écrivent dans la table et bloque les suivantes le temps de lire
+        # MAX(id) : tout id sous l'horizon est alors commité ou abandonné.
+        with self.tx() as conn:
+            self._exec(conn, f"LOCK TABLE {table} IN SHARE MODE")
+            return int(self._exec(conn, f"SELECT COALESCE(MAX(id), 0) AS m FROM {table}").fetchone()["m"])
+
+    def init(self):
+        if self._connect is not None:
+            return  # doublure : schéma déjà posé par son propre moteur
+        with self.tx() as conn:
+            for ddl in _PG_SCHEMA:
+                conn.execute(ddl)
+
+
+class MemoryStore(Store):
+    """
+    Tout en dicts, sans I/O : tests et bancs. Pas de persistance ni de
+    partage entre process ; mêmes règles métier que SqlStore.
+    """
+
+    name = "memory"
+    retry_safe = False  # pas de transaction : un échec peut laisser un lot à moitié appliqué
+    thread_safe = False  # dicts sans verrou, parcourus par les lectures de la boucle
+
+    def __init__(self):
+        self.users: Dict[int, dict] = {}
+        self.ledger: List[tuple] = []  # (user_id, action, delta, ts, seed_id, nonce, client_seed, rounds)
+        self.rng_seeds: List[dict] = []
+        self.cooldowns: Dict[Tuple[int, str], int] = {}
+        self.reminders: Dict[Tuple[int, str], Tuple[int, Optional[int]]] = {}  # (user_id, key) -> (remind, salon)
+        self.clans: Dict[int, dict] = {}
+        self.clan_names: Dict[str, int] = {}
+        self.members: Dict[int, dict] = {}  # user_id -> {clan_id, user_id, role, joined_at}
+        self.invites: Dict[int, Dict[int, dict]] = {}  # user_id -> clan_id -> invitation
+        self.next_clan_id = 1
+        self.clan_ledger: List[tuple] = []  # (clan_id, action, delta, ts)
+        self.ledger_daily: Dict[Tuple[int, int], List[int]] = {}  # (day, user_id) -> [net, parties]
+        self.clan_daily: Dict[Tuple[int, int], int] = {}  # (day, clan_id) -> progression
+        self.boards: Dict[Tuple[str, str, str], List[dict]] = {}  # (period, season, board) -> lignes
+        self.jobs: Dict[str, int] = {}
+
+    def _user(self, user_id: int) -> dict:
+        u = self.users.get(user_id)
+        if u is None:
+            u = self.users[user_id] = {
+                "user_id": user_id, "balance": START_BALANCE, "xp": 0, "level": 1,
+                "draws": 0, "steals": 0, "cf_streak": 0, "created_at": now_ts(), "reminders": REMIND_OFF,
+                "client_seed": "",
+            }
+        return u
+
+    # --- joueurs + ledger ---
+    def ensure_user(self, user_id: int):
+        self._user(user_id)
+
+    def get_user(self, user_id: int):
+        return dict(self._user(user_id))
+
+    def add_balance(
+        self, user_id: int, delta: int, action: str = "unknown",
+        seed_id: Optional[int] = None, nonce: Optional[int] = None, client_seed: Optional[str] = None,
+        rounds: Optional[int] = None,
+    ) -> int:
+        u = self._user(user_id)
+        u["balance"] += delta
+        self.ledger.append((user_id, action, delta, now_ts(), seed_id, nonce, client_seed, rounds))
+        return u["balance"]
+
+    def add_balance_if(
+        self, user_id: int, delta: int, required: int, action: str = "unknown",
+        seed_id: Optional[int] = None, nonce: Optional[int] = None, client_seed: Optional[str] = None,
+        rounds: Optional[int] = None,
+    ) -> Optional[int]:
+        if self._user(user_id)["balance"] < required:
+            return None
+        return self.add_balance(user_id, delta, action, seed_id, nonce, client_seed, rounds)
+
+    def add_balances(self, deltas: List[Tuple[int, int]], action: str) -> List[Tuple[int, int]]:
+        ts = now_ts()
+        out = []
+        for user_id, delta in deltas:
+            u = self._user(user_id)
+            u["balance"] += delta
+            out.append((user_id, u["balance"]))
+        self.ledger.extend((user_id, action, delta, ts, None, None, None, None) for user_id, delta in deltas)
+        return out
+
+    def set_balance(self, user_id: int, amount: int):
+        self._user(user_id)["balance"] = amount
+
+    def create_rng_seed(self, game: str, seed: str, commitment: str, owner: str) -> int:
+        seed_id = len(self.rng_seeds) + 1
+        self.rng_seeds.append({
+            "id": seed_id, "game": game, "seed": seed, "commitment": commitment,
+            "created_at": now_ts(), "revealed_at": None, "owner": owner,
+        })
+        return seed_id
+
+    def reveal_rng_seed(self, seed_id: int):
+        row = self.get_rng_seed(seed_id)
+        if row is not None and row["revealed_at"] is None:
+            row["revealed_at"] = now_ts()
+
+    def reveal_stale_rng_seeds(self, owner: str) -> int:
+        stale = [r for r in self.rng_seeds if r["revealed_at"] is None and r["owner"] in (owner, None)]
+        for r in stale:
+            r["revealed_at"] = now_ts()
+        return len(stale)
+
+    def get_client_seed(self, user_id: int) -> str:
+        u = self.users.get(user_id)
+        return u["client_seed"] if u else ""
+
+    def set_client_seed(self, user_id: int, client_seed: str):
+        self._user(user_id)["client_seed"] = client_seed
+
+    def get_rng_seed(self, seed_id: int):
+        return self.rng_seeds[seed_id - 1] if 1 <= seed_id <= len(self.rng_seeds) else None
+
+    def revealed_rng_seeds(self, limit: int = 5) -> list:
+        return [r for r in reversed(self.rng_seeds) if r["revealed_at"] is not None][:limit]
+
+    def get_ledger_row(self, log_id: int):
+        if not 1 <= log_id <= len(self.ledger):
+            return None
+        user_id, action, delta, ts, seed_id, nonce, client_seed, rounds = self.ledger[log_id - 1]
+        return {"id": log_id, "user_id": user_id, "action": action, "delta": delta, "ts": ts,
+                "seed_id": seed_id, "nonce": nonce, "client_seed": client_seed, "rounds": rounds}
+
+    def get_cf_streak(self, user_id: int) -> int:
+        u = self.users.get(user_id)
+        return u["cf_streak"] if u else 0
+
+    def set_cf_streak(self, user_id: int, streak: int):
+        self._user(user_id)["cf_streak"] = streak
+
+    def apply_progress(self, gains: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int, int]]:
+        ups = []
+        for user_id, xp_gain, draws in gains:
+            u = self._user(user_id)
+            u["draws"] += draws
+            xp, level, bonus = level_progress(u["xp"] + xp_gain, u["level"])
+            leveled = level != u["level"]
+            u["xp"], u["level"] = xp, level
+            if leveled:
+                u["balance"] += bonus
+                if bonus > 0:
+                    self.ledger.append((user_id, "level_bonus", bonus, now_ts(), None, None, None, None))
+                ups.append((user_id, level, bonus, u["balance"]))
+        return ups
+
+    async def top_users(self, limit: int) -> list:
+        best = heapq.nlargest(limit, self.users.values(), key=lambda u: u["balance"])
+        return [{"user_id": u["user_id"], "balance": u["balance"]} for u in best]
+
+    # --- cooldowns ---
+    def get_cd(self, user_id: int, key: str) -> int:
+        return self.cooldowns.get((user_id, key), 0)
+
+    def set_cd(self, user_id: int, key: str, next_ts: int, channel_id: Optional[int] = None) -> int:
+        mode = self._user(user_id)["reminders"]
+        self.cooldowns[(user_id, key)] = next_ts
+        self.reminders[(user_id, key)] = (mode, channel_id)
+        return mode
+
+    def set_reminder_mode(self, user_id: int, mode: int, channel_id: Optional[int] = None) -> list:
+        self._user(user_id)["reminders"] = mode
+        ts = now_ts()
+        armed = []
+        for (uid, key), (remind, channel) in list(self.reminders.items()):
+            if uid != user_id:
+                continue
+            if not mode:
+                self.reminders[(uid, key)] = (REMIND_OFF, channel)
+            elif key in REMINDER_KEYS and self.cooldowns[(uid, key)] > ts:
+                channel = channel or channel_id
+                self.reminders[(uid, key)] = (mode, channel)
+                armed.append({"key": key, "next_ts": self.cooldowns[(uid, key)], "remind_channel": channel})
+        return armed
+
+    def pending_reminders(self) -> list:
+        rows = [
+            {"user_id": uid, "key": key, "next_ts": self.cooldowns[(uid, key)], "remind": mode, "remind_channel": ch}
+            for (uid, key), (mode, ch) in self.reminders.items()
+            if mode
+        ]
+        return sorted(rows, key=lambda r: r["next_ts"])
+
+    def clear_reminders(self, rows: List[Tuple[int, str, int]]):
+        for user_id, key, next_ts in rows:
+            if self.cooldowns.get((user_id, key)) == next_ts:
+                self.reminders[(user_id, key)] = (REMIND_OFF, self.reminders[(user_id, key)][1])
+
+    # --- clans ---
+    def clans_snapshot(self) -> Tuple[list, list]:
+        clans = [{k: c[k] for k in ("id", "name", "owner_id", "bank")} for c in self.clans.values()]
+        return clans, [dict(m) for m in self.members.values()]
+
+    def clan_banks(self) -> List[Tuple[int, int]]:
+        return [(cid, c["bank"]) for cid, c in self.clans.items()]
+
+    async def top_clans(self, limit: int) -> list:
+        best = heapq.nlargest(limit, self.clans.values(), key=lambda c: c["bank"])
+        return [{"name": c["name"], "bank": c["bank"]} for c in best]
+
+    def clan_create(self, name: str, owner_id: int) -> Optional[int]:
+        if name in self.clan_names or owner_id in self.members:
+            return None
+        cid = self.next_clan_id
+        self.next_clan_id += 1
+        ts = now_ts()
+        self.clans[cid] = {"id": cid, "name": name, "owner_id": owner_id, "bank": 0, "created_at": ts}
+        self.clan_names[name] = cid
+        self.members[owner_id] = {"clan_id": cid, "user_id": owner_id, "role": "owner", "joined_at": ts}
+        return cid
+
+    def clan_rename(self, clan_id: int, name: str) -> bool:
+        other = self.clan_names.get(name)
+        if other is not None and other != clan_id:
+            return False
+        clan = self.clans[clan_id]
+        self.clan_names.pop(clan["name"], None)
+        clan["name"] = name
+        self.clan_names[name] = clan_id
+        return True
+
+    def clan_delete(self, clan_id: int):
+        clan = self.clans.pop(clan_id, None)
+        if clan is not None:
+            self.clan_names.pop(clan["name"], None)
+        for uid in [uid for uid, m in self.members.items() if m["clan_id"] == clan_id]:
+            del self.members[uid]
+        for inbox in self.invites.values():
+            inbox.pop(clan_id, None)
+
+    def clan_bank_add(self, clan_id: int, delta: int, action: str = "unknown", required: int = 0) -> Optional[int]:
+        clan = self.clans.get(clan_id)
+        if clan is None or clan["bank"] < required:
+            return None
+        clan["bank"] += delta
+        self.clan_ledger.append((clan_id, action, delta, now_ts()))
+        return clan["bank"]
+
+    def clan_invite(self, clan_id: int, user_id: int, invited_by: int):
+        self.invites.setdefault(user_id, {})[clan_id] = {
+            "clan_id": clan_id, "invited_by": invited_by, "created_at": now_ts(),
+        }
+
+    def clan_invites_for(self, user_id: int, cutoff: int, limit: int) -> list:
+        rows = [dict(r) for r in self.invites.get(user_id, {}).values() if r["created_at"] >= cutoff or r["created_at"] == 0]
+        rows.sort(key=lambda r: r["created_at"], reverse=True)
+        return rows[:limit]
+
+    def clan_accept(self, clan_id: int, user_id: int):
+        self.invites.get(user_id, {}).pop(clan_id, None)
+        self.members[user_id] = {"clan_id": clan_id, "user_id": user_id, "role": "member", "joined_at": now_ts()}
+
+    def clan_leave(self, clan_id: int, user_id: int):
+        m = self.members.get(user_id)
+        if m is not None and m["clan_id"] == clan_id:
+            del self.members[user_id]
+
+    def clan_set_role(self, clan_id: int, user_id: int, role: str):
+        m = self.members.get(user_id)
+        if m is not None and m["clan_id"] == clan_id:
+            m["role"] = role
+
+    def clan_transfer(self, clan_id: int, old_owner: int, new_owner: int):
+        self.clan_set_role(clan_id, old_owner, "member")
+        self.clan_set_role(clan_id, new_owner, "owner")
+        self.clans[clan_id]["owner_id"] = new_owner
+
+    def clan_roster_page(self, clan_id: int, role: Optional[str], after: Optional[Tuple[str, int]], limit: int) -> list:
+        rows = [m for m in self.members.values() if m["clan_id"] == clan_id and (not role or m["role"] == role)]
+        rows.sort(key=lambda m: (m["role"], m["user_id"]), reverse=True)
+        if after:
+            key = after if not role else (role, after[1])
+            rows = [m for m in rows if (m["role"], m["user_id"]) < tuple(key)]
+        return [dict(m) for m in rows[:limit]]
+
+    # --- classements saisonniers ---
+    def rollup_ledger(self, batch: int) -> int:
+        start = self.jobs.get("ledger_rollup", 0)
+        end = min(len(self.ledger), start + batch)
+        for user_id, action, delta, ts, seed_id, _, _, rounds in itertools.islice(self.ledger, start, end):
+            if seed_id is not None:
+                day = self.ledger_daily.setdefault((ts // 86400, user_id), [0, 0])
+                day[0] += delta
+                day[1] += 0 if action in SEASON_PAYOUT_ACTIONS else (1 if rounds is None else rounds)
+        clan_start = self.jobs.get("clan_rollup", 0)
+        clan_end = min(len(self.clan_ledger), clan_start + batch)
+        for clan_id, _, delta, ts in itertools.islice(self.clan_ledger, clan_start, clan_end):
+            key = (ts // 86400, clan_id)
+            self.clan_daily[key] = self.clan_daily.get(key, 0) + delta
+        self.jobs["ledger_rollup"], self.jobs["clan_rollup"] = end, clan_end
+        return (end - start) + (clan_end - clan_start)
+
+    def snapshot_season(self, period: str, season: str, start_day: int, end_day: int, size: int) -> int:
+        net: Dict[int, int] = {}
+        games: Dict[int, int] = {}
+        growth: Dict[int, int] = {}
+        for (day, user_id), (n, g) in self.ledger_daily.items():
+            if start_day <= day < end_day:
+                net[user_id] = net.get(user_id, 0) + n
+                games[user_id] = games.get(user_id, 0) + g
+        for (day, clan_id), d in self.clan_daily.items():
+            if start_day <= day < end_day and clan_id in self.clans:
+                growth[clan_id] = growth.get(clan_id, 0) + d
+        ts = now_ts()
+        written = 0
+        for board, totals in (("gains", net), ("parties", games), ("clans", growth)):
+            best = heapq.nsmallest(size, ((-v, k) for k, v in totals.items() if v > 0))
+            self.boards[(period, season, board)] = [
+                {
+                    "rank": rank, "entity_id": k, "value": -v, "computed_at": ts,
+                    "label": self.clans[k]["name"] if board == "clans" else None,
+                }
+                for rank, (v, k) in enumerate(best, start=1)
+            ]
+            written += len(best)
+        return written
+
+    async def season_board(self, period: str, season: str, board: str, limit: int) -> list:
+        return [dict(r) for r in self.boards.get((period, season, board), [])[:limit]]
+
+    def get_job_mark(self, name: str) -> Optional[int]:
+        return self.jobs.get(name)
+
+    def set_job_mark(self, name: str, value: int):
+        self.jobs[name] = value
+
+
+class StoreError(Exception):
+    pass
+
+
+def _jsonable(value):
+    # lignes sqlite3.Row -> dicts, tuples -> listes (réponses du démon)
+    if isinstance(value, sqlite3.Row):
+        return dict(value)
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+class RemoteStore(Store):
+    """
+    Client du démon de stockage (socket Unix, une ligne JSON par requête) :
+    tous les process de shards écrivent via un seul process propriétaire du
+    fichier SQLite. Depuis la boucle (run) : une connexion asyncio, requêtes en
+    pipeline, réponses dans l'ordre ; depuis les threads (call) : une connexion
+    bloquante par thread. Pas de nouvel essai automatique (une requête coupée
+    a pu être appliquée).
+    """
+
+    name = "remote"
+    retry_safe = False  # une requête coupée a pu être appliquée par le démon
+
+    def __init__(self, path: str):
+        self.path = path
+        self.client_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        self._aconn: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.StreamWriter, Deque[asyncio.Future]]] = None
+
+    def _stream(self):
+        f = getattr(self._local, "f", None)
+        if f is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            f = self._local.f = sock.makefile("rwb")
+        return f
+
+    def _request(self, op: str, args) -> bytes:
+        return json.dumps({"op": op, "args": args, "client": self.client_id}).encode() + b"\n"
+
+    @staticmethod
+    def _reply(line: bytes):
+        reply = json.loads(line)
+        if "error" in reply:
+            raise StoreError(reply["error"])
+        return reply["ok"]
+
+    def call(self, op: str, *args):
+        f = self._stream()
+        try:
+            f.write(self._request(op, args))
+            f.flush()
+            line = f.readline()
+        except OSError:
+            self._local.f = None
+            raise
+        if not line:
+            self._local.f = None
+            raise ConnectionError("démon de stockage déconnecté")
+        return self._reply(line)
+
+    async def _connection(self):
+        loop = asyncio.get_running_loop()
+        conn = self._aconn
+        if conn is None or conn[0] is not loop or conn[1].is_closing():
+            reader, writer = await asyncio.open_unix_connection(self.path, limit=STORE_LINE_LIMIT)
+            if self._aconn is not conn:
+                writer.close()  # une autre coroutine s'est connectée pendant l'attente
+                return self._aconn
+            conn = self._aconn = (loop, writer, deque())
+            loop.create_task(self._read_replies(reader, conn))
+        return conn
+
+    async def _read_replies(self, reader: asyncio.StreamReader, conn):
+        # le démon traite une connexion dans l'ordre : la n-ième réponse est celle de la n-ième requête
+        _, writer, pending = conn
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                fut = pending.popleft()
+                if not fut.done():
+                    fut.set_result(line)
+        except (OSError, ValueError, IndexError):
+            pass
+        finally:
+            if self._aconn is conn:
+                self._aconn = None
+            writer.close()
+            while pending:
+                fut = pending.popleft()
+                if not fut.done():
+                    fut.set_exception(ConnectionError("démon de stockage déconnecté"))
+
+    async def run(self, op: str, *args):
+        loop, writer, pending = await self._connection()
+        fut = loop.create_future()
+        pending.append(fut)
+        writer.write(self._request(op, args))
+        await writer.drain()
+        return self._reply(await fut)
+
+    def init(self):
+        self.call("ping")
+
+
+STORE_OPS = frozenset(Store.__abstractmethods__)
+STORE_ASYNC_OPS = frozenset(name for name in STORE_OPS if asyncio.iscoroutinefunction(vars(Store)[name]))
+
+
+def _remote_op(name: str):
+    # méthode de l'interface Store relayée au démon (arguments positionnels, comme sur le fil)
+    if name in STORE_ASYNC_OPS:
+        async def op(self, *args):
+            return await self.run(name, *args)
+    else:
+        def op(self, *args):
+            return self.call(name, *args)
+    op.__name__ = op.__qualname__ = name
+    return op
+
+
+for _name in STORE_OPS:
+    setattr(RemoteStore, _name, _remote_op(_name))
+abc.update_abstractmethods(RemoteStore)  # tous relayés : RemoteStore devient instanciable
+
+
+def make_store(backend: str) -> Store:
+    if backend == "sqlite":
+        return SqliteStore()
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "postgres":
+        return PostgresStore(PG_DSN)
+    if backend == "remote":
+        return RemoteStore(STORE_SOCKET)
+    raise ValueError(f"backend de stockage inconnu : {backend}")
+
+
+STORE: Store = make_store(STORE_BACKEND)
+
+
+# Sur la boucle, les commandes passent par STORE.run : appel direct en local,
+# aller-retour asynchrone au démon avec RemoteStore (la boucle n'attend jamais une socket).
+async def ensure_user(user_id: int):
+    await STORE.run("ensure_user", user_id)
+
+
+async def get_user(user_id: int):
+    return await STORE.run("get_user", user_id)
+
+
+async def add_balance(user_id: int, delta: int, action: str = "unknown", rng: Optional["GameRng"] = None) -> int:
+    # solde + ligne de ledger commités ensemble ; EVENTS ne tient que le classement à jour
+    draw = rng.draw if rng is not None else (None, None, None, None)
+    balance = await STORE.run("add_balance", user_id, delta, action, *draw)
+    EVENTS.publish(BalanceChanged(user_id, delta, action, balance, now_ts()))
+    return balance
+
+
+async def add_balance_if(
+    user_id: int, delta: int, required: int, action: str = "unknown", rng: Optional["GameRng"] = None
+) -> Optional[int]:
+    """
+    Comme add_balance, seulement si le solde couvre encore `required` au commit :
+    les verrous par joueur ne valent que dans ce process, pas entre shards.
+    returns: nouveau solde, None si le solde a baissé entre-temps (rien d'écrit)
+    """
+    draw = rng.draw if rng is not None else (None, None, None, None)
+    balance = await STORE.run("add_balance_if", user_id, delta, required, action, *draw)
+    if balance is None:
+        return None
+    EVENTS.publish(BalanceChanged(user_id, delta, action, balance, now_ts()))
+    return balance
+
+
+async def add_balances(deltas: List[Tuple[int, int]], action: str) -> List[Tuple[int, int]]:
+    # ledger écrit dans la même transaction ; seule l'écriture part en thread, le cache reste sur la boucle
+    balances = await asyncio.to_thread(STORE.add_balances, deltas, action)
+    for user_id, balance in balances:
+        TOP_USERS.apply(user_id, balance)
+    return balances
+
+
+async def set_balance(user_id: int, amount: int):
+    await STORE.run("set_balance", user_id, amount)
+
+
+async def get_top(limit: int = 10) -> list:
+    return await TOP_USERS.get(limit)
+
+
+async def get_cd(user_id: int, key: str) -> int:
+    return await STORE.run("get_cd", user_id, key)
+
+
+async def set_cd(user_id: int, key: str, next_ts: int, channel_id: Optional[int] = None):
+    mode = await STORE.run("set_cd", user_id, key, next_ts, channel_id)
+    if mode:
+        REMINDERS.arm(user_id, key, next_ts, mode, channel_id)
+
+
+async def set_reminder_mode(user_id: int, mode: int, channel_id: Optional[int] = None):
+    REMINDERS.cancel_user(user_id)
+    for r in await STORE.run("set_reminder_mode", user_id, mode, channel_id):
+        REMINDERS.arm(user_id, r["key"], int(r["next_ts"]), mode, r["remind_channel"])
 
 
 # =========================
 # CLANS HELPERS
 # =========================
+@dataclass
+class ClanEntry:
+    id: int
+    name: str
+    owner_id: int
+    bank: int = 0
+    members: int = 0
+    mods: int = 0
+
+
+class ClanDirectory:
+    """
+    Copie en mémoire de clans + clan_members : les lectures de clan sont de
+    simples lookups de dict. Chargée au démarrage, tenue à jour par les
+    chemins d'écriture des commandes de clan (toujours après le commit).
+    """
+
+    def __init__(self):
+        self.members: Dict[int, Tuple[int, str]] = {}  # user_id -> (clan_id, role)
+        self.clans: Dict[int, ClanEntry] = {}
+        self.rosters: Dict[int, set] = {}  # clan_id -> {user_id}
+        self.loaded = False
+
+    def load(self):
+        members: Dict[int, Tuple[int, str]] = {}
+        clans: Dict[int, ClanEntry] = {}
+        rosters: Dict[int, set] = {}
+        clan_rows, member_rows = STORE.clans_snapshot()
+        for r in clan_rows:
+            clans[int(r["id"])] = ClanEntry(int(r["id"]), r["name"], int(r["owner_id"]), int(r["bank"]))
+            rosters[int(r["id"])] = set()
+        for r in member_rows:
+            cid, uid, role = int(r["clan_id"]), int(r["user_id"]), r["role"]
+            entry = clans.get(cid)
+            if entry is None:
+                continue
+            members[uid] = (cid, role)
+            rosters[cid].add(uid)
+            entry.members += 1
+            if role == "mod":
+                entry.mods += 1
+        self.members, self.clans, self.rosters = members, clans, rosters
+        self.loaded = True
+        TOP_CLANS.invalidate()
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def membership(self, user_id: int) -> Optional[Tuple[int, str]]:
+        self.ensure_loaded()
+        return self.members.get(user_id)
+
+    def clan(self, clan_id: int) -> Optional[ClanEntry]:
+        self.ensure_loaded()
+        return self.clans.get(clan_id)
+
+    # --- mises à jour après écriture en DB (le top clans en cache est relu) ---
+    def add_clan(self, clan_id: int, name: str, owner_id: int, bank: int = 0):
+        self.ensure_loaded()
+        self.clans[clan_id] = ClanEntry(clan_id, name, owner_id, bank)
+        self.rosters[clan_id] = set()
+        TOP_CLANS.invalidate()
+
+    def remove_clan(self, clan_id: int):
+        self.ensure_loaded()
+        for uid in self.rosters.pop(clan_id, set()):
+            self.members.pop(uid, None)
+        self.clans.pop(clan_id, None)
+        TOP_CLANS.invalidate()
+
+    def join(self, user_id: int, clan_id: int, role: str = "member"):
+        self.ensure_loaded()
+        entry = self.clans.get(clan_id)
+        if entry is None:
+            return
+        self.leave(user_id)
+        self.members[user_id] = (clan_id, role)
+        self.rosters[clan_id].add(user_id)
+        entry.members += 1
+        if role == "mod":
+            entry.mods += 1
+
+    def leave(self, user_id: int):
+        self.ensure_loaded()
+        current = self.members.pop(user_id, None)
+        if current is None:
+            return
+        cid, role = current
+        self.rosters.get(cid, set()).discard(user_id)
+        entry = self.clans.get(cid)
+        if entry is not None:
+            entry.members -= 1
+            if role == "mod":
+                entry.mods -= 1
+
+    def set_role(self, user_id: int, role: str):
+        self.ensure_loaded()
+        current = self.members.get(user_id)
+        if current is None:
+            return
+        cid, old = current
+        entry = self.clans[cid]
+        entry.mods += (role == "mod") - (old == "mod")
+        if role == "owner":
+            entry.owner_id = user_id
+        self.members[user_id] = (cid, role)
+
+    def rename(self, clan_id: int, name: str):
+        entry = self.clan(clan_id)
+        if entry is not None:
+            entry.name = name
+        TOP_CLANS.invalidate()
+
+    def bank_add(self, clan_id: int, delta: int):
+        entry = self.clan(clan_id)
+        if entry is not None:
+            entry.bank += delta
+
+    def refresh_banks(self, banks: Optional[List[Tuple[int, int]]] = None):
+        """banks : (clan_id, bank) déjà lus (depuis la boucle) ; None = relecture ici"""
+        self.ensure_loaded()
+        for cid, bank in STORE.clan_banks() if banks is None else banks:
+            entry = self.clans.get(cid)
+            if entry is not None:
+                entry.bank = bank
+        TOP_CLANS.invalidate()
+
+
+CLANS = ClanDirectory()
+
+
 def user_clan_id(user_id: int) -> Optional[int]:
-    with db_connect() as conn:
-        row = conn.execute(
-            "SELECT clan_id FROM clan_members WHERE user_id=? LIMIT 1",
-            (user_id,),
-        ).fetchone()
-        return int(row["clan_id"]) if row else None
+    m = CLANS.membership(user_id)
+    return m[0] if m else None
 
 
 def user_clan_role(user_id: int) -> Optional[str]:
-    with db_connect() as conn:
-        row = conn.execute("SELECT role FROM clan_members WHERE user_id=? LIMIT 1", (user_id,)).fetchone()
-        return row["role"] if row else None
+    m = CLANS.membership(user_id)
+    return m[1] if m else None
 
 
-def clan_info_by_id(clan_id: int):
-    with db_connect() as conn:
-        clan = conn.execute("SELECT * FROM clans WHERE id=?", (clan_id,)).fetchone()
-        count = conn.execute(
-            "SELECT COUNT(*) AS c FROM clan_members WHERE clan_id=?",
-            (clan_id,),
-        ).fetchone()["c"]
-        mods = conn.execute(
-            "SELECT COUNT(*) AS c FROM clan_members WHERE clan_id=? AND role='mod'",
-            (clan_id,),
-        ).fetchone()["c"]
-        return clan, int(count), int(mods)
+def clan_info_by_id(clan_id: int) -> Tuple[Optional[ClanEntry], int, int]:
+    clan = CLANS.clan(clan_id)
+    if clan is None:
+        return None, 0, 0
+    return clan, clan.members, clan.mods
 
 
 def clan_name_for_user(user_id: int) -> str:
     cid = user_clan_id(user_id)
-    if not cid:
-        return "Aucun clan"
-    with db_connect() as conn:
-        row = conn.execute("SELECT name FROM clans WHERE id=?", (cid,)).fetchone()
-        return row["name"] if row else "Aucun clan"
+    clan = CLANS.clan(cid) if cid else None
+    return clan.name if clan else "Aucun clan"
 
 
 def is_clan_owner(clan_id: int, user_id: int) -> bool:
-    with db_connect() as conn:
-        row = conn.execute(
-            "SELECT role FROM clan_members WHERE clan_id=? AND user_id=?",
-            (clan_id, user_id),
-        ).fetchone()
-        return bool(row and row["role"] == "owner")
+    m = CLANS.membership(user_id)
+    return bool(m and m[0] == clan_id and m[1] == "owner")
 
 
 def is_clan_mod_or_owner(clan_id: int, user_id: int) -> bool:
-    with db_connect() as conn:
-        row = conn.execute(
-            "SELECT role FROM clan_members WHERE clan_id=? AND user_id=?",
-            (clan_id, user_id),
-        ).fetchone()
-        return bool(row and row["role"] in ("owner", "mod"))
+    m = CLANS.membership(user_id)
+    return bool(m and m[0] == clan_id and m[1] in ("owner", "mod"))
 
 
 def clan_bank_get(clan_id: int) -> int:
-    with db_connect() as conn:
-        row = conn.execute("SELECT bank FROM clans WHERE id=?", (clan_id,)).fetchone()
-        return int(row["bank"]) if row else 0
+    clan = CLANS.clan(clan_id)
+    return clan.bank if clan else 0
+
+
+async def clan_bank_add(clan_id: int, delta: int, action: str = "unknown", required: int = 0) -> Optional[int]:
+    """returns: nouvelle banque, None si elle ne couvre plus `required` (rien d'écrit)"""
+    bank = await STORE.run("clan_bank_add", clan_id, delta, action, required)
+    if bank is None:
+        return None
+    CLANS.bank_add(clan_id, delta)
+    EVENTS.publish(ClanBankChanged(clan_id, delta, clan_bank_get(clan_id)))
+    return bank
+
+
+async def clan_roster_page(
+    clan_id: int,
+    role: Optional[str] = None,
+    after: Optional[Tuple[str, int]] = None,
+    limit: int = 10,
+) -> List[sqlite3.Row]:
+    """
+    Pagination par clé (role, user_id) : owner, puis mods, puis membres.
+    after = (role, user_id) de la dernière ligne de la page précédente.
+    """
+    return await STORE.run("clan_roster_page", clan_id, role, after, limit)
+
 
+async def clan_invites_for(user_id: int, limit: int = 25) -> List[sqlite3.Row]:
+    # created_at = 0 : invitation d'une vieille DB pas encore backfillée, considérée valide
+    return await STORE.run("clan_invites_for", user_id, now_ts() - CLAN_INVITE_TTL, limit)
 
-def clan_bank_add(clan_id: int, delta: int):
+
+def sweep_clan_invites(batch: int = CLAN_INVITE_SWEEP_BATCH) -> int:
+    """
+    Supprime un lot d'invitations expirées. returns: nombre de lignes supprimées
+    """
+    cutoff = now_ts() - CLAN_INVITE_TTL
     with db_connect() as conn:
-        conn.execute("UPDATE clans SET bank = bank + ? WHERE id=?", (delta, clan_id))
+        cur = conn.execute(
+            """
+            DELETE FROM clan_invites WHERE rowid IN (
+                SELECT rowid FROM clan_invites WHERE created_at BETWEEN 1 AND ? LIMIT ?
+            )
+            """,
+            (cutoff, batch),
+        )
         conn.commit()
+        return cur.rowcount
+
 
+async def clan_invite_sweeper():
+    while True:
+        removed = 0
+        while True:
+            n = sweep_clan_invites()
+            removed += n
+            if n < CLAN_INVITE_SWEEP_BATCH:
+                break
+            await asyncio.sleep(0.05)
+        if removed:
+            print(f"🧹 {removed} invitation(s) de clan expirée(s) supprimée(s)")
+        await asyncio.sleep(CLAN_INVITE_SWEEP_EVERY)
+
+
+async def top_clans(limit: int = 10) -> list:
+    return await TOP_CLANS.get(limit)
+
+
+# =========================
+# CLAN ECONOMY (intérêts + revenu passif)
+# =========================
+def _clan_interest_sql() -> str:
+    # CASE construit depuis CLAN_INTEREST_TIERS (entiers de config, pas d'entrée joueur)
+    cases = " ".join(
+        f"WHEN bank >= {int(floor)} THEN bank * {int(bps)} / 10000"
+        for floor, bps in sorted(CLAN_INTEREST_TIERS, reverse=True)
+    )
+    return f"(CASE {cases} ELSE 0 END)"
+
+
+def _job_mark(conn, name: str) -> Optional[int]:
+    row = conn.execute("SELECT last_tick FROM economy_jobs WHERE name=?", (name,)).fetchone()
+    return int(row["last_tick"]) if row else None
+
+
+def _apply_clan_tick(conn, tick: int, now: int, interest: str, floor: int) -> Optional[int]:
+    """
+    Intérêts d'un tick dans leur propre transaction : le verrou d'écriture n'est
+    tenu que le temps d'un UPDATE ensembliste, les commandes passent entre deux ticks.
+    returns: intérêts versés ; None si le tick a déjà été appliqué
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # relu sous le verrou : un autre passage a pu appliquer ce tick entre-temps
+        last = _job_mark(conn, "clan_economy")
+        if last is not None and last >= tick:
+            conn.rollback()
+            return None
+        mark = conn.execute("SELECT COALESCE(MAX(id), 0) AS m FROM clan_logs").fetchone()["m"]
+        # ledger d'abord : les intérêts sont calculés sur la banque avant le tick
+        conn.execute(
+            f"""
+            INSERT INTO clan_logs(clan_id, action, delta, tick, ts)
+            SELECT id, 'interest', {interest}, ?, ? FROM clans
+            WHERE bank >= ? AND {interest} > 0
+            """,
+            (tick, now, floor),
+        )
+        gained = conn.execute("SELECT COALESCE(SUM(delta), 0) AS s FROM clan_logs WHERE id > ?", (mark,)).fetchone()["s"]
+        conn.execute(f"UPDATE clans SET bank = bank + {interest} WHERE bank >= ?", (floor,))
+        conn.execute(_JOB_MARK_UPSERT, ("clan_economy", tick))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return int(gained)
+
+
+def _apply_clan_income(conn, current: int, now: int, default_last: int) -> int:
+    """
+    Revenu des membres pour tous les ticks dus, en une écriture (une ligne de
+    ledger par membre) : il ne se compose pas, inutile de le verser tick par tick.
+    Son propre marqueur le rend rejouable indépendamment des intérêts.
+    returns: total versé
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        last = _job_mark(conn, "clan_income")
+        last = default_last if last is None else last
+        ticks = max(0, current - max(last, current - CLAN_ECONOMY_MAX_CATCHUP))
+        income = CLAN_MEMBER_INCOME * ticks
+        paid = 0
+        if income > 0:
+            conn.execute(
+                "INSERT OR IGNORE INTO users(user_id, balance, created_at) SELECT user_id, ?, ? FROM clan_members",
+                (START_BALANCE, now),
+            )
+            cur = conn.execute(
+                "UPDATE users SET balance = balance + ? WHERE user_id IN (SELECT user_id FROM clan_members)",
+                (income,),
+            )
+            conn.execute(
+                "INSERT INTO logs(user_id, action, delta, ts) SELECT user_id, 'clan_income', ?, ? FROM clan_members",
+                (income, now),
+            )
+            paid = cur.rowcount * income
+        if ticks:
+            conn.execute(_JOB_MARK_UPSERT, ("clan_income", current))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return paid
+
+
+def apply_clan_economy(now: Optional[int] = None) -> Dict[str, int]:
+    """
+    Applique tous les ticks dus depuis le dernier passage, un commit par tick
+    d'intérêts puis un pour le revenu des membres : un rattrapage ne bloque
+    jamais les écritures plus longtemps qu'un tick.
+    Chaque tick = un UPDATE ensembliste sur clans. Jamais de boucle Python par clan.
+    returns: {"ticks": n, "interest": total, "income": total}
+    """
+    now = now if now is not None else now_ts()
+    current = now // CLAN_ECONOMY_TICK
+    interest = _clan_interest_sql()
+    floor = min(f for f, _ in CLAN_INTEREST_TIERS)
+    totals = {"ticks": 0, "interest": 0, "income": 0}
 
-def top_clans(limit: int = 10) -> List[sqlite3.Row]:
     with db_connect() as conn:
-        return conn.execute(
-            "SELECT name, bank FROM clans ORDER BY bank DESC LIMIT ?",
-            (limit,),
-        ).fetchall()
+        # premier lancement : on démarre au tick courant, sans rétroactif
+        last = _job_mark(conn, "clan_economy")
+        last = current - 1 if last is None else last
+        for tick in range(max(last + 1, current - CLAN_ECONOMY_MAX_CATCHUP + 1), current + 1):
+            gained = _apply_clan_tick(conn, tick, now, interest, floor)
+            if gained is not None:
+                totals["ticks"] += 1
+                totals["interest"] += gained
+        # base sans marqueur de revenu : il suivait celui des intérêts
+        totals["income"] = _apply_clan_income(conn, current, now, last)
+    return totals
+
+
+async def clan_economy_loop():
+    while True:
+        totals = await asyncio.to_thread(apply_clan_economy)
+        if totals["ticks"]:
+            CLANS.refresh_banks()
+            if STORE_DAEMON is not None:
+                STORE_DAEMON.publish("clan_banks", [], None)
+            print(
+                f"🏦 Économie clans : {totals['ticks']} tick(s), "
+                f"+{fmt_int(totals['interest'])} intérêts, +{fmt_int(totals['income'])} revenus membres"
+            )
+        next_tick = (now_ts() // CLAN_ECONOMY_TICK + 1) * CLAN_ECONOMY_TICK
+        await asyncio.sleep(max(1, next_tick - now_ts()))
+
+
+# =========================
+# CLASSEMENTS SAISONNIERS
+# =========================
+# Le ledger est cumulé par jour (ledger_daily, clan_daily) au fil de l'eau ; les
+# classements de la semaine / du mois en sont recalculés toutes les
+# SEASON_SNAPSHOT_EVERY secondes dans leaderboard_snapshots, que /top saison lit
+# tel quel. Une saison n'est qu'une plage de jours : changer de saison ne remet
+# rien à zéro, on recalcule la saison close à la clôture puis une fois encore au
+# passage suivant, pour les lignes encore en vol au moment de la clôture.
+def season_bounds(period: str, ts: int) -> Tuple[str, int, int]:
+    """returns: (saison, premier jour, jour de fin exclu) ; jours UTC depuis l'epoch"""
+    day = ts // 86400
+    if period == "semaine":
+        start = day - (day + 3) % 7  # 1970-01-01 était un jeudi
+        year, week, _ = datetime.fromtimestamp(start * 86400, timezone.utc).isocalendar()
+        return f"{year}-S{week:02d}", start, start + 7
+    d = datetime.fromtimestamp(ts, timezone.utc)
+    year, month = (d.year + 1, 1) if d.month == 12 else (d.year, d.month + 1)
+    start = int(datetime(d.year, d.month, 1, tzinfo=timezone.utc).timestamp()) // 86400
+    end = int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp()) // 86400
+    return f"{d.year}-{d.month:02d}", start, end
+
+
+def refresh_seasons(now: Optional[int] = None) -> Dict[str, object]:
+    """
+    Cumule les nouvelles lignes de ledger puis recalcule les classements des
+    saisons en cours, et ceux des saisons closes à la clôture puis au passage
+    suivant. Sans nouvelle ligne ni changement de saison, rien n'est recalculé.
+    returns: {"rows": ids de ledger cumulés, "boards": lignes écrites, "closed": saisons closes}
+    """
+    now = now if now is not None else now_ts()
+    totals = {"rows": 0, "boards": 0, "closed": []}
+    while True:
+        n = STORE.rollup_ledger(SEASON_ROLLUP_BATCH)
+        if not n:
+            break
+        totals["rows"] += n
+    for period in SEASON_PERIODS:
+        season, start, end = season_bounds(period, now)
+        job = f"season_{period}"
+        last = STORE.get_job_mark(job)
+        final = STORE.get_job_mark(f"{job}_final")  # 1er jour de la saison close au passage précédent, -1 sinon
+        if final is not None and final >= 0:
+            if totals["rows"]:
+                closed, closed_start, closed_end = season_bounds(period, final * 86400)
+                totals["boards"] += STORE.snapshot_season(period, closed, closed_start, closed_end, SEASON_BOARD_SIZE)
+            STORE.set_job_mark(f"{job}_final", -1)
+        if last is not None and last != start:
+            closed, closed_start, closed_end = season_bounds(period, last * 86400)
+            totals["boards"] += STORE.snapshot_season(period, closed, closed_start, closed_end, SEASON_BOARD_SIZE)
+            totals["closed"].append(closed)
+            STORE.set_job_mark(f"{job}_final", closed_start)
+        if totals["rows"] or last != start:
+            totals["boards"] += STORE.snapshot_season(period, season, start, end, SEASON_BOARD_SIZE)
+        if last != start:
+            STORE.set_job_mark(job, start)
+    return totals
+
+
+async def season_loop():
+    while True:
+        totals = await asyncio.to_thread(refresh_seasons)
+        for season in totals["closed"]:
+            print(f"🏁 Saison {season} close : classement final enregistré")
+        await asyncio.sleep(SEASON_SNAPSHOT_EVERY)
+
+
+async def season_board(
+    period: str, board: str, previous: bool = False, limit: int = SEASON_BOARD_SIZE
+) -> Tuple[str, list]:
+    """returns: (saison, lignes du dernier classement calculé)"""
+    season, start, _ = season_bounds(period, now_ts())
+    if previous:
+        season, _, _ = season_bounds(period, start * 86400 - 1)
+    return season, await STORE.run("season_board", period, season, board, limit)
+
+
+# =========================
+# BACKUPS (à chaud)
+# =========================
+# sqlite3.Connection.backup copie BACKUP_PAGES pages par pas ; le verrou de lecture
+# n'est tenu que pendant un pas, les écritures du bot passent entre deux pas.
+# Si une autre connexion écrit pendant la copie, SQLite la reprend depuis le début :
+# après BACKUP_MAX_RESTARTS reprises on copie d'un bloc (écritures en attente le
+# temps de la copie, dans la limite du timeout SQLite).
+class _BackupRestarted(Exception):
+    pass
+
+
+@dataclass
+class BackupResult:
+    path: str
+    size: int
+    seconds: float
+    restarts: int
+
+
+def _backup_once(src: sqlite3.Connection, dst: sqlite3.Connection, pages: int, sleep: float):
+    state = {"remaining": None}
+
+    def progress(status, remaining, total):
+        prev = state["remaining"]
+        state["remaining"] = remaining
+        # pas d'avancée entre deux pas = la copie est repartie du début
+        if prev is not None and remaining >= prev:
+            raise _BackupRestarted()
+        if sleep:
+            time.sleep(sleep)
+
+    src.backup(dst, pages=pages, progress=progress if pages > 0 else None)
+
+
+def integrity_ok(path: str) -> bool:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        row = conn.execute("PRAGMA integrity_check").fetchone()
+        return row is not None and row[0] == "ok"
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        conn.close()
+
+
+def backup_db(dest: Optional[str] = None, pages: int = BACKUP_PAGES, sleep: float = BACKUP_STEP_SLEEP) -> BackupResult:
+    """
+    Copie cohérente de DB_PATH, vérifiée (integrity_check) avant d'être renommée.
+    returns: BackupResult
+    """
+    if dest is None:
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(DB_PATH))[0]
+        dest = os.path.join(BACKUP_DIR, f"{stem}-{time.strftime('%Y%m%d-%H%M%S')}.sqlite3")
+    tmp = dest + ".part"
+    t0 = time.perf_counter()
+    restarts = 0
+
+    src = sqlite3.connect(DB_PATH)
+    try:
+        while True:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            dst = sqlite3.connect(tmp)
+            try:
+                _backup_once(src, dst, pages if restarts < BACKUP_MAX_RESTARTS else -1, sleep)
+                break
+            except _BackupRestarted:
+                restarts += 1
+            finally:
+                dst.close()
+    finally:
+        src.close()
+
+    if not integrity_ok(tmp):
+        os.remove(tmp)
+        raise RuntimeError(f"sauvegarde corrompue (integrity_check): {dest}")
+    os.replace(tmp, dest)
+    return BackupResult(dest, os.path.getsize(dest), time.perf_counter() - t0, restarts)
+
+
+def rotate_backups(keep: int = BACKUP_KEEP) -> List[str]:
+    """
+    returns: fichiers supprimés (les plus anciens au-delà de keep)
+    """
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    stem = os.path.splitext(os.path.basename(DB_PATH))[0] + "-"
+    files = sorted(
+        f for f in os.listdir(BACKUP_DIR)
+        if f.startswith(stem) and f.endswith(".sqlite3")
+    )
+    removed = []
+    for f in files[:max(0, len(files) - keep)]:
+        os.remove(os.path.join(BACKUP_DIR, f))
+        removed.append(f)
+    return removed
+
+
+def restore_db(backup_path: str) -> str:
+    """
+    Restaure une sauvegarde vérifiée dans DB_PATH via l'API backup (pas de copie de
+    fichier sous les pieds d'une connexion ouverte). La base courante est d'abord
+    sauvegardée à côté. À lancer bot arrêté.
+    returns: chemin de la sauvegarde de la base remplacée
+    """
+    if not integrity_ok(backup_path):
+        raise RuntimeError(f"sauvegarde illisible ou corrompue: {backup_path}")
+    previous = backup_db(f"{DB_PATH}.pre-restore-{time.strftime('%Y%m%d-%H%M%S')}", pages=-1, sleep=0).path
+    src = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+    dst = sqlite3.connect(DB_PATH)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+    return previous
+
+
+async def backup_loop():
+    while True:
+        await asyncio.sleep(BACKUP_EVERY)
+        try:
+            res = await asyncio.to_thread(backup_db)
+            removed = await asyncio.to_thread(rotate_backups)
+            print(
+                f"💾 Sauvegarde {res.path} ({res.size / 1e6:.1f} Mo, {res.seconds:.1f}s, "
+                f"{res.restarts} reprise(s), {len(removed)} ancienne(s) supprimée(s))"
+            )
+        except Exception as e:
+            print(f"❌ Sauvegarde échouée : {e!r}")
+
+
+# =========================
+# MAINTENANCE SQLITE
+# =========================
+# Toutes les MAINT_CHECK_EVERY secondes : checkpoint TRUNCATE si le WAL a trop
+# grossi ; et si le débit de commandes est sous MAINT_QUIET_RATE (heures creuses) :
+# checkpoint PASSIVE, incremental_vacuum, PRAGMA optimize, ANALYZE complet 1x/jour.
+# La conversion auto_vacuum=INCREMENTAL (VACUUM complet, réécrit tout le fichier)
+# n'est jamais automatique : `python main.py maintenance --convertir`, bot arrêté.
+class Maintenance:
+    def __init__(self):
+        self.last_analyze = 0.0
+        self.last_run = 0.0
+        self.last_report: Dict[str, object] = {}
+        # un seul passage à la fois (boucle, /admin maintenance forcer, CLI)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def wal_size() -> int:
+        try:
+            return os.path.getsize(DB_PATH + "-wal")
+        except OSError:
+            return 0
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        with db_connect() as conn:
+            return {
+                "pages": conn.execute("PRAGMA page_count").fetchone()[0],
+                "freelist": conn.execute("PRAGMA freelist_count").fetchone()[0],
+                "auto_vacuum": conn.execute("PRAGMA auto_vacuum").fetchone()[0],
+                "wal_bytes": Maintenance.wal_size(),
+            }
+
+    def run(self, quiet: bool, now: Optional[float] = None, convert: bool = False) -> Dict[str, object]:
+        """
+        Un passage de maintenance (synchrone, à lancer dans un thread).
+        convert : autorise la conversion auto_vacuum (VACUUM complet), CLI uniquement.
+        returns: ce qui a été fait ({"busy": ...} si un passage est déjà en cours)
+        """
+        if not self.lock.acquire(blocking=False):
+            return {"busy": "passage déjà en cours"}
+        try:
+            return self._run(quiet, now, convert)
+        finally:
+            self.lock.release()
+
+    def _run(self, quiet: bool, now: Optional[float], convert: bool) -> Dict[str, object]:
+        now = now if now is not None else time.time()
+        done: Dict[str, object] = {}
+        # connexion à part (fermée en fin de passage) : VACUUM / checkpoints hors transaction
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        try:
+            wal = self.wal_size()
+            if wal > WAL_TRUNCATE_BYTES:
+                busy, log, moved = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+                done["checkpoint"] = f"TRUNCATE ({wal // 1024} Kio, busy={busy})"
+            elif quiet and wal:
+                busy, log, moved = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+                done["checkpoint"] = f"PASSIVE ({moved}/{log} pages)"
+
+            if not quiet:
+                return done
+
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                # base créée avant la maintenance : conversion unique (réécrit tout le fichier)
+                if convert:
+                    t0 = time.perf_counter()
+                    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                    conn.execute("VACUUM")
+                    done["vacuum"] = f"conversion auto_vacuum=INCREMENTAL ({time.perf_counter() - t0:.1f}s)"
+                else:
+                    done["auto_vacuum"] = "non incrémental : `python main.py maintenance --convertir` (bot arrêté)"
+            else:
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if free:
+                    # executescript : execute() ne fait qu'un pas, soit une seule page libérée
+                    conn.executescript(f"PRAGMA incremental_vacuum({int(MAINT_VACUUM_PAGES)});")
+                    done["vacuum"] = f"{min(free, MAINT_VACUUM_PAGES)}/{free} pages libérées"
+
+            if now - self.last_analyze >= MAINT_ANALYZE_EVERY:
+                t0 = time.perf_counter()
+                conn.execute("ANALYZE")
+                self.last_analyze = now
+                done["analyze"] = f"{time.perf_counter() - t0:.2f}s"
+            else:
+                conn.execute("PRAGMA optimize")
+                done["optimize"] = True
+        finally:
+            conn.close()
+            self.last_run = now
+            self.last_report = done
+        return done
+
+
+MAINTENANCE = Maintenance()
+
+
+def is_quiet_period() -> bool:
+    # juste après un redémarrage la fenêtre est vide : creux seulement une fois observée en entier
+    return (
+        COMMAND_RATE.observed() >= MAINT_QUIET_WINDOW
+        and not LOOP_MONITOR.overloaded
+        and COMMAND_RATE.rate(MAINT_QUIET_WINDOW) < MAINT_QUIET_RATE
+    )
+
+
+async def maintenance_loop():
+    while True:
+        await asyncio.sleep(MAINT_CHECK_EVERY)
+        quiet = is_quiet_period()
+        # hors heures creuses on ne surveille que la taille du WAL
+        if not quiet and MAINTENANCE.wal_size() <= WAL_TRUNCATE_BYTES:
+            continue
+        try:
+            done = await asyncio.to_thread(MAINTENANCE.run, quiet)
+        except sqlite3.OperationalError as e:
+            # base occupée : on retentera au prochain passage
+            print(f"⚠️ Maintenance reportée : {e}")
+            continue
+        if "busy" in done:
+            continue  # passage forcé en cours
+        if "vacuum" in done or "analyze" in done or str(done.get("checkpoint", "")).startswith("TRUNCATE"):
+            print(f"🧰 Maintenance : {done}")
 
 
 # CF Helpers
-def get_cf_streak(user_id: int) -> int:
-    ensure_user(user_id)
-    with db_connect() as conn:
-        row = conn.execute("SELECT cf_streak FROM users WHERE user_id=?", (user_id,)).fetchone()
-        return int(row["cf_streak"]) if row else 0
+async def get_cf_streak(user_id: int) -> int:
+    return await STORE.run("get_cf_streak", user_id)
 
 
-def set_cf_streak(user_id: int, streak: int):
-    ensure_user(user_id)
-    with db_connect() as conn:
-        conn.execute("UPDATE users SET cf_streak = ? WHERE user_id=?", (streak, user_id))
-        conn.commit()
+async def set_cf_streak(user_id: int, streak: int):
+    await STORE.run("set_cf_streak", user_id, streak)
 
 
 # =========================
 # XP / LEVELING
 # =========================
-def add_xp(user_id: int, xp_gain: int) -> Tuple[int, int, bool, int]:
+def need_for_level(lv: int) -> int:
+    return 200 + (lv - 1) * 150
+
+
+def level_progress(xp: int, level: int) -> Tuple[int, int, int]:
     """
-    returns: (level, xp, leveled, bonus_total)
+    xp accumulé -> passages de niveau. returns: (xp, level, bonus_total)
     """
-    ensure_user(user_id)
-    with db_connect() as conn:
-        u = conn.execute("SELECT xp, level FROM users WHERE user_id=?", (user_id,)).fetchone()
-        xp = int(u["xp"]) + xp_gain
-        level = int(u["level"])
+    bonus_total = 0
+    while xp >= need_for_level(level):
+        xp -= need_for_level(level)
+        level += 1
+        if level % LEVEL_BONUS_EVERY == 0:
+            bonus_total += LEVEL_BONUS_AMOUNT
+    return xp, level, bonus_total
 
-        def need_for_level(lv: int) -> int:
-            return 200 + (lv - 1) * 150
 
-        leveled = False
-        bonus_total = 0
+# =========================
+# ÉVÉNEMENTS (bus en process)
+# =========================
+# Le solde et sa ligne de ledger sont commités ensemble par la commande ; le
+# reste (xp et tirages, notices de niveau, classements en cache) est publié sur
+# EVENTS et traité par lots par des abonnés. Un abonné peut renvoyer des
+# événements de suite (ex. xp -> LevelUp), republiés depuis la boucle.
+@dataclass
+class BalanceChanged:
+    user_id: int
+    delta: int
+    action: str
+    balance: int
+    ts: int
 
-        while xp >= need_for_level(level):
-            xp -= need_for_level(level)
-            level += 1
-            leveled = True
-            if level % LEVEL_BONUS_EVERY == 0:
-                bonus_total += LEVEL_BONUS_AMOUNT
 
-        conn.execute("UPDATE users SET xp=?, level=? WHERE user_id=?", (xp, level, user_id))
+@dataclass
+class GamePlayed:
+    user_id: int
+    game: str
+    xp: int
+    draws: int
+    channel_id: Optional[int] = None
 
-        if bonus_total > 0:
-            conn.execute("UPDATE users SET balance = balance + ? WHERE user_id=?", (bonus_total, user_id))
-            conn.execute("INSERT INTO logs(user_id, action, delta) VALUES(?,?,?)", (user_id, "level_bonus", bonus_total))
 
-        conn.commit()
-        return level, xp, leveled, bonus_total
+@dataclass
+class ChatActivity:
+    gains: List[Tuple[int, int, Optional[int]]]  # (user_id, xp, channel_id), un par joueur
+
+
+@dataclass
+class LevelUp:
+    user_id: int
+    level: int
+    bonus: int
+    channel_id: Optional[int] = None
+
+
+@dataclass
+class ClanBankChanged:
+    clan_id: int
+    delta: int
+    bank: int
+
+
+@dataclass
+class Subscriber:
+    name: str
+    types: Tuple[type, ...]
+    handler: object  # handler(batch) -> événements de suite ou None ; peut être async
+    threaded: bool = False  # handler synchrone qui écrit dans le store : asyncio.to_thread si STORE.thread_safe
+    queue: Optional[asyncio.Queue] = None
+    task: Optional[asyncio.Task] = None
+    events: int = 0
+    batches: int = 0
+    inline: int = 0  # traités dans l'appelant (file pleine ou bus arrêté)
+    dropped: int = 0
+    errors: int = 0
+
+
+class EventBus:
+    """
+    Une file bornée et une tâche par abonné. Si la file est pleine, si le bus
+    ne tourne pas (CLI, bancs) ou si l'on publie depuis un autre thread,
+    l'événement est traité tout de suite dans l'appelant ; les abonnés async
+    (notices) le laissent alors tomber. Un lot d'écrivain en échec n'est
+    retenté (EVENT_RETRIES, délai croissant) que si le store annule tout en cas
+    d'échec (STORE.retry_safe) ; sinon, ou après la dernière tentative, il est
+    compté dans errors et abandonné : xp et bonus du lot perdus, jamais doublés.
+    Sur un store sans verrou (STORE.thread_safe faux), l'écrivain tourne sur la boucle.
+    """
+
+    def __init__(self, size: int = EVENT_QUEUE_SIZE, batch: int = EVENT_BATCH, linger: float = EVENT_LINGER):
+        self.size = size
+        self.batch = batch
+        self.linger = linger
+        self.subscribers: List[Subscriber] = []
+        self._routes: Dict[type, List[Subscriber]] = {}
+        self._thread: Optional[int] = None
+        self.running = False
+
+    def subscribe(self, name: str, types: Tuple[type, ...], handler, threaded: bool = False):
+        sub = Subscriber(name, types, handler, threaded)
+        self.subscribers.append(sub)
+        for t in types:
+            self._routes.setdefault(t, []).append(sub)
+        return sub
+
+    def publish(self, event):
+        inline = not self.running or threading.get_ident() != self._thread
+        for sub in self._routes.get(type(event), ()):
+            if not inline:
+                try:
+                    sub.queue.put_nowait(event)
+                    continue
+                except asyncio.QueueFull:
+                    pass
+            self._run_inline(sub, event)
+
+    def _run_inline(self, sub: Subscriber, event):
+        if asyncio.iscoroutinefunction(sub.handler):
+            sub.dropped += 1
+            return
+        sub.inline += 1
+        try:
+            follow = sub.handler([event])
+        except Exception as e:
+            sub.errors += 1
+            print(f"⚠️ Événement {type(event).__name__} ({sub.name}) : {e!r}")
+            return
+        for ev in follow or ():
+            self.publish(ev)
+
+    async def _worker(self, sub: Subscriber):
+        while True:
+            batch = [await sub.queue.get()]
+            if self.linger:
+                await asyncio.sleep(self.linger)
+            while len(batch) < self.batch and not sub.queue.empty():
+                batch.append(sub.queue.get_nowait())
+            follow = None
+            # abonnés en thread = écrivains du store : rejoués seulement si un échec a tout annulé
+            retries = EVENT_RETRIES if sub.threaded and STORE.retry_safe else 0
+            for attempt in range(retries + 1):
+                try:
+                    if sub.threaded and STORE.thread_safe:
+                        follow = await asyncio.to_thread(sub.handler, batch)
+                    else:
+                        follow = sub.handler(batch)
+                        if asyncio.iscoroutine(follow):
+                            follow = await follow
+                    break
+                except Exception as e:
+                    if attempt < retries:
+                        print(f"⚠️ Lot {sub.name} en échec ({e!r}), nouvel essai {attempt + 1}/{retries}")
+                        await asyncio.sleep(EVENT_RETRY_DELAY * 2 ** attempt)
+                        continue
+                    sub.errors += 1
+                    print(f"⚠️ Lot de {len(batch)} événement(s) perdu ({sub.name}) : {e!r}")
+                    break
+            for ev in follow or ():
+                self.publish(ev)
+            sub.events += len(batch)
+            sub.batches += 1
+            for _ in batch:
+                sub.queue.task_done()
+
+    def start(self):
+        if self.running:
+            return
+        self._thread = threading.get_ident()
+        for sub in self.subscribers:
+            sub.queue = asyncio.Queue(self.size)
+            sub.task = asyncio.create_task(self._worker(sub))
+        self.running = True
+
+    async def stop(self):
+        """Vide les files (événements de suite compris) puis arrête les tâches."""
+        if not self.running:
+            return
+        while True:
+            for sub in self.subscribers:
+                await sub.queue.join()
+            if all(sub.queue.empty() for sub in self.subscribers):
+                break
+        self.running = False
+        for sub in self.subscribers:
+            sub.task.cancel()
+        await asyncio.gather(*(sub.task for sub in self.subscribers), return_exceptions=True)
+
+    def stats(self) -> List[dict]:
+        return [
+            {
+                "name": sub.name, "events": sub.events, "batches": sub.batches, "inline": sub.inline,
+                "dropped": sub.dropped, "errors": sub.errors, "pending": sub.queue.qsize() if sub.queue else 0,
+            }
+            for sub in self.subscribers
+        ]
+
+
+EVENTS = EventBus()
+
+
+class TopCache:
+    """
+    Top `size` (par `value` décroissant) gardé en mémoire. apply() le tient à
+    jour depuis les événements ; `floor` borne les valeurs hors cache, et si un
+    membre du top passe dessous, on ne sait plus qui le remplace : relecture.
+    Relu aussi après `ttl` (écritures en masse, autres process).
+    """
+
+    def __init__(self, fetch, key: str, value: str, size: int = LEADERBOARD_CACHE_SIZE, ttl: float = LEADERBOARD_CACHE_TTL):
+        self.fetch = fetch
+        self.key = key
+        self.value = value
+        self.size = size
+        self.ttl = ttl
+        self.rows: Optional[List[dict]] = None
+        self.floor = 0
+        self.loaded_at = 0.0
+        self.gen = 0
+
+    def invalidate(self):
+        self.rows = None
+        self.gen += 1
+
+    async def get(self, limit: int) -> list:
+        if limit > self.size:
+            return await self.fetch(limit)
+        if self.rows is None or time.monotonic() - self.loaded_at > self.ttl:
+            gen = self.gen
+            rows = [dict(r) for r in await self.fetch(self.size)]
+            if gen != self.gen:
+                return rows[:limit]  # écritures pendant la lecture : résultat servi, pas gardé
+            self.rows = rows
+            self.floor = rows[-1][self.value] if len(rows) >= self.size else 0
+            self.loaded_at = time.monotonic()
+        return self.rows[:limit]
+
+    def apply(self, key, value: int):
+        self.gen += 1
+        rows = self.rows
+        if rows is None:
+            return
+        for r in rows:
+            if r[self.key] == key:
+                r[self.value] = value
+                break
+        else:
+            if len(rows) >= self.size:
+                if value <= rows[-1][self.value]:
+                    self.floor = max(self.floor, value)
+                    return
+                self.floor = max(self.floor, rows.pop()[self.value])
+            rows.append({self.key: key, self.value: value})
+        rows.sort(key=lambda r: r[self.value], reverse=True)
+        if len(rows) >= self.size and rows[-1][self.value] < self.floor:
+            self.invalidate()
+
+
+TOP_USERS = TopCache(lambda limit: STORE.run("top_users", limit), "user_id", "balance")
+TOP_CLANS = TopCache(lambda limit: STORE.run("top_clans", limit), "name", "bank")
+
+
+# --- abonnés ---
+def _progress_handler(batch: list) -> List[object]:
+    # xp des commandes et du chat : un seul écrivain, les passages de niveau restent exacts
+    gains: Dict[int, List[int]] = {}
+    channels: Dict[int, Optional[int]] = {}
+
+    def gain(user_id: int, xp: int, draws: int, channel_id: Optional[int]):
+        g = gains.setdefault(user_id, [0, 0])
+        g[0] += xp
+        g[1] += draws
+        channels[user_id] = channel_id or channels.get(user_id)
+
+    for ev in batch:
+        if isinstance(ev, ChatActivity):
+            for user_id, xp, channel_id in ev.gains:
+                gain(user_id, xp, 0, channel_id)
+        else:
+            gain(ev.user_id, ev.xp, ev.draws, ev.channel_id)
+    ups = STORE.apply_progress([(uid, xp, draws) for uid, (xp, draws) in gains.items()])
+    follow: List[object] = []
+    for uid, level, bonus, balance in ups:
+        if bonus > 0:
+            follow.append(BalanceChanged(uid, bonus, "level_bonus", balance, now_ts()))
+        follow.append(LevelUp(uid, level, bonus, channels.get(uid)))
+    return follow
+
+
+def _leaderboard_handler(batch: list):
+    for ev in batch:
+        if isinstance(ev, BalanceChanged):
+            TOP_USERS.apply(ev.user_id, ev.balance)
+        else:
+            TOP_CLANS.invalidate()  # lignes par nom : on relit
+
+
+async def _level_notice_handler(batch: List[LevelUp]):
+    # une notice par salon et par lot, seulement pour les paliers à bonus (comme avant)
+    by_channel: Dict[int, List[LevelUp]] = {}
+    for ev in batch:
+        if ev.bonus > 0 and ev.channel_id:
+            by_channel.setdefault(ev.channel_id, []).append(ev)
+    for channel_id, events in by_channel.items():
+        channel = bot.get_channel(channel_id)
+        if channel is None:
+            continue
+        lines = [
+            f"🎉 <@{ev.user_id}> passe **niveau {ev.level}** : bonus +{fmt_int(ev.bonus)} {CURRENCY_EMOJI}"
+            for ev in events
+        ]
+        try:
+            await channel.send("\n".join(lines), allowed_mentions=discord.AllowedMentions.none())
+        except discord.HTTPException:
+            pass
+
+
+EVENTS.subscribe("progress", (GamePlayed, ChatActivity), _progress_handler, threaded=True)
+EVENTS.subscribe("leaderboard", (BalanceChanged, ClanBankChanged), _leaderboard_handler)
+EVENTS.subscribe("level_notice", (LevelUp,), _level_notice_handler)
+
+
+def game_played(user_id: int, game: str, xp: int = 0, draws: int = 1, channel_id: Optional[int] = None):
+    EVENTS.publish(GamePlayed(user_id, game, xp, draws, channel_id))
+
+
+class ChatXp:
+    """
+    XP d'activité : au plus un gain par joueur et par `cooldown`. Rien n'est
+    écrit par message : les gains sont cumulés par joueur et partent toutes les
+    CHAT_XP_FLUSH_EVERY secondes en un seul ChatActivity (une transaction).
+    """
+
+    def __init__(self, cooldown: float = CHAT_XP_COOLDOWN, xp_range: Tuple[int, int] = CHAT_XP_RANGE):
+        self.cooldown = cooldown
+        self.xp_range = xp_range
+        self.next_at: Dict[int, float] = {}
+        self.pending: Dict[int, List[int]] = {}  # user_id -> [xp, channel_id]
+        self.messages = 0
+        self.awarded = 0
+        self.flushes = 0
+
+    def hit(self, user_id: int, channel_id: Optional[int], now: Optional[float] = None) -> int:
+        """returns: xp gagné (0 si cooldown)"""
+        self.messages += 1
+        now = time.monotonic() if now is None else now
+        if self.next_at.get(user_id, 0.0) > now:
+            return 0
+        self.next_at[user_id] = now + self.cooldown
+        xp = random.randint(*self.xp_range)
+        p = self.pending.get(user_id)
+        if p is None:
+            self.pending[user_id] = [xp, channel_id]
+        else:
+            p[0] += xp
+            p[1] = channel_id
+        self.awarded += 1
+        return xp
+
+    def flush(self) -> int:
+        """returns: nombre de joueurs écrits"""
+        pending, self.pending = self.pending, {}
+        if pending:
+            EVENTS.publish(ChatActivity([(uid, xp, ch) for uid, (xp, ch) in pending.items()]))
+            self.flushes += 1
+        now = time.monotonic()
+        if len(self.next_at) > len(pending):
+            self.next_at = {uid: t for uid, t in self.next_at.items() if t > now}
+        return len(pending)
+
+    async def run(self, every: float = CHAT_XP_FLUSH_EVERY):
+        while True:
+            await asyncio.sleep(every)
+            self.flush()
+
+
+CHAT_XP = ChatXp()
+
+
+# =========================
+# RAPPELS DE COOLDOWN
+# =========================
+class TimerWheel:
+    """
+    Roue de minuteurs hiérarchique : `levels` niveaux de 64 cases, tick d'une
+    seconde (4 niveaux ≈ 194 jours, au-delà : liste de débordement). Armer et
+    annuler sont en O(1) ; un tick ne vide que sa case, les niveaux supérieurs
+    redescendent une case toutes les 64^n secondes.
+    L'annulation est paresseuse : une entrée (clé, échéance, payload) ne part
+    que si elle est encore celle de `armed` (réarmer une clé remplace donc l'ancienne).
+    """
+
+    BITS = 6
+    MASK = (1 << BITS) - 1
+
+    def __init__(self, now: int, levels: int = 4):
+        self.tick = now
+        self.levels = levels
+        self.slots: List[List[list]] = [[[] for _ in range(self.MASK + 1)] for _ in range(levels)]
+        self.overflow: list = []
+        self.armed: Dict[Hashable, tuple] = {}  # clé -> entrée en place
+
+    def __len__(self) -> int:
+        return len(self.armed)
+
+    def arm(self, key: Hashable, due: int, payload=None):
+        entry = self.armed[key] = (key, due, payload)
+        self._place(entry, self.tick + 1)
+
+    def cancel(self, key: Hashable) -> bool:
+        return self.armed.pop(key, None) is not None
+
+    def _place(self, entry: tuple, earliest: int):
+        # une échéance passée part au plus tôt possible
+        at = max(entry[1], earliest)
+        tick = self.tick
+        for level in range(self.levels):
+            shift = self.BITS * (level + 1)
+            if at >> shift == tick >> shift:
+                self.slots[level][(at >> (shift - self.BITS)) & self.MASK].append(entry)
+                return
+        self.overflow.append(entry)
+
+    def advance(self, now: int) -> List[tuple]:
+        """returns: (clé, échéance, payload) arrivés à échéance jusqu'à `now` inclus"""
+        fired = []
+        armed = self.armed
+        level0 = self.slots[0]
+        while self.tick < now:
+            self.tick = t = self.tick + 1
+            if not t & self.MASK:
+                self._cascade(t)
+            i = t & self.MASK
+            slot = level0[i]
+            if not slot:
+                continue
+            level0[i] = []
+            for entry in slot:
+                if armed.get(entry[0]) is entry:
+                    del armed[entry[0]]
+                    fired.append(entry)
+        return fired
+
+    def _cascade(self, t: int):
+        # du haut vers le bas : ce qui descend d'un niveau peut redescendre au suivant dans le même tick
+        armed = self.armed
+        if not t & ((1 << (self.BITS * self.levels)) - 1):
+            entries, self.overflow = self.overflow, []
+            for entry in entries:
+                if armed.get(entry[0]) is entry:
+                    self._place(entry, t)
+        for level in range(self.levels - 1, 0, -1):
+            shift = self.BITS * level
+            if t & ((1 << shift) - 1):
+                continue
+            slots = self.slots[level]
+            i = (t >> shift) & self.MASK
+            entries, slots[i] = slots[i], []
+            # boucle chaude (jusqu'à ~1/64 des rappels d'un coup) : le cas courant,
+            # descendre d'un seul niveau, est traité sans appel de méthode
+            lower = self.slots[level - 1]
+            low, mask, block = shift - self.BITS, self.MASK, t >> shift - self.BITS
+            for entry in entries:
+                if armed.get(entry[0]) is not entry:
+                    continue
+                at = entry[1]
+                if at >> low == block or at <= t:
+                    self._place(entry, t)
+                else:
+                    lower[(at >> low) & mask].append(entry)
+
+
+class Reminders:
+    """
+    Rappels /rappels : une seule tâche et une seule roue pour tous les joueurs.
+    L'état durable est la ligne de cooldown (remind, remind_channel) : la roue
+    n'est qu'un index en mémoire, rechargé au démarrage. Les envois sont
+    groupés (un DM par joueur, un message par salon) et limités à
+    `per_second` messages par seconde.
+    """
+
+    def __init__(self, per_second: int = REMINDER_SENDS_PER_SECOND):
+        self.wheel = TimerWheel(int(time.time()))
+        self.per_second = per_second
+        self.outbox: Deque[tuple] = deque()  # (user_id, key, due, mode, channel_id)
+        self.payloads: Dict[tuple, tuple] = {}  # (mode, salon) partagés : quelques salons pour 1M rappels
+        self.sent = 0
+        self.failed = 0
+
+    @staticmethod
+    def _key(user_id: int, key: str) -> int:
+        # entier plutôt que tuple : ~1M rappels armés sans doubler la mémoire
+        return user_id << 2 | REMINDER_KEYS.index(key)
+
+    def arm(self, user_id: int, key: str, due: int, mode: int, channel_id: Optional[int]):
+        payload = (mode, channel_id)
+        self.wheel.arm(self._key(user_id, key), due, self.payloads.setdefault(payload, payload))
+
+    def cancel_user(self, user_id: int):
+        for key in REMINDER_KEYS:
+            self.wheel.cancel(self._key(user_id, key))
+
+    def owns(self, channel_id: Optional[int]) -> bool:
+        """En cluster, chaque process ne recharge que les rappels de ses guildes."""
+        if not SHARD_COUNT:
+            return True
+        if channel_id is None:
+            return not SHARD_IDS or 0 in SHARD_IDS
+        return bot.get_channel(channel_id) is not None
+
+    def load(self, rows: list, now: int) -> List[Tuple[int, str, int]]:
+        """returns: rappels trop vieux à effacer"""
+        stale = []
+        for r in rows:
+            user_id, key, due, channel_id = int(r["user_id"]), r["key"], int(r["next_ts"]), r["remind_channel"]
+            if key not in REMINDER_KEYS or not self.owns(channel_id):
+                continue
+            if self._key(user_id, key) in self.wheel.armed:
+                continue  # réarmé par une commande depuis le démarrage : plus récent que la base
+            if due < now - REMINDER_MAX_LATE:
+                stale.append((user_id, key, due))
+            else:
+                self.arm(user_id, key, due, int(r["remind"]), channel_id)
+        return stale
+
+    def tick(self, now: int) -> int:
+        fired = self.wheel.advance(now)
+        for packed, due, (mode, channel_id) in fired:
+            self.outbox.append((packed >> 2, REMINDER_KEYS[packed & 3], due, mode, channel_id))
+        return len(fired)
+
+    def take(self) -> Dict[tuple, list]:
+        """returns: au plus `per_second` messages, (mode, destinataire) -> rappels"""
+        messages: Dict[tuple, list] = {}
+        while self.outbox:
+            user_id, key, due, mode, channel_id = self.outbox[0]
+            target = (REMIND_CHANNEL, channel_id) if mode == REMIND_CHANNEL and channel_id else (REMIND_DM, user_id)
+            if target not in messages and len(messages) >= self.per_second:
+                break
+            self.outbox.popleft()
+            messages.setdefault(target, []).append((user_id, key, due))
+        return messages
+
+    async def _send(self, mode: int, target: int, items: list):
+        if mode == REMIND_CHANNEL:
+            channel = bot.get_channel(target)
+            if channel is not None:
+                by_user: Dict[int, List[str]] = {}
+                for user_id, key, _ in items:
+                    by_user.setdefault(user_id, []).append(f"**/{key}**")
+                lines = [f"⏰ <@{uid}> : {', '.join(keys)} de nouveau disponible" for uid, keys in by_user.items()]
+                await channel.send("\n".join(lines), allowed_mentions=discord.AllowedMentions(users=True))
+                return
+            # salon disparu : on se rabat sur les DM
+            for user_id in {uid for uid, _, _ in items}:
+                await self._send(REMIND_DM, user_id, [i for i in items if i[0] == user_id])
+            return
+        user = bot.get_user(target) or await bot.fetch_user(target)
+        keys = ", ".join(f"**/{key}**" for _, key, _ in items)
+        await user.send(f"⏰ De nouveau disponible : {keys}")
+
+    async def deliver(self) -> int:
+        """returns: nombre de messages envoyés (ou abandonnés)"""
+        messages = self.take()
+        done: List[Tuple[int, str, int]] = []
+        for (mode, target), items in messages.items():
+            try:
+                await self._send(mode, target, items)
+                self.sent += 1
+            except discord.HTTPException:
+                self.failed += 1  # DM fermés, salon interdit : pas de nouvel essai
+            done.extend(items)
+        if done:
+            await asyncio.to_thread(STORE.clear_reminders, done)
+        return len(messages)
+
+    async def run(self):
+        await bot.wait_until_ready()
+        rows = await asyncio.to_thread(STORE.pending_reminders)
+        stale: List[Tuple[int, str, int]] = []
+        for i in range(0, len(rows), 10_000):
+            stale += self.load(rows[i:i + 10_000], now_ts())
+            await asyncio.sleep(0)  # ~1M rappels : la boucle reste disponible pendant le chargement
+        if stale:
+            await asyncio.to_thread(STORE.clear_reminders, stale)
+        while True:
+            await asyncio.sleep(1)
+            try:
+                self.tick(now_ts())
+                if self.outbox:
+                    await self.deliver()
+            except Exception as e:
+                print(f"⚠️ Rappels : {e!r}")
+
+
+REMINDERS = Reminders()
 
 
 # =========================
@@ -366,6 +3382,8 @@ def now_ts() -> int:
 
 
 def fmt_int(n: int) -> str:
+    if -1000 < n < 1000:
+        return str(n)  # mises et gains courants : pas de séparateur à poser
     return f"{n:,}".replace(",", " ")
 
 
@@ -373,8 +3391,123 @@ def fmt_money(n: int) -> str:
     return f"{fmt_int(n)} {CURRENCY_NAME} {CURRENCY_EMOJI}"
 
 
-def cd_left(user_id: int, key: str) -> int:
-    return max(0, get_cd(user_id, key) - now_ts())
+# =========================
+# EMBEDS (gabarits et embeds figés)
+# =========================
+EMBED_COLOUR = discord.Colour(0x3498db)
+EMBED_FOOTER = "Coinsbot • Casino"
+_new_embed = discord.Embed.__new__
+
+
+def embed_author(user: discord.abc.User) -> dict:
+    return {"name": str(user.display_name), "icon_url": str(user.display_avatar.url)}
+
+
+def make_embed(
+    title: str,
+    description: Optional[str] = None,
+    user: Optional[discord.abc.User] = None,
+    footer: str = EMBED_FOOTER,
+    fields: Optional[List[dict]] = None,
+) -> discord.Embed:
+    """
+    Remplit directement les attributs qu'Embed.from_dict poserait, sans passer
+    par __init__, set_author, set_footer ni sonder chaque clé absente (attributs
+    internes de discord.py 2.3, version épinglée dans requirements.txt) ;
+    _check_make_embed() le compare à from_dict au chargement du module.
+    """
+    e = _new_embed(discord.Embed)
+    e.title = title
+    e.type = "rich"
+    e.description = description or None
+    e.url = None
+    e._colour = EMBED_COLOUR
+    e._footer = {"text": footer}
+    if user is not None:
+        e._author = embed_author(user)
+    if fields:
+        e._fields = fields
+    return e
+
+
+def _check_make_embed():
+    """
+    Garde-fou de version : make_embed écrit des attributs privés de discord.Embed.
+    S'ils changent, le bot refuse de démarrer au lieu d'envoyer des embeds faux.
+    """
+    class _User:
+        display_name = "joueur"
+
+        class display_avatar:
+            url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+    fields = [{"name": "a", "value": "1", "inline": True}, {"name": "b", "value": "2", "inline": False}]
+    expected = {
+        "title": "t", "type": "rich", "description": "d", "color": EMBED_COLOUR.value,
+        "footer": {"text": EMBED_FOOTER}, "author": embed_author(_User), "fields": [dict(f) for f in fields],
+    }
+    fast, ref = make_embed("t", "d", _User, EMBED_FOOTER, [dict(f) for f in fields]), discord.Embed.from_dict(expected)
+    for e in (fast, ref):  # accesseurs publics et modifications après coup, comme le font les commandes
+        e.add_field(name="c", value="3", inline=False)
+        e.set_field_at(0, name="a", value="10")
+        e.set_footer(text=f"{e.footer.text} • x")
+    same = fast.to_dict() == ref.to_dict() and (fast.colour, fast.author.name, len(fast.fields)) == (
+        ref.colour, ref.author.name, len(ref.fields)
+    )
+    if not same:
+        raise RuntimeError(
+            f"discord.py {discord.__version__} : make_embed ne produit plus le même embed qu'Embed.from_dict "
+            "(attributs internes changés) ; repasser make_embed par from_dict ou épingler discord.py 2.3"
+        )
+
+
+_check_make_embed()
+
+
+class EmbedTemplate:
+    """
+    Embed de résultat dont le titre et les champs (nom, inline) sont figés une
+    fois pour toutes : render() ne reçoit que les valeurs, dans l'ordre des champs.
+    """
+
+    __slots__ = ("title", "fields")
+
+    def __init__(self, title: str, *fields: Tuple[str, bool]):
+        self.title = title
+        self.fields = fields
+
+    def render(self, user: Optional[discord.abc.User], *values: str, footer: str = EMBED_FOOTER) -> discord.Embed:
+        return make_embed(
+            self.title, None, user, footer,
+            [{"name": name, "value": value, "inline": inline} for (name, inline), value in zip(self.fields, values)],
+        )
+
+
+class StaticEmbed:
+    """
+    Embed sans contenu variable (aide, textes fixes), construit une fois et
+    gardé en dict. get() en rend une copie par le même chemin que make_embed
+    (Embed.from_dict coûte plus cher à cause des clés absentes) ; la liste et
+    chaque dict de champ sont copiés (name/value/inline, copie superficielle) :
+    add_field ou set_field_at sur la réponse ne touchent pas au cache.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, embed: discord.Embed):
+        self.data = embed.to_dict()
+
+    def get(self, user: Optional[discord.abc.User] = None) -> discord.Embed:
+        data = self.data
+        fields = data.get("fields")
+        return make_embed(
+            data["title"], data.get("description"), user, data["footer"]["text"],
+            [dict(f) for f in fields] if fields else None,
+        )
+
+
+async def cd_left(user_id: int, key: str) -> int:
+    return max(0, await get_cd(user_id, key) - now_ts())
 
 
 def human_time(seconds: int) -> str:
@@ -393,21 +3526,366 @@ def human_time(seconds: int) -> str:
     return " ".join(parts)
 
 
-# Roulette colors
-RED_NUMBERS = {1,3,5,7,9,12,14,16,18,19,21,23,25,27,30,32,34,36}
+# =========================
+# ÉQUITÉ VÉRIFIABLE (RNG)
+# =========================
+# Chaque jeu tire sur une graine serveur (secrets.token_hex) dont le sha256 est
+# publié d'avance (/equite). Le joueur choisit sa graine client (/equite
+# graine_client) et chaque partie prend son prochain nonce sous la graine
+# serveur : le flux est un random.Random initialisé par
+# HMAC-SHA256(graine, "jeu:joueur:graine client:nonce"), consommé dans le même
+# ordre par la commande et par `python main.py replay`. La ligne de ledger
+# garde seed_id + nonce + graine client ; la graine serveur est révélée à la
+# rotation, à l'arrêt, ou au redémarrage suivant après un arrêt brutal.
+def rng_commitment(seed: str) -> str:
+    return hashlib.sha256(seed.encode()).hexdigest()
+
+
+def rng_for(seed: str, game: str, user_id: int, client_seed: Optional[str], nonce: int) -> random.Random:
+    # client_seed None : ligne de ledger d'avant les graines client (nonce global à la graine)
+    msg = f"{game}:{nonce}" if client_seed is None else f"{game}:{user_id}:{client_seed}:{nonce}"
+    digest = hmac.new(seed.encode(), msg.encode(), hashlib.sha256).digest()
+    return random.Random(int.from_bytes(digest, "big"))
+
+
+@dataclass
+class GameRng:
+    game: str
+    seed_id: int
+    user_id: int
+    client_seed: str
+    nonce: int
+    rng: random.Random
+    rounds: int = 1  # tours joués sur ce flux (session autoplay : posé par la commande)
+
+    @property
+    def ref(self) -> str:
+        return f"{self.seed_id}:{self.nonce}"
+
+    @property
+    def draw(self) -> Tuple[int, int, str, int]:
+        """returns: (seed_id, nonce, client_seed, rounds) tels qu'écrits dans le ledger"""
+        return self.seed_id, self.nonce, self.client_seed, self.rounds
+
+
+class FairRng:
+    """
+    Graine courante par jeu, créée à la première partie, et nonce suivant de
+    chaque joueur sous cette graine. Les compteurs restent en mémoire (aucune
+    écriture par partie) : au redémarrage chaque jeu repart sur une nouvelle
+    graine, close() révèle celles en cours et reveal_stale() celles qu'un arrêt
+    brutal a laissées ouvertes.
+    """
+
+    def __init__(self, rotate_every: int = RNG_ROTATE_EVERY, owner: str = RNG_OWNER):
+        self.rotate_every = rotate_every
+        self.owner = owner
+        self.current: Dict[str, list] = {}  # jeu -> [seed_id, graine, parties jouées, {joueur: prochain nonce}]
+        self._locks: Dict[str, asyncio.Lock] = {}  # création / rotation de la graine d'un jeu
+
+    async def _seed(self, game: str) -> list:
+        """returns: graine courante du jeu, créée ou tournée au besoin (une seule fois même en concurrence)"""
+        cur = self.current.get(game)
+        if cur is not None and cur[2] < self.rotate_every:
+            return cur
+        lock = self._locks.setdefault(game, asyncio.Lock())
+        async with lock:
+            # revérifiée sous le verrou : une autre partie a pu créer ou tourner la graine pendant l'attente
+            cur = self.current.get(game)
+            if cur is not None and cur[2] < self.rotate_every:
+                return cur
+            if cur is not None:
+                await STORE.run("reveal_rng_seed", cur[0])
+            seed = secrets.token_hex(32)
+            seed_id = await STORE.run("create_rng_seed", game, seed, rng_commitment(seed), self.owner)
+            cur = self.current[game] = [seed_id, seed, 0, {}]
+            return cur
+
+    async def stream(self, game: str, user_id: int) -> GameRng:
+        client_seed = await STORE.run("get_client_seed", user_id)
+        cur = await self._seed(game)  # plus d'await ensuite : le nonce est pris sur la graine publiée
+        seed_id, seed, _, nonces = cur
+        nonce = nonces.get(user_id, 0)
+        nonces[user_id] = nonce + 1
+        cur[2] += 1
+        return GameRng(game, seed_id, user_id, client_seed, nonce, rng_for(seed, game, user_id, client_seed, nonce))
+
+    async def reveal_stale(self) -> int:
+        """returns: graines de ce process restées ouvertes (arrêt brutal) et révélées maintenant"""
+        return await STORE.run("reveal_stale_rng_seeds", self.owner)
+
+    async def commitments(self) -> Dict[str, Tuple[int, str, int]]:
+        """returns: jeu -> (seed_id, sha256 publié, parties jouées)"""
+        out = {}
+        for game in RNG_GAMES:
+            cur = await self._seed(game)
+            out[game] = (cur[0], rng_commitment(cur[1]), cur[2])
+        return out
+
+    async def close(self):
+        for seed_id, *_ in self.current.values():
+            await STORE.run("reveal_rng_seed", seed_id)
+        self.current.clear()
+
+
+FAIR_RNG = FairRng()
+
+
+def fair_text(g: GameRng) -> str:
+    return f"{EMBED_FOOTER} • partie {g.game} #{g.ref} (/equite)"
+
+
+def fair_footer(e: discord.Embed, g: GameRng) -> discord.Embed:
+    e.set_footer(text=fair_text(g))
+    return e
+
+
+def fair_round(game: str, rng: random.Random, mise: int, choix: str, state: dict) -> Tuple[str, int, int]:
+    """
+    Rejoue un tour de `game` sur le flux `rng`, dans l'ordre de tirage de la
+    commande. `state` porte ce qui se prolonge d'un tour à l'autre (série du cf).
+    returns: (tirage, mise engagée, gain net) ; bj et mines : tirage seul
+    """
+    if game == "roulette":
+        slip = state.get("slip")
+        if slip is None:
+            slip = state["slip"] = parse_roulette_slip(choix or "rouge", mise)
+        n, color = roulette_spin(rng)
+        return f"{color} {n}", sum(stake for _, stake in slip), roulette_payout(slip, n)
+    if game == "slots":
+        roll, _, net = slots_round(mise, rng)
+        return "".join(roll), mise, net
+    if game == "cf":
+        streak = state.get("streak", 0)
+        win, net, chance_pct = cf_round(mise, streak, rng)
+        state["streak"] = streak + 1 if win else 0
+        return f"{'✅' if win else '❌'} {chance_pct}%", mise, net
+    if game == "nombre":
+        bot_num, net = nombre_round(mise, int(choix or 1), rng)
+        return str(bot_num), mise, net
+    if game == "rps":
+        bot_choice, net, _ = rps_round(mise, choix or "pierre", rng)
+        return bot_choice, mise, net
+    if game == "mines":
+        return f"mine en {mines_layout(rng)[0]}", 0, 0
+    if game == "bj":
+        # ordre de la commande : 2 cartes joueur, 2 croupier, puis hits du joueur et cartes du croupier
+        return bj_pretty([bj_card(rng) for _ in range(12)]), 0, 0
+    raise ValueError(f"jeu inconnu : {game}")
+
+
+# =========================
+# VERROUS PAR JOUEUR / CLAN
+# =========================
+class KeyedLocks:
+    """Un asyncio.Lock par clé, créé à la demande et libéré par le GC dès que
+    plus personne ne le tient ni ne l'attend."""
+
+    def __init__(self):
+        self._locks: "weakref.WeakValueDictionary[Hashable, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def get(self, key: Hashable) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+    def locked(self, key: Hashable) -> bool:
+        lock = self._locks.get(key)
+        return bool(lock and lock.locked())
+
+    @contextlib.asynccontextmanager
+    async def hold(self, *keys: Hashable):
+        # ordre global (clés triées) : deux /give croisés ne peuvent pas s'interbloquer
+        locks = [self.get(k) for k in sorted(set(keys))]
+        acquired = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+# Ordre d'acquisition quand on prend les deux : USER_LOCKS puis CLAN_LOCKS.
+USER_LOCKS = KeyedLocks()
+CLAN_LOCKS = KeyedLocks()
+
+
+def serialized_per_user(func):
+    # les actions d'un même joueur passent une par une, les joueurs différents en parallèle
+    @functools.wraps(func)
+    async def wrapper(interaction: discord.Interaction, *args, **kwargs):
+        async with USER_LOCKS.hold(interaction.user.id):
+            return await func(interaction, *args, **kwargs)
+    return wrapper
+
+
+# Roulette colors
+RED_NUMBERS = {1,3,5,7,9,12,14,16,18,19,21,23,25,27,30,32,34,36}
+
+def roulette_spin(rng: random.Random) -> Tuple[int, str]:
+    n = rng.randint(0, 36)
+    if n == 0:
+        return n, "vert"
+    return n, ("rouge" if n in RED_NUMBERS else "noir")
+
+
+def _roulette_bets() -> Dict[str, Tuple[frozenset, int]]:
+    # pari -> (numéros gagnants, gain net par coin misé) ; le 0 fait perdre les chances simples
+    def nums(pred) -> frozenset:
+        return frozenset(n for n in range(1, 37) if pred(n))
+
+    bets = {str(n): (frozenset({n}), 35) for n in range(37)}
+    bets.update({
+        "rouge": (frozenset(RED_NUMBERS), 1),
+        "noir": (nums(lambda n: n not in RED_NUMBERS), 1),
+        "pair": (nums(lambda n: n % 2 == 0), 1),
+        "impair": (nums(lambda n: n % 2 == 1), 1),
+        "manque": (nums(lambda n: n <= 18), 1),
+        "passe": (nums(lambda n: n >= 19), 1),
+    })
+    for i in range(3):
+        bets[f"d{i + 1}"] = (frozenset(range(12 * i + 1, 12 * i + 13)), 2)  # douzaines
+        bets[f"c{i + 1}"] = (nums(lambda n, i=i: n % 3 == (i + 1) % 3), 2)  # colonnes
+    return bets
+
+
+ROULETTE_BETS = _roulette_bets()
+ROULETTE_ALIASES = {"1-18": "manque", "19-36": "passe", "1-12": "d1", "13-24": "d2", "25-36": "d3"}
+
+
+def parse_roulette_slip(text: str, default_amount: int) -> List[Tuple[str, int]]:
+    """
+    "rouge:100 17:50 0" -> [("rouge", 100), ("17", 50), ("0", default_amount)]
+    Lève ValueError avec un message affichable.
+    """
+    slip = []
+    for token in text.replace(",", " ").lower().split():
+        name, _, amount = token.partition(":")
+        name = ROULETTE_ALIASES.get(name, name)
+        if name not in ROULETTE_BETS:
+            raise ValueError(f"Pari inconnu : `{name}`")
+        try:
+            stake = int(amount) if amount else default_amount
+        except ValueError:
+            raise ValueError(f"Montant invalide : `{token}`")
+        if stake <= 0:
+            raise ValueError(f"Mise invalide pour `{name}`")
+        slip.append((name, stake))
+    if not slip:
+        raise ValueError("Aucun pari")
+    if len(slip) > ROULETTE_MAX_BETS:
+        raise ValueError(f"{ROULETTE_MAX_BETS} paris maximum")
+    return slip
+
+
+def roulette_payout(slip: List[Tuple[str, int]], n: int) -> int:
+    """returns: gain net du bulletin pour le numéro n"""
+    net = 0
+    for name, stake in slip:
+        numbers, mult = ROULETTE_BETS[name]
+        net += stake * mult if n in numbers else -stake
+    return net
 
-def roulette_spin() -> Tuple[int, str]:
-    n = random.randint(0, 36)
-    if n == 0:
-        return n, "vert"
-    return n, ("rouge" if n in RED_NUMBERS else "noir")
+
+def fmt_slip(slip: List[Tuple[str, int]]) -> str:
+    return ", ".join(f"{name} ×{fmt_int(stake)}" for name, stake in slip)
+
+
+# =========================
+# AUTOPLAY
+# =========================
+@dataclass
+class AutoplayResult:
+    rounds: int = 0
+    net: int = 0
+    required: int = 0  # solde de départ qui couvre la mise de chaque tour joué
+    wins: int = 0
+    xp: int = 0
+    stop: str = "tous les tours joués"
+    history: List[str] = field(default_factory=list)
+
+
+def autoplay(
+    rounds: int,
+    balance: int,
+    stake: int,
+    play_round,
+    stop_loss: int = 0,
+    take_profit: int = 0,
+    xp_range: Tuple[int, int] = (0, 0),
+) -> AutoplayResult:
+    """
+    Joue jusqu'à `rounds` tours sur un solde simulé, sans rien écrire : l'appelant
+    règle la session en une fois (un add_balance, une ligne de ledger, un embed).
+    play_round() -> (gain net du tour, libellé court)
+    """
+    res = AutoplayResult()
+    for _ in range(rounds):
+        if balance + res.net < stake:
+            res.stop = "solde insuffisant"
+            break
+        res.required = max(res.required, stake - res.net)
+        net, label = play_round()
+        res.rounds += 1
+        res.net += net
+        res.wins += net > 0
+        res.xp += random.randint(*xp_range)
+        res.history.append(label)
+        if stop_loss and res.net <= -stop_loss:
+            res.stop = "stop-perte atteint"
+            break
+        if take_profit and res.net >= take_profit:
+            res.stop = "objectif atteint"
+            break
+    return res
+
+
+def autoplay_error(tours: int, stop_perte: int, objectif: int) -> Optional[str]:
+    if not (1 <= tours <= AUTOPLAY_MAX_ROUNDS):
+        return f"❌ Nombre de tours invalide (1-{AUTOPLAY_MAX_ROUNDS})."
+    if stop_perte < 0 or objectif < 0:
+        return "❌ Stop-perte / objectif invalides."
+    return None
+
+
+# mise revérifiée au commit (add_balance_if) : un autre shard a dépensé entre-temps
+STALE_BET = "❌ Ton solde a changé pendant la partie : elle est annulée, rien n'a été débité."
+
+AUTOPLAY_FIELDS = (
+    ("Tours", True), ("Gagnants", True), ("Arrêt", True), ("Bilan", False), ("Derniers tours", False), ("Solde", False)
+)
+AUTOPLAY_EMBEDS: Dict[str, EmbedTemplate] = {}  # un gabarit par titre (roulette, slots, cf)
+
+
+def autoplay_embed(title: str, user: discord.abc.User, res: AutoplayResult, tours: int, new_bal: int) -> discord.Embed:
+    sign = "+" if res.net >= 0 else "-"
+    template = AUTOPLAY_EMBEDS.get(title)
+    if template is None:
+        template = AUTOPLAY_EMBEDS[title] = EmbedTemplate(title, *AUTOPLAY_FIELDS)
+    return template.render(
+        user,
+        f"{res.rounds}/{tours}",
+        str(res.wins),
+        res.stop,
+        f"**{sign}{fmt_int(abs(res.net))}** {CURRENCY_EMOJI}",
+        " · ".join(res.history[-10:]) or "-",
+        fmt_money(int(new_bal)),
+    )
 
 
 # =========================
 # BLACKJACK (simple)
 # =========================
-def bj_card() -> int:
-    return random.choice([2,3,4,5,6,7,8,9,10,10,10,10,11])
+def bj_card(rng: random.Random) -> int:
+    return rng.choice([2,3,4,5,6,7,8,9,10,10,10,10,11])
 
 def bj_score(cards: List[int]) -> int:
     total = sum(cards)
@@ -426,10 +3904,21 @@ class BJGame:
     player: List[int]
     dealer: List[int]
     finished: bool = False
+    rng: Optional[GameRng] = None  # flux de la main : hits et croupier tirent dedans
 
 BJ_SESSIONS: Dict[int, BJGame] = {}
 
 
+async def bj_settle(user_id: int, game: BJGame, payout: int, action: str) -> int:
+    """
+    Règle une main dont la mise a été débitée à /bj : payout = somme rendue
+    (0 si perdu), écrite avec la référence du tirage. returns: nouveau solde
+    """
+    game.finished = True
+    BJ_SESSIONS.pop(user_id, None)
+    return await add_balance(user_id, payout, action=action, rng=game.rng)
+
+
 # =========================
 # MINES GAME (total mults, bet risked at start)
 # =========================
@@ -442,6 +3931,7 @@ class MinesGame:
     num_mines: int = 1
     num_safes: int = 8
     finished: bool = False
+    rng: Optional[GameRng] = None  # flux qui a placé la mine
 
     def __post_init__(self):
         if self.revealed is None:
@@ -457,6 +3947,10 @@ class MinesView(discord.ui.View):
         if interaction.user.id != self.user_id:
             await interaction.response.send_message("❌ Ce jeu de mines n'est pas le tien.", ephemeral=True)
             return False
+        wait = RATE_LIMITER.hit(interaction.guild_id, "mines_button", interaction.user.id)
+        if wait > 0:
+            await interaction.response.send_message(f"⏳ Doucement ! Réessaie dans **{wait:.1f}s**.", ephemeral=True)
+            return False
         return True
 
     async def on_timeout(self):
@@ -503,85 +3997,77 @@ class MinesView(discord.ui.View):
 
     @discord.ui.button(label="Réclamer", style=discord.ButtonStyle.success)
     async def claim(self, interaction: discord.Interaction, button: discord.ui.Button):
-        game = MINES_SESSIONS.get(self.user_id)
-        if not game or game.finished:
-            return await interaction.response.send_message("Partie terminée.", ephemeral=True)
+        async with USER_LOCKS.hold(self.user_id):
+            game = MINES_SESSIONS.get(self.user_id)
+            if not game or game.finished:
+                return await interaction.response.send_message("Partie terminée.", ephemeral=True)
 
-        if game.safe_count == 0:
-            await interaction.response.send_message("❌ Révèle au moins une safe pour réclamer.", ephemeral=True)
-            return
-
-        idx = min(game.safe_count - 1, len(MINES_MULTS) - 1)
-        mult = MINES_MULTS[idx]
-        cashout = int(game.bet * mult)
-
-        game.finished = True
-        MINES_SESSIONS.pop(self.user_id, None)
-
-        new_bal = add_balance(self.user_id, cashout, action="mines_claim")
-        _, _, _, bonus = add_xp(self.user_id, random.randint(5, 15))
-        if bonus > 0:
-            new_bal = int(get_user(self.user_id)["balance"])
-
-        e = base_embed("Minesweeper - Réclamé", user=interaction.user)
-        e.add_field(name="Safe trouvées", value=f"{game.safe_count}/8", inline=True)
-        e.add_field(name="Multiplicateur", value=f"x{mult:.1f}", inline=True)
-        e.add_field(name="Réclamé", value=f"**+{fmt_int(cashout)}** {CURRENCY_EMOJI}", inline=False)
-        grid = self._render_grid(game)
-        e.add_field(name="Grille", value=grid, inline=False)
-        if bonus > 0:
-            e.add_field(name="Bonus niveau", value=f"+{fmt_int(bonus)} {CURRENCY_EMOJI}", inline=False)
-        e.add_field(name="Solde", value=fmt_money(new_bal), inline=False)
-        self.stop()
-        await interaction.response.edit_message(embed=e, view=None)
+            if game.safe_count == 0:
+                await interaction.response.send_message("❌ Révèle au moins une safe pour réclamer.", ephemeral=True)
+                return
 
-    async def _reveal(self, interaction: discord.Interaction, pos: int):
-        game = MINES_SESSIONS.get(self.user_id)
-        if not game or game.finished or pos in game.revealed:
-            return await interaction.response.send_message("Case déjà révélée ou partie finie.", ephemeral=True)
+            idx = min(game.safe_count - 1, len(MINES_MULTS) - 1)
+            mult = MINES_MULTS[idx]
+            cashout = int(game.bet * mult)
 
-        game.revealed.add(pos)
-        if pos in game.mines_pos:
-            # Mine ! Bet already lost at start
             game.finished = True
             MINES_SESSIONS.pop(self.user_id, None)
-            add_draws(self.user_id, 1)
-            add_xp(self.user_id, random.randint(1, 5))  # Petit XP
-            e = base_embed("Minesweeper", user=interaction.user)
-            e.add_field(name="💥 Mine touchée !", value=f"Perdu ta mise de **{fmt_int(game.bet)}** {CURRENCY_EMOJI}", inline=False)
+
+            new_bal = await add_balance(self.user_id, cashout, action="mines_claim", rng=game.rng)
+            game_played(self.user_id, "mines", xp=random.randint(5, 15), draws=0, channel_id=interaction.channel_id)
+
+            e = fair_footer(base_embed("Minesweeper - Réclamé", user=interaction.user), game.rng)
+            e.add_field(name="Safe trouvées", value=f"{game.safe_count}/8", inline=True)
+            e.add_field(name="Multiplicateur", value=f"x{mult:.1f}", inline=True)
+            e.add_field(name="Réclamé", value=f"**+{fmt_int(cashout)}** {CURRENCY_EMOJI}", inline=False)
             grid = self._render_grid(game)
             e.add_field(name="Grille", value=grid, inline=False)
-            new_bal = int(get_user(self.user_id)["balance"])
             e.add_field(name="Solde", value=fmt_money(new_bal), inline=False)
             self.stop()
             await interaction.response.edit_message(embed=e, view=None)
-        else:
-            # Safe
-            game.safe_count += 1
-            idx = min(game.safe_count - 1, len(MINES_MULTS) - 1)
-            mult = MINES_MULTS[idx]
-            cashout = int(game.bet * mult)
-            e = base_embed("Minesweeper", user=interaction.user)
-            grid = self._render_grid(game)
-            e.add_field(name="Grille", value=grid, inline=False)
-            e.add_field(name="Safe trouvées", value=f"{game.safe_count}/8", inline=True)
-            e.add_field(name="Cashout potentiel", value=f"x{mult:.1f} ({fmt_int(cashout)} {CURRENCY_EMOJI})", inline=True)
-            if game.safe_count == game.num_safes:  # Toutes safe révélées
+
+    async def _reveal(self, interaction: discord.Interaction, pos: int):
+        async with USER_LOCKS.hold(self.user_id):
+            game = MINES_SESSIONS.get(self.user_id)
+            if not game or game.finished or pos in game.revealed:
+                return await interaction.response.send_message("Case déjà révélée ou partie finie.", ephemeral=True)
+
+            game.revealed.add(pos)
+            if pos in game.mines_pos:
+                # Mine ! Bet already lost at start
                 game.finished = True
                 MINES_SESSIONS.pop(self.user_id, None)
-                mult = 3.5
-                cashout = int(game.bet * mult)
-                new_bal = add_balance(self.user_id, cashout, action="mines_win")
-                add_draws(self.user_id, 1)
-                _, _, _, bonus = add_xp(self.user_id, random.randint(10, 20))
-                if bonus > 0:
-                    new_bal = int(get_user(self.user_id)["balance"])
-                e.add_field(name="🎉 Victoire totale !", value=f"**+{fmt_int(cashout)}** {CURRENCY_EMOJI} (x3.5)", inline=False)
-                if bonus > 0:
-                    e.add_field(name="Bonus niveau", value=f"+{fmt_int(bonus)} {CURRENCY_EMOJI}", inline=False)
+                game_played(self.user_id, "mines", xp=random.randint(1, 5), channel_id=interaction.channel_id)  # Petit XP
+                e = fair_footer(base_embed("Minesweeper", user=interaction.user), game.rng)
+                e.add_field(name="💥 Mine touchée !", value=f"Perdu ta mise de **{fmt_int(game.bet)}** {CURRENCY_EMOJI}", inline=False)
+                grid = self._render_grid(game)
+                e.add_field(name="Grille", value=grid, inline=False)
+                new_bal = int((await get_user(self.user_id))["balance"])
                 e.add_field(name="Solde", value=fmt_money(new_bal), inline=False)
                 self.stop()
-            await interaction.response.edit_message(embed=e, view=self)
+                await interaction.response.edit_message(embed=e, view=None)
+            else:
+                # Safe
+                game.safe_count += 1
+                idx = min(game.safe_count - 1, len(MINES_MULTS) - 1)
+                mult = MINES_MULTS[idx]
+                cashout = int(game.bet * mult)
+                e = fair_footer(base_embed("Minesweeper", user=interaction.user), game.rng)
+                grid = self._render_grid(game)
+                e.add_field(name="Grille", value=grid, inline=False)
+                e.add_field(name="Safe trouvées", value=f"{game.safe_count}/8", inline=True)
+                e.add_field(name="Cashout potentiel", value=f"x{mult:.1f} ({fmt_int(cashout)} {CURRENCY_EMOJI})", inline=True)
+                if game.safe_count == game.num_safes:  # Toutes safe révélées
+                    game.finished = True
+                    MINES_SESSIONS.pop(self.user_id, None)
+                    mult = 3.5
+                    cashout = int(game.bet * mult)
+                    new_bal = await add_balance(self.user_id, cashout, action="mines_win", rng=game.rng)
+                    game_played(self.user_id, "mines", xp=random.randint(10, 20), channel_id=interaction.channel_id)
+                    e.add_field(name="🎉 Victoire totale !", value=f"**+{fmt_int(cashout)}** {CURRENCY_EMOJI} (x3.5)", inline=False)
+                    e.add_field(name="Solde", value=fmt_money(new_bal), inline=False)
+                    self.stop()
+                await interaction.response.edit_message(embed=e, view=self)
 
     def _render_grid(self, game: MinesGame) -> str:
         grid = [["?" for _ in range(3)] for _ in range(3)]
@@ -602,25 +4088,239 @@ class MinesView(discord.ui.View):
 MINES_SESSIONS: Dict[int, MinesGame] = {}
 
 
+# =========================
+# RATE LIMITING / SURCHARGE
+# =========================
+class RateLimiter:
+    """Token bucket par (serveur, commande, joueur), entièrement en mémoire."""
+
+    def __init__(self, limits: Dict[str, Tuple[float, int]], guild_limits: Dict[int, Dict[str, Tuple[float, int]]]):
+        self.limits = limits
+        self.guild_limits = guild_limits
+        self._buckets: Dict[Tuple[int, str, int], List[float]] = {}
+        self._next_prune = 0.0
+
+    def limit_for(self, guild_id: Optional[int], command: str) -> Tuple[float, int]:
+        if guild_id is not None:
+            per_guild = self.guild_limits.get(guild_id)
+            if per_guild and command in per_guild:
+                return per_guild[command]
+        return self.limits.get(command) or self.limits["default"]
+
+    def hit(self, guild_id: Optional[int], command: str, user_id: int) -> float:
+        """
+        returns: 0 si autorisé, sinon le nombre de secondes avant le prochain jeton
+        """
+        rate, burst = self.limit_for(guild_id, command)
+        now = time.monotonic()
+        key = (guild_id or 0, command, user_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = [burst - 1.0, now]
+            self._maybe_prune(now)
+            return 0.0
+
+        tokens = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return 0.0
+        bucket[0] = tokens
+        return (1.0 - tokens) / rate
+
+    def _maybe_prune(self, now: float):
+        # un seau plein équivaut à un seau absent : on les jette de temps en temps
+        if now < self._next_prune:
+            return
+        self._next_prune = now + 60.0
+        stale = []
+        for (guild_id, command, user_id), (tokens, last) in self._buckets.items():
+            rate, burst = self.limit_for(guild_id or None, command)
+            if tokens + (now - last) * rate >= burst:
+                stale.append((guild_id, command, user_id))
+        for key in stale:
+            del self._buckets[key]
+
+
+RATE_LIMITER = RateLimiter(RATE_LIMITS, GUILD_RATE_LIMITS)
+
+
+class LoopLagMonitor:
+    """Mesure le retard de la boucle asyncio et bascule le mode surcharge."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = 0.0
+        self.overloaded = False
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            # moyenne glissante : un pic isolé ne déclenche pas le délestage
+            self.lag = 0.7 * self.lag + 0.3 * lag
+            if not self.overloaded and self.lag > OVERLOAD_LAG:
+                self.overloaded = True
+                print(f"⚠️ Surcharge : lag boucle {self.lag * 1000:.0f} ms, délestage des commandes lourdes")
+            elif self.overloaded and self.lag < OVERLOAD_RECOVER_LAG:
+                self.overloaded = False
+                print("✅ Fin de surcharge")
+
+
+LOOP_MONITOR = LoopLagMonitor()
+
+
+class CommandRate:
+    """Compte les commandes par minute (fenêtre glissante) pour repérer les heures creuses."""
+
+    def __init__(self, minutes: int = 60):
+        self.buckets: Dict[int, int] = {}
+        self.minutes = minutes
+        self.since = time.time()
+
+    def hit(self, now: Optional[float] = None):
+        minute = int((now if now is not None else time.time()) // 60)
+        self.buckets[minute] = self.buckets.get(minute, 0) + 1
+        if len(self.buckets) > self.minutes:
+            for m in [m for m in self.buckets if m <= minute - self.minutes]:
+                del self.buckets[m]
+
+    def rate(self, window: float, now: Optional[float] = None) -> float:
+        """
+        returns: commandes/s sur les `window` dernières secondes (minutes entamées incluses)
+        """
+        now = now if now is not None else time.time()
+        first = int((now - window) // 60)
+        return sum(n for m, n in self.buckets.items() if m >= first) / window
+
+    def observed(self, now: Optional[float] = None) -> float:
+        """returns: secondes d'activité observées (depuis le démarrage du process)"""
+        return (now if now is not None else time.time()) - self.since
+
+
+COMMAND_RATE = CommandRate()
+
+
 # =========================
 # DISCORD BOT
 # =========================
 def base_embed(title: str, description: str = "", user: Optional[discord.abc.User] = None) -> discord.Embed:
-    e = discord.Embed(title=title, description=description, color=0x3498db)
-    if user:
-        e.set_author(name=user.display_name, icon_url=user.display_avatar.url)
-    e.set_footer(text="Coinsbot • Casino")
-    return e
+    return make_embed(title, description, user)
+
+
+def tree_hash(tree: app_commands.CommandTree, guild: Optional[discord.abc.Snowflake] = None) -> str:
+    payload = sorted((c.to_dict() for c in tree.get_commands(guild=guild)), key=lambda d: (d["type"], d["name"]))
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
-class CoinsBot(commands.Bot):
+def _load_tree_hashes() -> Dict[str, str]:
+    try:
+        with open(TREE_HASH_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_tree_hashes(hashes: Dict[str, str]):
+    tmp = TREE_HASH_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(hashes, f, indent=2, sort_keys=True)
+    os.replace(tmp, TREE_HASH_PATH)
+
+
+class CoinsTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.type is not discord.InteractionType.application_command:
+            return True
+        cmd = interaction.command
+        if cmd is None:
+            return True
+        name = cmd.qualified_name
+        COMMAND_RATE.hit()
+
+        if LOOP_MONITOR.overloaded and name in LOW_PRIORITY_COMMANDS:
+            await interaction.response.send_message("🚧 Le bot est surchargé, réessaie dans un instant.", ephemeral=True)
+            return False
+
+        wait = RATE_LIMITER.hit(interaction.guild_id, name, interaction.user.id)
+        if wait > 0:
+            await interaction.response.send_message(f"⏳ Doucement ! Réessaie dans **{wait:.1f}s**.", ephemeral=True)
+            return False
+        return True
+
+
+_BOT_BASE = commands.AutoShardedBot if SHARD_COUNT else commands.Bot
+
+
+class CoinsBot(_BOT_BASE):
     def __init__(self):
         intents = discord.Intents.default()
-        super().__init__(command_prefix=".", intents=intents)
+        intents.message_content = CHAT_XP_ENABLED
+        shard_kwargs = {}
+        if SHARD_COUNT:
+            shard_kwargs = {"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS or None}
+        super().__init__(command_prefix=".", intents=intents, tree_cls=CoinsTree, **shard_kwargs)
 
     async def setup_hook(self):
-        db_init()
-        await self.tree.sync()
+        STORE.init()
+        stale = await FAIR_RNG.reveal_stale()
+        if stale:
+            print(f"🔓 {stale} graine(s) laissée(s) ouverte(s) par un arrêt brutal, révélée(s)")
+        await asyncio.to_thread(CLANS.load)  # instantané complet : hors boucle (démon distant)
+        EVENTS.start()
+        self.loop.create_task(LOOP_MONITOR.run())
+        if CHAT_XP_ENABLED:
+            self.loop.create_task(CHAT_XP.run())
+        self.loop.create_task(REMINDERS.run())
+        if not isinstance(STORE, RemoteStore) and (not SHARD_IDS or 0 in SHARD_IDS):
+            # un seul cumul du ledger par cluster (avec le démon, c'est lui qui le fait)
+            self.loop.create_task(season_loop())
+        if isinstance(STORE, SqliteStore):
+            # jobs d'exploitation propres au fichier SQLite
+            self.loop.create_task(run_backfills())
+            self.loop.create_task(clan_invite_sweeper())
+            self.loop.create_task(clan_economy_loop())
+            self.loop.create_task(backup_loop())
+            self.loop.create_task(maintenance_loop())
+        elif isinstance(STORE, RemoteStore):
+            # les jobs SQLite tournent dans le démon ; ici on suit ses invalidations de cache
+            self.loop.create_task(follow_store_events(STORE))
+        if SHARD_IDS and 0 not in SHARD_IDS:
+            return  # un seul process du cluster synchronise l'arbre de commandes
+        if DEV_GUILD_ID:
+            await self.sync_commands(guild=discord.Object(id=DEV_GUILD_ID), force=FORCE_TREE_SYNC)
+        else:
+            await self.sync_commands(force=FORCE_TREE_SYNC)
+
+    async def close(self):
+        await DROPS.close_all()  # drops en cours : clôturés et payés avant l'arrêt
+        await FAIR_RNG.close()  # graines en cours révélées : les parties de cette session deviennent vérifiables
+        CHAT_XP.flush()
+        await EVENTS.stop()  # xp en attente écrite avant de couper
+        await super().close()
+
+    async def sync_commands(self, guild: Optional[discord.abc.Snowflake] = None, force: bool = False) -> bool:
+        """
+        returns: True si un sync a été envoyé à Discord
+        """
+        if guild is not None:
+            self.tree.copy_global_to(guild=guild)
+        key = f"guild:{guild.id}" if guild is not None else "global"
+        digest = tree_hash(self.tree, guild=guild)
+
+        hashes = _load_tree_hashes()
+        if not force and hashes.get(key) == digest:
+            print(f"⏭️ Slash commands inchangées ({key}), sync ignoré")
+            return False
+
+        await self.tree.sync(guild=guild)
+        hashes[key] = digest
+        _save_tree_hashes(hashes)
+        print(f"🔄 Slash commands synchronisées ({key})")
+        return True
 
 
 bot = CoinsBot()
@@ -631,12 +4331,20 @@ async def on_ready():
     print(f"✅ Connecté en tant que {bot.user} (Coinsbot)")
 
 
+@bot.listen("on_message")
+async def chat_xp_listener(message: discord.Message):
+    if not CHAT_XP_ENABLED or message.author.bot or message.guild is None:
+        return
+    if len(message.content.strip()) < CHAT_XP_MIN_LENGTH:
+        return
+    CHAT_XP.hit(message.author.id, message.channel.id)
+
+
 # =========================
 # /help
 # =========================
-@bot.tree.command(name="help", description="Affiche toutes les commandes Coinsbot")
-async def help_cmd(interaction: discord.Interaction):
-    e = base_embed("Coinsbot • Aide", user=interaction.user)
+def help_embed() -> discord.Embed:
+    e = base_embed("Coinsbot • Aide")
 
     e.add_field(
         name="💰 Économie",
@@ -645,9 +4353,12 @@ async def help_cmd(interaction: discord.Interaction):
             "• `/daily` → récompense (cooldown)\n"
             "• `/collect` → collecte (cooldown)\n"
             "• `/gift` → cadeau (20 min, max 350)\n"
+            "• `/rappels mode` → prévenu quand daily/collect/gift reviennent (DM ou salon)\n"
+            "• `/equite` → graines des jeux pour vérifier un tirage, choix de ta graine client\n"
             "• `/give @membre montant` → donner des coins\n"
             "• `/top` → classement joueurs\n"
-            "• `/topclan` → classement clans (banque)"
+            "• `/top saison [classement]` → gains nets ou parties de la semaine / du mois\n"
+            "• `/topclan [saison]` → classement clans (banque, ou progression sur la saison)"
         ),
         inline=False
     )
@@ -655,13 +4366,14 @@ async def help_cmd(interaction: discord.Interaction):
     e.add_field(
         name="🎲 Casino",
         value=(
-            "• `/roulette mise choix` → choix: `noir`, `rouge` ou `0-36`\n"
+            "• `/roulette choix [mise]` → `rouge`, `pair`, `d1`, `c2`, `17`… ou bulletin `rouge:100 17:50`\n"
             "• `/slots mise` → machine à sous\n"
             "• `/bj mise` → blackjack (boutons Hit/Stand)\n"
             "• `/nombre mise choix` → devine 1-10 (x4)\n"
             "• `/cf mise` → coin flip twist (x1.5)\n"
             "• `/rps mise choix` → pierre/feuille/ciseaux (x2)\n"
-            "• `/mines mise` → minesweeper 3x3 (1 mine, boutons, cashout max x3.5)"
+            "• `/mines mise` → minesweeper 3x3 (1 mine, boutons, cashout max x3.5)\n"
+            "• Autoplay `/roulette` `/slots` `/cf` : `tours`, `stop_perte`, `objectif`"
         ),
         inline=False
     )
@@ -679,8 +4391,10 @@ async def help_cmd(interaction: discord.Interaction):
         value=(
             "• `/clan create nom` → créer un clan\n"
             "• `/clan invite @membre` → inviter (owner)\n"
-            "• `/clan accept` → accepter\n"
+            "• `/clan invites` → invitations en attente\n"
+            "• `/clan accept [clan]` → accepter\n"
             "• `/clan info` → infos clan\n"
+            "• `/clan members [rôle]` → liste des membres\n"
             "• `/clan deposit montant` → déposer (tout membre)\n"
             "• `/clan withdraw montant` → retirer (owner/mod)\n"
             "• `/clan setmod @membre` → mod (owner, max 2)\n"
@@ -692,8 +4406,16 @@ async def help_cmd(interaction: discord.Interaction):
         ),
         inline=False
     )
+    return e
 
-    await interaction.response.send_message(embed=e, ephemeral=True)
+
+# construit une fois : chaque /help n'en reçoit qu'une copie avec l'auteur
+HELP_EMBED = StaticEmbed(help_embed())
+
+
+@bot.tree.command(name="help", description="Affiche toutes les commandes Coinsbot")
+async def help_cmd(interaction: discord.Interaction):
+    await interaction.response.send_message(embed=HELP_EMBED.get(interaction.user), ephemeral=True)
 
 
 # =========================
@@ -702,48 +4424,114 @@ async def help_cmd(interaction: discord.Interaction):
 @bot.tree.command(name="bal", description="Voir ton solde")
 async def bal(interaction: discord.Interaction, membre: Optional[discord.Member] = None):
     membre = membre or interaction.user
-    u = get_user(membre.id)
+    u = await get_user(membre.id)
     clan = clan_name_for_user(membre.id)
     role = user_clan_role(membre.id) or "-"
 
-    e = base_embed("Portefeuille", user=membre)
-    e.add_field(name="Solde", value=fmt_money(int(u["balance"])), inline=False)
-    e.add_field(name="Niveau", value=f"LVL {int(u['level'])} • XP {fmt_int(int(u['xp']))}", inline=True)
-    e.add_field(name="Tirages", value=str(int(u["draws"])), inline=True)
-    e.add_field(name="Clan", value=f"{clan} ({role})" if clan != "Aucun clan" else clan, inline=False)
+    e = BAL_EMBED.render(
+        membre,
+        fmt_money(int(u["balance"])),
+        f"LVL {int(u['level'])} • XP {fmt_int(int(u['xp']))}",
+        str(int(u["draws"])),
+        f"{clan} ({role})" if clan != "Aucun clan" else clan,
+    )
     await interaction.response.send_message(embed=e)
 
 
+BAL_EMBED = EmbedTemplate("Portefeuille", ("Solde", False), ("Niveau", True), ("Tirages", True), ("Clan", False))
+
+
+async def member_name(interaction: discord.Interaction, uid: int) -> str:
+    name = None
+    if interaction.guild:
+        m = interaction.guild.get_member(uid)
+        if m:
+            name = m.display_name
+        else:
+            try:
+                m2 = await interaction.guild.fetch_member(uid)
+                name = m2.display_name
+            except:
+                name = None
+
+    if not name:
+        try:
+            u = await bot.fetch_user(uid)
+            name = u.name
+        except:
+            name = f"User {uid}"
+    return name
+
+
+# saison -> (période, saison précédente ?)
+SEASON_CHOICES = {
+    "semaine": ("semaine", False),
+    "mois": ("mois", False),
+    "semaine_passee": ("semaine", True),
+    "mois_passe": ("mois", True),
+}
+SEASON_CHOICE_LIST = [
+    app_commands.Choice(name="Cette semaine", value="semaine"),
+    app_commands.Choice(name="Ce mois-ci", value="mois"),
+    app_commands.Choice(name="Semaine dernière", value="semaine_passee"),
+    app_commands.Choice(name="Mois dernier", value="mois_passe"),
+]
+
+
+async def season_embed(interaction: discord.Interaction, saison: str, board: str, limit: int) -> Optional[discord.Embed]:
+    """returns: embed du classement précalculé, None s'il est vide"""
+    period, previous = SEASON_CHOICES[saison]
+    season, rows = await season_board(period, board, previous, limit)
+    if not rows:
+        return None
+    lines = []
+    for r in rows:
+        value = int(r["value"])
+        if board == "parties":
+            score = f"`{fmt_int(value)} partie(s)`"
+        else:
+            score = f"`+{fmt_int(value)} {CURRENCY_NAME}` {CURRENCY_EMOJI}"
+        name = r["label"] if board == "clans" else await member_name(interaction, int(r["entity_id"]))
+        lines.append(f"**{r['rank']})** {name}\n{score}")
+    titles = {"gains": "Gains nets aux jeux", "parties": "Parties jouées", "clans": "Progression des banques de clan"}
+    e = base_embed(f"{titles[board]} • {period} {season}", "\n\n".join(lines))
+    age = max(1, now_ts() - int(rows[0]["computed_at"]))
+    e.set_footer(text=f"Coinsbot • Casino • calculé il y a {human_time(age)}")
+    return e
+
+
 @bot.tree.command(name="top", description="Classement des plus riches (joueurs)")
-@app_commands.describe(limit="Nombre de personnes (max 20)")
-async def top(interaction: discord.Interaction, limit: int = 10):
+@app_commands.describe(
+    limit="Nombre de personnes (max 20)",
+    saison="Classement de la semaine ou du mois au lieu du solde",
+    classement="Pour une saison : gains nets aux jeux ou nombre de parties",
+)
+@app_commands.choices(
+    saison=SEASON_CHOICE_LIST,
+    classement=[
+        app_commands.Choice(name="Gains nets", value="gains"),
+        app_commands.Choice(name="Parties jouées", value="parties"),
+    ],
+)
+async def top(interaction: discord.Interaction, limit: int = 10, saison: Optional[str] = None, classement: str = "gains"):
     limit = max(3, min(20, limit))
-    rows = get_top(limit)
+    if saison:
+        if saison not in SEASON_CHOICES or classement not in ("gains", "parties"):
+            return await interaction.response.send_message("❌ Saison ou classement inconnu.", ephemeral=True)
+        e = await season_embed(interaction, saison, classement, limit)
+        if e is None:
+            return await interaction.response.send_message(
+                "Aucun classement pour cette saison (pour l’instant).", ephemeral=True
+            )
+        return await interaction.response.send_message(embed=e)
+
+    rows = await get_top(limit)
 
     lines = []
     for i, r in enumerate(rows, start=1):
         uid = int(r["user_id"])
         bal_ = int(r["balance"])
-
-        name = None
-        if interaction.guild:
-            m = interaction.guild.get_member(uid)
-            if m:
-                name = m.display_name
-            else:
-                try:
-                    m2 = await interaction.guild.fetch_member(uid)
-                    name = m2.display_name
-                except:
-                    name = None
-
-        if not name:
-            try:
-                u = await bot.fetch_user(uid)
-                name = u.name
-            except:
-                name = f"User {uid}"
-
+        name = await member_name(interaction, uid)
         lines.append(f"**{i})** {name}\n`{fmt_int(bal_)} {CURRENCY_NAME}` {CURRENCY_EMOJI}")
 
     e = base_embed("Classement des Coinsbot Coins", "\n\n".join(lines))
@@ -751,10 +4539,21 @@ async def top(interaction: discord.Interaction, limit: int = 10):
 
 
 @bot.tree.command(name="topclan", description="Classement des clans par banque")
-@app_commands.describe(limit="Nombre de clans (max 20)")
-async def topclan(interaction: discord.Interaction, limit: int = 10):
+@app_commands.describe(limit="Nombre de clans (max 20)", saison="Progression de la banque sur la semaine ou le mois")
+@app_commands.choices(saison=SEASON_CHOICE_LIST)
+async def topclan(interaction: discord.Interaction, limit: int = 10, saison: Optional[str] = None):
     limit = max(3, min(20, limit))
-    rows = top_clans(limit)
+    if saison:
+        if saison not in SEASON_CHOICES:
+            return await interaction.response.send_message("❌ Saison inconnue.", ephemeral=True)
+        e = await season_embed(interaction, saison, "clans", limit)
+        if e is None:
+            return await interaction.response.send_message(
+                "Aucun classement pour cette saison (pour l’instant).", ephemeral=True
+            )
+        return await interaction.response.send_message(embed=e)
+
+    rows = await top_clans(limit)
     if not rows:
         return await interaction.response.send_message("Aucun clan.", ephemeral=True)
 
@@ -773,19 +4572,80 @@ async def timer(interaction: discord.Interaction):
     e.add_field(
         name="Coinsbot",
         value=(
-            f"• Daily : **{human_time(cd_left(u.id, 'daily'))}**\n"
-            f"• Collect : **{human_time(cd_left(u.id, 'collect'))}**\n"
-            f"• Gift : **{human_time(cd_left(u.id, 'gift'))}**\n"
+            f"• Daily : **{human_time(await cd_left(u.id, 'daily'))}**\n"
+            f"• Collect : **{human_time(await cd_left(u.id, 'collect'))}**\n"
+            f"• Gift : **{human_time(await cd_left(u.id, 'gift'))}**\n"
         ),
         inline=False,
     )
+    e.set_footer(text=f"Rappels : {REMINDER_MODE_LABELS[int((await get_user(u.id))['reminders'])]} (/rappels)")
     await interaction.response.send_message(embed=e)
 
 
+REMINDER_MODES = {"off": REMIND_OFF, "dm": REMIND_DM, "salon": REMIND_CHANNEL}
+REMINDER_MODE_LABELS = {REMIND_OFF: "désactivés", REMIND_DM: "en message privé", REMIND_CHANNEL: "dans le salon"}
+
+
+@bot.tree.command(name="rappels", description="Être prévenu quand daily / collect / gift sont de nouveau dispo")
+@app_commands.describe(mode="Où recevoir les rappels")
+@app_commands.choices(
+    mode=[
+        app_commands.Choice(name="En message privé", value="dm"),
+        app_commands.Choice(name="Dans le salon de la commande", value="salon"),
+        app_commands.Choice(name="Désactivés", value="off"),
+    ]
+)
+async def rappels(interaction: discord.Interaction, mode: str):
+    u = interaction.user
+    value = REMINDER_MODES.get(mode)
+    if value is None:
+        return await interaction.response.send_message("❌ Mode inconnu.", ephemeral=True)
+    await set_reminder_mode(u.id, value, interaction.channel_id)
+    await interaction.response.send_message(
+        embed=base_embed("Rappels", f"⏰ Rappels de cooldown **{REMINDER_MODE_LABELS[value]}**.", user=u),
+        ephemeral=True,
+    )
+
+
+@bot.tree.command(name="equite", description="Graines des jeux (hash publiés, graines révélées) pour vérifier un tirage")
+@app_commands.describe(graine_client=f"Ta graine client pour les prochaines parties ({RNG_CLIENT_SEED_MAX} caractères max)")
+async def equite(interaction: discord.Interaction, graine_client: Optional[str] = None):
+    u = interaction.user
+    if graine_client is not None:
+        graine_client = graine_client.strip()
+        if not graine_client or len(graine_client) > RNG_CLIENT_SEED_MAX:
+            return await interaction.response.send_message(
+                f"❌ Graine client : 1 à {RNG_CLIENT_SEED_MAX} caractères.", ephemeral=True
+            )
+        await STORE.run("set_client_seed", u.id, graine_client)
+    client_seed = graine_client if graine_client is not None else await STORE.run("get_client_seed", u.id)
+    e = base_embed(
+        "Équité vérifiable",
+        "Chaque partie affiche `#graine:nonce` (nonce propre à chaque joueur). Son tirage vient de "
+        "`random.Random(HMAC-SHA256(graine, \"jeu:joueur:graine client:nonce\"))` ; "
+        "la graine serveur est publiée ici par son sha256 avant ta graine client, puis révélée à la rotation.",
+    )
+    e.add_field(name="Ta graine client", value=f"`{client_seed}`" if client_seed else "*(vide)*", inline=False)
+    current = "\n".join(
+        f"• {game} #{seed_id} ({fmt_int(played)} parties) `{commitment}`"
+        for game, (seed_id, commitment, played) in (await FAIR_RNG.commitments()).items()
+    )
+    e.add_field(name="Graines en cours (sha256)", value=current, inline=False)
+    revealed = await STORE.run("revealed_rng_seeds", 5)
+    if revealed:
+        e.add_field(
+            name="Dernières graines révélées",
+            value="\n".join(f"• {r['game']} #{r['id']} `{r['seed']}`" for r in revealed),
+            inline=False,
+        )
+    await interaction.response.send_message(embed=e, ephemeral=True)
+
+
 @bot.tree.command(name="daily", description="Récupère ta récompense quotidienne")
+@serialized_per_user
 async def daily(interaction: discord.Interaction):
     u = interaction.user
-    left = cd_left(u.id, "daily")
+    left = await cd_left(u.id, "daily")
     if left > 0:
         return await interaction.response.send_message(
             embed=base_embed("Daily", f"⏳ Pas dispo. Reviens dans **{human_time(left)}**.", user=u),
@@ -793,23 +4653,22 @@ async def daily(interaction: discord.Interaction):
         )
 
     reward = random.randint(*DAILY_REWARD)
-    new_bal = add_balance(u.id, reward, action="daily")
-    _, _, _, bonus = add_xp(u.id, random.randint(15, 35))
-    set_cd(u.id, "daily", now_ts() + CD_DAILY)
-
-    e = base_embed("Daily", user=u)
-    e.add_field(name="Récompense", value=f"+{fmt_int(reward)} {CURRENCY_NAME} {CURRENCY_EMOJI}", inline=False)
-    if bonus > 0:
-        e.add_field(name="Bonus niveau", value=f"+{fmt_int(bonus)} {CURRENCY_EMOJI} (tous les 5 niveaux)", inline=False)
-        new_bal = int(get_user(u.id)["balance"])
-    e.add_field(name="Nouveau solde", value=fmt_money(int(new_bal)), inline=False)
+    new_bal = await add_balance(u.id, reward, action="daily")
+    game_played(u.id, "daily", xp=random.randint(15, 35), draws=0, channel_id=interaction.channel_id)
+    await set_cd(u.id, "daily", now_ts() + CD_DAILY, interaction.channel_id)
+
+    e = DAILY_EMBED.render(u, f"+{fmt_money(reward)}", fmt_money(int(new_bal)))
     await interaction.response.send_message(embed=e)
 
 
+DAILY_EMBED = EmbedTemplate("Daily", ("Récompense", False), ("Nouveau solde", False))
+
+
 @bot.tree.command(name="collect", description="Collecte des coins (cooldown)")
+@serialized_per_user
 async def collect(interaction: discord.Interaction):
     u = interaction.user
-    left = cd_left(u.id, "collect")
+    left = await cd_left(u.id, "collect")
     if left > 0:
         return await interaction.response.send_message(
             embed=base_embed("Collect", f"⏳ Pas dispo. Reviens dans **{human_time(left)}**.", user=u),
@@ -817,45 +4676,41 @@ async def collect(interaction: discord.Interaction):
         )
 
     reward = random.randint(*COLLECT_REWARD)
-    new_bal = add_balance(u.id, reward, action="collect")
-    _, _, _, bonus = add_xp(u.id, random.randint(5, 15))
-    set_cd(u.id, "collect", now_ts() + CD_COLLECT)
-
-    e = base_embed("Collecte de Coinsbot Coins", user=u)
-    e.add_field(name="Gains", value=f"Tu as collecté **{fmt_int(reward)}** {CURRENCY_EMOJI}", inline=False)
-    if bonus > 0:
-        e.add_field(name="Bonus niveau", value=f"+{fmt_int(bonus)} {CURRENCY_EMOJI}", inline=False)
-        new_bal = int(get_user(u.id)["balance"])
-    e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
+    new_bal = await add_balance(u.id, reward, action="collect")
+    game_played(u.id, "collect", xp=random.randint(5, 15), draws=0, channel_id=interaction.channel_id)
+    await set_cd(u.id, "collect", now_ts() + CD_COLLECT, interaction.channel_id)
+
+    e = COLLECT_EMBED.render(u, f"Tu as collecté **{fmt_int(reward)}** {CURRENCY_EMOJI}", fmt_money(int(new_bal)))
     await interaction.response.send_message(embed=e)
 
 
+COLLECT_EMBED = EmbedTemplate("Collecte de Coinsbot Coins", ("Gains", False), ("Solde", False))
+
+
 @bot.tree.command(name="gift", description="Cadeau aléatoire (cooldown 20 min, max 350)")
+@serialized_per_user
 async def gift(interaction: discord.Interaction):
     u = interaction.user
-    left = cd_left(u.id, "gift")
+    left = await cd_left(u.id, "gift")
     if left > 0:
         return await interaction.response.send_message(
             embed=base_embed("Cadeau", f"⏳ Pas dispo. Reviens dans **{human_time(left)}**.", user=u),
             ephemeral=True,
         )
 
-    set_cd(u.id, "gift", now_ts() + CD_GIFT)
+    await set_cd(u.id, "gift", now_ts() + CD_GIFT, interaction.channel_id)
 
     reward = random.randint(*GIFT_REWARD)
-    new_bal = add_balance(u.id, reward, action="gift")
-    _, _, _, bonus = add_xp(u.id, random.randint(8, 16))
-    if bonus > 0:
-        new_bal = int(get_user(u.id)["balance"])
-
-    e = base_embed("Cadeau", user=u)
-    e.add_field(name="Résultat", value=f"Vous avez gagné **{fmt_int(reward)}** {CURRENCY_EMOJI}", inline=False)
-    if bonus > 0:
-        e.add_field(name="Bonus niveau", value=f"+{fmt_int(bonus)} {CURRENCY_EMOJI}", inline=False)
-    e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
+    new_bal = await add_balance(u.id, reward, action="gift")
+    game_played(u.id, "gift", xp=random.randint(8, 16), draws=0, channel_id=interaction.channel_id)
+
+    e = GIFT_EMBED.render(u, f"Vous avez gagné **{fmt_int(reward)}** {CURRENCY_EMOJI}", fmt_money(int(new_bal)))
     await interaction.response.send_message(embed=e)
 
 
+GIFT_EMBED = EmbedTemplate("Cadeau", ("Résultat", False), ("Solde", False))
+
+
 # Nouvelle commande /give
 @bot.tree.command(name="give", description="Donne des coins à un membre")
 @app_commands.describe(membre="Le membre à qui donner", montant="Montant à donner")
@@ -866,133 +4721,191 @@ async def give(interaction: discord.Interaction, membre: discord.Member, montant
     if montant <= 0:
         return await interaction.response.send_message("❌ Montant invalide.", ephemeral=True)
 
-    bal = int(get_user(u.id)["balance"])
-    if montant > bal:
-        return await interaction.response.send_message("❌ Pas assez de coins.", ephemeral=True)
+    async with USER_LOCKS.hold(u.id, membre.id):
+        bal = int((await get_user(u.id))["balance"])
+        if montant > bal:
+            return await interaction.response.send_message("❌ Pas assez de coins.", ephemeral=True)
 
-    # Transfert direct
-    set_balance(u.id, bal - montant)
-    new_bal_receiver = add_balance(membre.id, montant, action="gift_received")
-    add_balance(u.id, 0, action="give")  # Log pour sender
+        # débit conditionnel : le solde est revérifié au commit, même entre shards
+        bal = await add_balance_if(u.id, -montant, montant, action="give")
+        if bal is None:
+            return await interaction.response.send_message("❌ Pas assez de coins.", ephemeral=True)
+        new_bal_receiver = await add_balance(membre.id, montant, action="gift_received")
 
     e = base_embed("Don de Coins", user=u)
     e.add_field(name="Donné", value=f"{fmt_int(montant)} {CURRENCY_EMOJI} à {membre.mention}", inline=False)
-    e.add_field(name="Ton solde", value=fmt_money(bal - montant), inline=True)
+    e.add_field(name="Ton solde", value=fmt_money(bal), inline=True)
     e.add_field(name="Solde de {membre.display_name}", value=fmt_money(new_bal_receiver), inline=True)
     await interaction.response.send_message(embed=e)
 
 
-@bot.tree.command(name="roulette", description="Joue à la roulette (noir/rouge ou numéro)")
-@app_commands.describe(mise="Montant", choix="noir/rouge/0-36")
-async def roulette(interaction: discord.Interaction, mise: int, choix: str):
+@bot.tree.command(name="roulette", description="Roulette : un ou plusieurs paris sur un tirage, autoplay possible")
+@app_commands.describe(
+    choix="rouge/noir, pair/impair, manque/passe, d1-d3, c1-c3, 0-36 ; bulletin : rouge:100 17:50 0:20",
+    mise="Montant des paris sans montant explicite",
+    tours=f"Autoplay : nombre de tirages (max {AUTOPLAY_MAX_ROUNDS})",
+    stop_perte="Autoplay : arrêt si la perte de la session atteint ce montant (0 = aucun)",
+    objectif="Autoplay : arrêt si le gain de la session atteint ce montant (0 = aucun)",
+)
+@serialized_per_user
+async def roulette(
+    interaction: discord.Interaction, choix: str, mise: int = 0, tours: int = 1, stop_perte: int = 0, objectif: int = 0
+):
     u = interaction.user
-    ensure_user(u.id)
+    await ensure_user(u.id)
 
-    if mise <= 0:
-        return await interaction.response.send_message("❌ Mise invalide.", ephemeral=True)
+    err = autoplay_error(tours, stop_perte, objectif)
+    if err:
+        return await interaction.response.send_message(err, ephemeral=True)
+    try:
+        slip = parse_roulette_slip(choix, mise)
+    except ValueError as exc:
+        return await interaction.response.send_message(
+            f"❌ {exc} (rouge/noir, pair/impair, manque/passe, d1-d3, c1-c3, 0-36).", ephemeral=True
+        )
+    stake = sum(amount for _, amount in slip)
 
-    bal = int(get_user(u.id)["balance"])
-    if mise > bal:
+    bal = int((await get_user(u.id))["balance"])
+    if stake > bal:
         return await interaction.response.send_message("❌ T'as pas assez de coins.", ephemeral=True)
 
-    choix = choix.strip().lower()
-    n, color = roulette_spin()
-    add_draws(u.id, 1)
-
-    delta = -mise
-    info = ""
-
-    if choix in ("noir", "rouge"):
-        if n != 0 and choix == color:
-            delta = +mise
-            info = f"Félicitations ! Vous avez gagné **{fmt_int(mise)}** {CURRENCY_EMOJI} (x2)"
-        else:
-            info = f"Perdu. Vous avez perdu **{fmt_int(mise)}** {CURRENCY_EMOJI}"
+    g = await FAIR_RNG.stream("roulette", u.id)
+    if tours > 1:
+        def play_round():
+            n, color = roulette_spin(g.rng)
+            return roulette_payout(slip, n), f"{color} {n}"
+
+        res = autoplay(tours, bal, stake, play_round, stop_perte, objectif, xp_range=(6, 18))
+        g.rounds = res.rounds
+        new_bal = await add_balance_if(u.id, res.net, res.required, action="roulette_autoplay", rng=g)
+        if new_bal is None:
+            return await interaction.response.send_message(STALE_BET, ephemeral=True)
+        game_played(u.id, "roulette", xp=res.xp, draws=res.rounds, channel_id=interaction.channel_id)
+        e = autoplay_embed("Roulette - autoplay", u, res, tours, new_bal)
+        e.insert_field_at(0, name="Bulletin", value=fmt_slip(slip), inline=False)
+        return await interaction.response.send_message(embed=fair_footer(e, g))
+
+    n, color = roulette_spin(g.rng)
+    delta = roulette_payout(slip, n)
+    if delta > 0:
+        jackpot = any(ROULETTE_BETS[name][1] == 35 and n in ROULETTE_BETS[name][0] for name, _ in slip)
+        info = f"{'🎉 JACKPOT !' if jackpot else 'Félicitations !'} Vous avez gagné **{fmt_int(delta)}** {CURRENCY_EMOJI}"
+    elif delta < 0:
+        info = f"Perdu. Vous avez perdu **{fmt_int(-delta)}** {CURRENCY_EMOJI}"
     else:
-        try:
-            picked = int(choix)
-        except ValueError:
-            return await interaction.response.send_message("❌ Choix invalide (noir/rouge/0-36).", ephemeral=True)
-        if not (0 <= picked <= 36):
-            return await interaction.response.send_message("❌ Numéro invalide (0-36).", ephemeral=True)
+        info = "🤝 Les gains couvrent les pertes."
 
-        if picked == n:
-            delta = 35 * mise
-            info = f"🎉 JACKPOT ! Vous avez gagné **{fmt_int(35*mise)}** {CURRENCY_EMOJI} (x36)"
-        else:
-            info = f"Perdu. Vous avez perdu **{fmt_int(mise)}** {CURRENCY_EMOJI}"
-
-    new_bal = add_balance(u.id, delta, action="roulette")
-    _, _, _, bonus = add_xp(u.id, random.randint(6, 18))
-    if bonus > 0:
-        new_bal = int(get_user(u.id)["balance"])
-
-    e = base_embed("La roue a fini de tourner", user=u)
-    e.add_field(name="Choix", value=str(choix), inline=True)
-    e.add_field(name="Numéro gagnant", value=f"{color} {n}", inline=True)
-    e.add_field(name="Résultat", value=info, inline=False)
-    if bonus > 0:
-        e.add_field(name="Bonus niveau", value=f"+{fmt_int(bonus)} {CURRENCY_EMOJI}", inline=False)
-    e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
+    new_bal = await add_balance_if(u.id, delta, stake, action="roulette", rng=g)
+    if new_bal is None:
+        return await interaction.response.send_message(STALE_BET, ephemeral=True)
+    game_played(u.id, "roulette", xp=random.randint(6, 18), channel_id=interaction.channel_id)
+
+    e = ROULETTE_EMBED.render(u, fmt_slip(slip), f"{color} {n}", info, fmt_money(int(new_bal)), footer=fair_text(g))
     await interaction.response.send_message(embed=e)
 
 
-@bot.tree.command(name="slots", description="Machine à sous")
-@app_commands.describe(mise="Montant")
-async def slots(interaction: discord.Interaction, mise: int):
-    u = interaction.user
-    ensure_user(u.id)
+ROULETTE_EMBED = EmbedTemplate(
+    "La roue a fini de tourner", ("Choix", True), ("Numéro gagnant", True), ("Résultat", False), ("Solde", False)
+)
 
-    if mise <= 0:
-        return await interaction.response.send_message("❌ Mise invalide.", ephemeral=True)
 
-    bal = int(get_user(u.id)["balance"])
-    if mise > bal:
-        return await interaction.response.send_message("❌ T'as pas assez de coins.", ephemeral=True)
+SLOTS_SYMBOLS = ["🍒", "🍋", "🔔", "⭐", "💎", "7️⃣"]
+SLOTS_TRIPLE_MULT = {"7️⃣": 10, "💎": 8, "⭐": 6, "🔔": 5, "🍒": 4, "🍋": 3}
 
-    symbols = ["🍒", "🍋", "🔔", "⭐", "💎", "7️⃣"]
-    roll = [random.choice(symbols) for _ in range(3)]
-    add_draws(u.id, 1)
 
+def slots_round(mise: int, rng: random.Random) -> Tuple[List[str], int, int]:
+    """returns: (tirage, multiplicateur, gain net)"""
+    roll = [rng.choice(SLOTS_SYMBOLS) for _ in range(3)]
     payout_mult = 0
     if roll[0] == roll[1] == roll[2]:
-        mult_map = {"7️⃣": 10, "💎": 8, "⭐": 6, "🔔": 5, "🍒": 4, "🍋": 3}
-        payout_mult = mult_map.get(roll[0], 3)
+        payout_mult = SLOTS_TRIPLE_MULT.get(roll[0], 3)
     elif roll[0] == roll[1] or roll[1] == roll[2] or roll[0] == roll[2]:
         payout_mult = 2
+    net = mise * payout_mult - mise if payout_mult else -mise
+    return roll, payout_mult, net
+
+
+@bot.tree.command(name="slots", description="Machine à sous (autoplay possible)")
+@app_commands.describe(
+    mise="Montant",
+    tours=f"Autoplay : nombre de tirages (max {AUTOPLAY_MAX_ROUNDS})",
+    stop_perte="Autoplay : arrêt si la perte de la session atteint ce montant (0 = aucun)",
+    objectif="Autoplay : arrêt si le gain de la session atteint ce montant (0 = aucun)",
+)
+@serialized_per_user
+async def slots(interaction: discord.Interaction, mise: int, tours: int = 1, stop_perte: int = 0, objectif: int = 0):
+    u = interaction.user
+    await ensure_user(u.id)
 
+    if mise <= 0:
+        return await interaction.response.send_message("❌ Mise invalide.", ephemeral=True)
+    err = autoplay_error(tours, stop_perte, objectif)
+    if err:
+        return await interaction.response.send_message(err, ephemeral=True)
+
+    bal = int((await get_user(u.id))["balance"])
+    if mise > bal:
+        return await interaction.response.send_message("❌ T'as pas assez de coins.", ephemeral=True)
+
+    g = await FAIR_RNG.stream("slots", u.id)
+    if tours > 1:
+        def play_round():
+            roll, _, net = slots_round(mise, g.rng)
+            return net, "".join(roll)
+
+        res = autoplay(tours, bal, mise, play_round, stop_perte, objectif, xp_range=(4, 12))
+        g.rounds = res.rounds
+        new_bal = await add_balance_if(u.id, res.net, res.required, action="slots_autoplay", rng=g)
+        if new_bal is None:
+            return await interaction.response.send_message(STALE_BET, ephemeral=True)
+        game_played(u.id, "slots", xp=res.xp, draws=res.rounds, channel_id=interaction.channel_id)
+        e = autoplay_embed("Machine à sous - autoplay", u, res, tours, new_bal)
+        return await interaction.response.send_message(embed=fair_footer(e, g))
+
+    roll, payout_mult, net = slots_round(mise, g.rng)
+    new_bal = await add_balance_if(u.id, net, mise, action="slots", rng=g)
+    if new_bal is None:
+        return await interaction.response.send_message(STALE_BET, ephemeral=True)
     if payout_mult == 0:
-        new_bal = add_balance(u.id, -mise, action="slots")
         res = f"Perdu **-{fmt_int(mise)}** {CURRENCY_EMOJI}"
     else:
-        net = mise * payout_mult - mise
-        new_bal = add_balance(u.id, net, action="slots")
         res = f"Gagné ! **x{payout_mult}** → **+{fmt_int(net)}** {CURRENCY_EMOJI}"
 
-    _, _, _, bonus = add_xp(u.id, random.randint(4, 12))
-    if bonus > 0:
-        new_bal = int(get_user(u.id)["balance"])
+    game_played(u.id, "slots", xp=random.randint(4, 12), channel_id=interaction.channel_id)
 
-    e = base_embed("Machine à sous", user=u)
-    e.add_field(name="Tirage", value=" | ".join(roll), inline=False)
-    e.add_field(name="Résultat", value=res, inline=False)
-    if bonus > 0:
-        e.add_field(name="Bonus niveau", value=f"+{fmt_int(bonus)} {CURRENCY_EMOJI}", inline=False)
-    e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
+    e = SLOTS_EMBED.render(u, " | ".join(roll), res, fmt_money(int(new_bal)), footer=fair_text(g))
     await interaction.response.send_message(embed=e)
 
 
+SLOTS_EMBED = EmbedTemplate("Machine à sous", ("Tirage", False), ("Résultat", False), ("Solde", False))
+
+
+RPS_CHOICES = ["pierre", "feuille", "ciseaux"]
+RPS_BEATS = {"pierre": "ciseaux", "feuille": "pierre", "ciseaux": "feuille"}
+
+
+def rps_round(mise: int, choix: str, rng: random.Random) -> Tuple[str, int, str]:
+    """returns: (choix du bot, gain net, action du ledger)"""
+    bot_choice = rng.choice(RPS_CHOICES)
+    if RPS_BEATS[choix] == bot_choice:
+        return bot_choice, mise, "rps_win"  # x2 total
+    if choix == bot_choice:
+        return bot_choice, 0, "rps_tie"
+    return bot_choice, -mise, "rps_lose"
+
+
 # Nouvelle commande /rps
 @bot.tree.command(name="rps", description="Pierre/Feuille/Ciseaux vs bot (x2 si win)")
 @app_commands.describe(mise="Montant", choix="pierre/feuille/ciseaux")
+@serialized_per_user
 async def rps(interaction: discord.Interaction, mise: int, choix: str):
     u = interaction.user
-    ensure_user(u.id)
+    await ensure_user(u.id)
 
     if mise <= 0:
         return await interaction.response.send_message("❌ Mise invalide.", ephemeral=True)
 
-    bal = int(get_user(u.id)["balance"])
+    bal = int((await get_user(u.id))["balance"])
     if mise > bal:
         return await interaction.response.send_message("❌ T'as pas assez de coins.", ephemeral=True)
 
@@ -1000,62 +4913,59 @@ async def rps(interaction: discord.Interaction, mise: int, choix: str):
     if choix not in ("pierre", "feuille", "ciseaux"):
         return await interaction.response.send_message("❌ Choix invalide (pierre/feuille/ciseaux).", ephemeral=True)
 
-    bot_choice = random.choice(["pierre", "feuille", "ciseaux"])
-    add_draws(u.id, 1)
-
-    # Logique win/lose
-    if (choix == "pierre" and bot_choice == "ciseaux") or \
-       (choix == "feuille" and bot_choice == "pierre") or \
-       (choix == "ciseaux" and bot_choice == "feuille"):
-        delta = mise  # x2 total
+    g = await FAIR_RNG.stream("rps", u.id)
+    bot_choice, delta, action = rps_round(mise, choix, g.rng)
+    if delta > 0:
         info = f"✅ Tu gagnes ! **+{fmt_int(mise)}** {CURRENCY_EMOJI} (x2)"
-        action = "rps_win"
-    elif choix == bot_choice:
-        delta = 0
+    elif delta == 0:
         info = f"🤝 Égalité ! Mise remboursée."
-        action = "rps_tie"
     else:
-        delta = -mise
         info = f"❌ Tu perds. **-{fmt_int(mise)}** {CURRENCY_EMOJI}"
-        action = "rps_lose"
-
-    new_bal = add_balance(u.id, delta, action=action)
-    _, _, _, bonus = add_xp(u.id, random.randint(5, 12))
-    if bonus > 0:
-        new_bal = int(get_user(u.id)["balance"])
-
-    e = base_embed("Pierre/Feuille/Ciseaux", user=u)
-    e.add_field(name="Ton choix", value=choix.title(), inline=True)
-    e.add_field(name="Choix bot", value=bot_choice.title(), inline=True)
-    e.add_field(name="Résultat", value=info, inline=False)
-    if bonus > 0:
-        e.add_field(name="Bonus niveau", value=f"+{fmt_int(bonus)} {CURRENCY_EMOJI}", inline=False)
-    e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
+
+    new_bal = await add_balance_if(u.id, delta, mise, action=action, rng=g)
+    if new_bal is None:
+        return await interaction.response.send_message(STALE_BET, ephemeral=True)
+    game_played(u.id, "rps", xp=random.randint(5, 12), channel_id=interaction.channel_id)
+
+    e = RPS_EMBED.render(u, choix.title(), bot_choice.title(), info, fmt_money(int(new_bal)), footer=fair_text(g))
     await interaction.response.send_message(embed=e)
 
 
+RPS_EMBED = EmbedTemplate(
+    "Pierre/Feuille/Ciseaux", ("Ton choix", True), ("Choix bot", True), ("Résultat", False), ("Solde", False)
+)
+
+
+def mines_layout(rng: random.Random) -> List[int]:
+    return rng.sample(range(1, 10), 1)
+
+
 # Commande /mines corrigée
 @bot.tree.command(name="mines", description="Minesweeper 3x3 (1 mine, révèle safes pour cashout x3.5 max)")
 @app_commands.describe(mise="Montant")
+@serialized_per_user
 async def mines(interaction: discord.Interaction, mise: int):
     await interaction.response.defer(ephemeral=False)  # Defer pour éviter timeout (privé pour debug)
 
     u = interaction.user
-    ensure_user(u.id)
+    await ensure_user(u.id)
 
     if mise <= 0:
         await interaction.followup.send("❌ Mise invalide.", ephemeral=True)
         return
-    bal = int(get_user(u.id)["balance"])
+    bal = int((await get_user(u.id))["balance"])
     if mise > bal:
         await interaction.followup.send("❌ T'as pas assez de coins.", ephemeral=True)
         return
 
-    # Risquer la mise au démarrage
-    add_balance(u.id, -mise, action="mines_bet")
+    # Risquer la mise au démarrage ; la grille est fixée par le flux de la partie
+    g = await FAIR_RNG.stream("mines", u.id)
+    if await add_balance_if(u.id, -mise, mise, action="mines_bet", rng=g) is None:
+        await interaction.followup.send(STALE_BET, ephemeral=True)
+        return
 
-    mines_pos = random.sample(range(1, 10), 1)
-    game = MinesGame(bet=mise, mines_pos=mines_pos)
+    mines_pos = mines_layout(g.rng)
+    game = MinesGame(bet=mise, mines_pos=mines_pos, rng=g)
     MINES_SESSIONS[u.id] = game
 
     view = MinesView(user_id=u.id)
@@ -1067,7 +4977,7 @@ async def mines(interaction: discord.Interaction, mise: int):
     e.add_field(name="Mines", value="1", inline=True)
     e.add_field(name="Grille", value=grid, inline=False)
 
-    await interaction.followup.send(embed=e, view=view, ephemeral=False)  # Réponse finale privée
+    await interaction.followup.send(embed=fair_footer(e, g), view=view, ephemeral=False)  # Réponse finale privée
 
 
 # =========================
@@ -1084,95 +4994,108 @@ class BlackjackView(discord.ui.View):
             return False
         return True
 
+    async def on_timeout(self):
+        # main abandonnée : la mise débitée à /bj est perdue, le règlement reste au ledger
+        async with USER_LOCKS.hold(self.user_id):
+            game = BJ_SESSIONS.get(self.user_id)
+            if game and not game.finished:
+                await bj_settle(self.user_id, game, 0, "bj_forfeit")
+
     @discord.ui.button(label="Hit", style=discord.ButtonStyle.primary)
     async def hit(self, interaction: discord.Interaction, button: discord.ui.Button):
-        game = BJ_SESSIONS.get(self.user_id)
-        if not game or game.finished:
-            return await interaction.response.send_message("Partie terminée.", ephemeral=True)
-
-        game.player.append(bj_card())
-        p = bj_score(game.player)
-
-        if p > 21:
-            game.finished = True
-            BJ_SESSIONS.pop(self.user_id, None)
+        async with USER_LOCKS.hold(self.user_id):
+            game = BJ_SESSIONS.get(self.user_id)
+            if not game or game.finished:
+                return await interaction.response.send_message("Partie terminée.", ephemeral=True)
+
+            game.player.append(bj_card(game.rng.rng))
+            p = bj_score(game.player)
+
+            if p > 21:
+                new_bal = await bj_settle(self.user_id, game, 0, "bj_bust")
+                game_played(self.user_id, "bj", xp=random.randint(8, 20), draws=0, channel_id=interaction.channel_id)
+
+                e = fair_footer(base_embed("BlackJack", user=interaction.user), game.rng)
+                e.add_field(name="Ton jeu", value=f"`{bj_pretty(game.player)}` (**{p}**)", inline=False)
+                e.add_field(name="Résultat", value=f"💥 Bust ! Perdu **-{fmt_int(game.bet)}** {CURRENCY_EMOJI}", inline=False)
+                e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
+                self.stop()
+                return await interaction.response.edit_message(embed=e, view=None)
 
-            e = base_embed("BlackJack", user=interaction.user)
+            e = fair_footer(base_embed("BlackJack", user=interaction.user), game.rng)
             e.add_field(name="Ton jeu", value=f"`{bj_pretty(game.player)}` (**{p}**)", inline=False)
-            e.add_field(name="Résultat", value=f"💥 Bust ! Perdu **-{fmt_int(game.bet)}** {CURRENCY_EMOJI}", inline=False)
-            e.add_field(name="Solde", value=fmt_money(int(get_user(self.user_id)["balance"])), inline=False)
-            self.stop()
-            return await interaction.response.edit_message(embed=e, view=None)
-
-        e = base_embed("BlackJack", user=interaction.user)
-        e.add_field(name="Ton jeu", value=f"`{bj_pretty(game.player)}` (**{p}**)", inline=False)
-        e.add_field(name="Dealer", value=f"`{('A' if game.dealer[0]==11 else game.dealer[0])} ?`", inline=False)
-        await interaction.response.edit_message(embed=e, view=self)
+            e.add_field(name="Dealer", value=f"`{('A' if game.dealer[0]==11 else game.dealer[0])} ?`", inline=False)
+            await interaction.response.edit_message(embed=e, view=self)
 
     @discord.ui.button(label="Stand", style=discord.ButtonStyle.success)
     async def stand(self, interaction: discord.Interaction, button: discord.ui.Button):
-        game = BJ_SESSIONS.get(self.user_id)
-        if not game or game.finished:
-            return await interaction.response.send_message("Partie terminée.", ephemeral=True)
-
-        while bj_score(game.dealer) < 17:
-            game.dealer.append(bj_card())
-
-        p = bj_score(game.player)
-        d = bj_score(game.dealer)
-
-        if d > 21 or p > d:
-            delta = +game.bet
-            action = "blackjack_win"
-            result = f"✅ Vous avez gagné **+{fmt_int(game.bet)}** {CURRENCY_EMOJI}"
-        elif p == d:
-            delta = 0
-            action = "blackjack_push"
-            result = "🤝 Égalité ! Vous récupérez votre mise."
-        else:
-            delta = -game.bet
-            action = "blackjack_lose"
-            result = f"❌ Vous avez perdu **-{fmt_int(game.bet)}** {CURRENCY_EMOJI}"
-
-        game.finished = True
-        BJ_SESSIONS.pop(self.user_id, None)
-        new_bal = add_balance(self.user_id, delta, action=action)
-        _, _, _, bonus = add_xp(self.user_id, random.randint(8, 20))
-        if bonus > 0:
-            new_bal = int(get_user(self.user_id)["balance"])
+        async with USER_LOCKS.hold(self.user_id):
+            game = BJ_SESSIONS.get(self.user_id)
+            if not game or game.finished:
+                return await interaction.response.send_message("Partie terminée.", ephemeral=True)
+
+            while bj_score(game.dealer) < 17:
+                game.dealer.append(bj_card(game.rng.rng))
+
+            p = bj_score(game.player)
+            d = bj_score(game.dealer)
+
+            # mise déjà débitée à /bj : on rend 2x (gagné), 1x (égalité) ou rien
+            if d > 21 or p > d:
+                payout = 2 * game.bet
+                action = "bj_win"
+                result = f"✅ Vous avez gagné **+{fmt_int(game.bet)}** {CURRENCY_EMOJI}"
+            elif p == d:
+                payout = game.bet
+                action = "bj_push"
+                result = "🤝 Égalité ! Vous récupérez votre mise."
+            else:
+                payout = 0
+                action = "bj_lose"
+                result = f"❌ Vous avez perdu **-{fmt_int(game.bet)}** {CURRENCY_EMOJI}"
 
-        e = base_embed("BlackJack", user=interaction.user)
-        e.add_field(name="Toi", value=f"`{bj_pretty(game.player)}` (**{p}**)", inline=False)
-        e.add_field(name="Dealer", value=f"`{bj_pretty(game.dealer)}` (**{d}**)", inline=False)
-        e.add_field(name="Résultat", value=result, inline=False)
-        if bonus > 0:
-            e.add_field(name="Bonus niveau", value=f"+{fmt_int(bonus)} {CURRENCY_EMOJI}", inline=False)
-        e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
+            new_bal = await bj_settle(self.user_id, game, payout, action)
+            game_played(self.user_id, "bj", xp=random.randint(8, 20), draws=0, channel_id=interaction.channel_id)
 
-        self.stop()
-        await interaction.response.edit_message(embed=e, view=None)
+            e = fair_footer(base_embed("BlackJack", user=interaction.user), game.rng)
+            e.add_field(name="Toi", value=f"`{bj_pretty(game.player)}` (**{p}**)", inline=False)
+            e.add_field(name="Dealer", value=f"`{bj_pretty(game.dealer)}` (**{d}**)", inline=False)
+            e.add_field(name="Résultat", value=result, inline=False)
+            e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
+
+            self.stop()
+            await interaction.response.edit_message(embed=e, view=None)
 
 
 @bot.tree.command(name="bj", description="Lance une partie de blackjack (boutons Hit/Stand)")
 @app_commands.describe(mise="Montant")
+@serialized_per_user
 async def bj(interaction: discord.Interaction, mise: int):
     u = interaction.user
-    ensure_user(u.id)
+    await ensure_user(u.id)
 
     if mise <= 0:
         return await interaction.response.send_message("❌ Mise invalide.", ephemeral=True)
-    bal = int(get_user(u.id)["balance"])
+    bal = int((await get_user(u.id))["balance"])
     if mise > bal:
         return await interaction.response.send_message("❌ T'as pas assez de coins.", ephemeral=True)
 
-    player = [bj_card(), bj_card()]
-    dealer = [bj_card(), bj_card()]
-    BJ_SESSIONS[u.id] = BJGame(bet=mise, player=player, dealer=dealer)
+    current = BJ_SESSIONS.get(u.id)
+    if current is not None and not current.finished:
+        return await interaction.response.send_message("❌ Tu as déjà une main en cours.", ephemeral=True)
 
-    add_draws(u.id, 1)
+    # mise débitée au démarrage (comme /mines) : abandonner la main ne la rend pas
+    g = await FAIR_RNG.stream("bj", u.id)
+    if await add_balance_if(u.id, -mise, mise, action="bj_bet", rng=g) is None:
+        return await interaction.response.send_message(STALE_BET, ephemeral=True)
+    player = [bj_card(g.rng), bj_card(g.rng)]
+    dealer = [bj_card(g.rng), bj_card(g.rng)]
+    game = BJ_SESSIONS[u.id] = BJGame(bet=mise, player=player, dealer=dealer, rng=g)
+
+    game_played(u.id, "bj", channel_id=interaction.channel_id)
 
     p = bj_score(player)
-    e = base_embed("BlackJack", user=u)
+    e = fair_footer(base_embed("BlackJack", user=u), g)
     e.add_field(name="Mise", value=f"{fmt_int(mise)} {CURRENCY_EMOJI}", inline=True)
     e.add_field(name="Ton jeu", value=f"`{bj_pretty(player)}` (**{p}**)", inline=False)
     e.add_field(name="Dealer", value=f"`{('A' if dealer[0]==11 else dealer[0])} ?`", inline=False)
@@ -1180,13 +5103,13 @@ async def bj(interaction: discord.Interaction, mise: int):
     if p == 21:
         d = bj_score(dealer)
         if d == 21:
-            BJ_SESSIONS.pop(u.id, None)
+            new_bal = await bj_settle(u.id, game, mise, "bj_push")
             e.add_field(name="Résultat", value="🤝 Égalité (double blackjack).", inline=False)
+            e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
             return await interaction.response.send_message(embed=e)
         else:
             net = (mise * 3) // 2
-            BJ_SESSIONS.pop(u.id, None)
-            new_bal = add_balance(u.id, net, action="blackjack_blackjack")
+            new_bal = await bj_settle(u.id, game, mise + net, "bj_blackjack")
             e.add_field(name="Résultat", value=f"🎉 Blackjack ! **+{fmt_int(net)}** {CURRENCY_EMOJI}", inline=False)
             e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
             return await interaction.response.send_message(embed=e)
@@ -1195,17 +5118,24 @@ async def bj(interaction: discord.Interaction, mise: int):
     await interaction.response.send_message(embed=e, view=view)
 
 
+def nombre_round(mise: int, picked: int, rng: random.Random) -> Tuple[int, int]:
+    """returns: (numéro tiré, gain net) ; x4 si trouvé"""
+    bot_num = rng.randint(1, 10)
+    return bot_num, (3 * mise if picked == bot_num else -mise)
+
+
 # Nouvelles commandes casino
 @bot.tree.command(name="nombre", description="Devine un nombre entre 1 et 10 (x4 si win)")
 @app_commands.describe(mise="Montant à miser", choix="Ton choix (1-10)")
+@serialized_per_user
 async def nombre(interaction: discord.Interaction, mise: int, choix: str):
     u = interaction.user
-    ensure_user(u.id)
+    await ensure_user(u.id)
 
     if mise <= 0:
         return await interaction.response.send_message("❌ Mise invalide.", ephemeral=True)
 
-    bal = int(get_user(u.id)["balance"])
+    bal = int((await get_user(u.id))["balance"])
     if mise > bal:
         return await interaction.response.send_message("❌ T'as pas assez de coins.", ephemeral=True)
 
@@ -1216,80 +5146,102 @@ async def nombre(interaction: discord.Interaction, mise: int, choix: str):
     if not (1 <= picked <= 10):
         return await interaction.response.send_message("❌ Numéro invalide (1-10).", ephemeral=True)
 
-    bot_num = random.randint(1, 10)
-    add_draws(u.id, 1)
-
-    delta = -mise
-    info = ""
-
-    if picked == bot_num:
-        win_amount = 3 * mise
-        delta = win_amount
-        info = f"🎉 JACKPOT ! Gagné **{fmt_int(win_amount)}** {CURRENCY_EMOJI} (x4)"
+    g = await FAIR_RNG.stream("nombre", u.id)
+    bot_num, delta = nombre_round(mise, picked, g.rng)
+    if delta > 0:
+        info = f"🎉 JACKPOT ! Gagné **{fmt_int(delta)}** {CURRENCY_EMOJI} (x4)"
     else:
         info = f"Perdu. **-{fmt_int(mise)}** {CURRENCY_EMOJI}"
 
-    new_bal = add_balance(u.id, delta, action="nombre")
-    _, _, _, bonus = add_xp(u.id, random.randint(5, 15))
-    if bonus > 0:
-        new_bal = int(get_user(u.id)["balance"])
-
-    e = base_embed("Devine le nombre", user=u)
-    e.add_field(name="Ton choix", value=str(picked), inline=True)
-    e.add_field(name="Numéro gagnant", value=str(bot_num), inline=True)
-    e.add_field(name="Résultat", value=info, inline=False)
-    if bonus > 0:
-        e.add_field(name="Bonus niveau", value=f"+{fmt_int(bonus)} {CURRENCY_EMOJI}", inline=False)
-    e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
+    new_bal = await add_balance_if(u.id, delta, mise, action="nombre", rng=g)
+    if new_bal is None:
+        return await interaction.response.send_message(STALE_BET, ephemeral=True)
+    game_played(u.id, "nombre", xp=random.randint(5, 15), channel_id=interaction.channel_id)
+
+    e = NOMBRE_EMBED.render(u, str(picked), str(bot_num), info, fmt_money(int(new_bal)), footer=fair_text(g))
     await interaction.response.send_message(embed=e)
 
 
+NOMBRE_EMBED = EmbedTemplate(
+    "Devine le nombre", ("Ton choix", True), ("Numéro gagnant", True), ("Résultat", False), ("Solde", False)
+)
+
+
+def cf_round(mise: int, streak: int, rng: random.Random) -> Tuple[bool, int, int]:
+    """returns: (gagné, gain net, chance en %)"""
+    chance_pct = max(1, 50 - streak)
+    win = rng.random() < chance_pct / 100.0
+    return win, (int(0.5 * mise) if win else -mise), chance_pct
+
+
 @bot.tree.command(name="cf", description="Coin flip avec twist (50% →49% après win, reset sur loss, x1.5)")
-@app_commands.describe(mise="Montant à miser")
-async def cf(interaction: discord.Interaction, mise: int):
+@app_commands.describe(
+    mise="Montant à miser",
+    tours=f"Autoplay : nombre de lancers (max {AUTOPLAY_MAX_ROUNDS})",
+    stop_perte="Autoplay : arrêt si la perte de la session atteint ce montant (0 = aucun)",
+    objectif="Autoplay : arrêt si le gain de la session atteint ce montant (0 = aucun)",
+)
+@serialized_per_user
+async def cf(interaction: discord.Interaction, mise: int, tours: int = 1, stop_perte: int = 0, objectif: int = 0):
     u = interaction.user
-    ensure_user(u.id)
+    await ensure_user(u.id)
 
     if mise <= 0:
         return await interaction.response.send_message("❌ Mise invalide.", ephemeral=True)
+    err = autoplay_error(tours, stop_perte, objectif)
+    if err:
+        return await interaction.response.send_message(err, ephemeral=True)
 
-    bal = int(get_user(u.id)["balance"])
+    bal = int((await get_user(u.id))["balance"])
     if mise > bal:
         return await interaction.response.send_message("❌ T'as pas assez de coins.", ephemeral=True)
 
-    streak = get_cf_streak(u.id)
-    chance_pct = max(1, 50 - streak)
-    chance = chance_pct / 100.0
-    win = random.random() < chance
-    add_draws(u.id, 1)
-
+    streak = await get_cf_streak(u.id)
+    g = await FAIR_RNG.stream("cf", u.id)
+
+    if tours > 1:
+        state = [streak]
+
+        def play_round():
+            win, net, chance_pct = cf_round(mise, state[0], g.rng)
+            state[0] = state[0] + 1 if win else 0
+            return net, f"{'✅' if win else '❌'} {chance_pct}%"
+
+        res = autoplay(tours, bal, mise, play_round, stop_perte, objectif, xp_range=(3, 10))
+        g.rounds = res.rounds
+        new_bal = await add_balance_if(u.id, res.net, res.required, action="cf_autoplay", rng=g)
+        if new_bal is None:
+            return await interaction.response.send_message(STALE_BET, ephemeral=True)
+        await set_cf_streak(u.id, state[0])
+        game_played(u.id, "cf", xp=res.xp, draws=res.rounds, channel_id=interaction.channel_id)
+        e = autoplay_embed("Coin Flip - autoplay", u, res, tours, new_bal)
+        e.add_field(name="Prochaine chance", value=f"{max(1, 50 - state[0])}%", inline=True)
+        return await interaction.response.send_message(embed=fair_footer(e, g))
+
+    win, delta, chance_pct = cf_round(mise, streak, g.rng)
+    new_bal = await add_balance_if(u.id, delta, mise, action="cf", rng=g)
+    if new_bal is None:
+        return await interaction.response.send_message(STALE_BET, ephemeral=True)
     if win:
-        win_net = int(0.5 * mise)
-        delta = win_net
-        set_cf_streak(u.id, streak + 1)
-        info = f"✅ Gagné **+{fmt_int(win_net)}** {CURRENCY_EMOJI} (x1.5)"
+        await set_cf_streak(u.id, streak + 1)
+        info = f"✅ Gagné **+{fmt_int(delta)}** {CURRENCY_EMOJI} (x1.5)"
         next_chance = max(1, 50 - (streak + 1))
     else:
-        delta = -mise
-        set_cf_streak(u.id, 0)
+        await set_cf_streak(u.id, 0)
         info = f"❌ Perdu **-{fmt_int(mise)}** {CURRENCY_EMOJI}"
         next_chance = 50
 
-    new_bal = add_balance(u.id, delta, action="cf")
-    _, _, _, bonus = add_xp(u.id, random.randint(3, 10))
-    if bonus > 0:
-        new_bal = int(get_user(u.id)["balance"])
-
-    e = base_embed("Coin Flip", user=u)
-    e.add_field(name="Chance utilisée", value=f"{chance_pct}%", inline=True)
-    e.add_field(name="Prochaine chance", value=f"{next_chance}%", inline=True)
-    e.add_field(name="Résultat", value=info, inline=False)
-    if bonus > 0:
-        e.add_field(name="Bonus niveau", value=f"+{fmt_int(bonus)} {CURRENCY_EMOJI}", inline=False)
-    e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
+    game_played(u.id, "cf", xp=random.randint(3, 10), channel_id=interaction.channel_id)
+
+    e = CF_EMBED.render(u, f"{chance_pct}%", f"{next_chance}%", info, fmt_money(int(new_bal)), footer=fair_text(g))
     await interaction.response.send_message(embed=e)
 
 
+CF_EMBED = EmbedTemplate(
+    "Coin Flip", ("Chance utilisée", True), ("Prochaine chance", True), ("Résultat", False), ("Solde", False)
+)
+
+
 # =========================
 # PROFILE IMAGE (PILLOW) - AMÉLIORÉ
 # =========================
@@ -1383,7 +5335,7 @@ def render_profile_card(
         draw.text((405, 258), f"BANK : {fmt_int(clan_bank)} {CURRENCY_NAME}", font=f_small, fill=text_secondary)
 
     rounded_rect(draw, (385, 295, W - 45, 320), 12, xp_bar_bg)
-    need = 200 + (lvl - 1) * 150
+    need = need_for_level(lvl)
     ratio = max(0.0, min(1.0, xp / max(1, need)))
     bar_w = int((W - 45 - 385 - 4) * ratio)
     rounded_rect(draw, (385 + 2, 297, W - 43, 318), 10, (255, 255, 255, 100))
@@ -1399,7 +5351,7 @@ def render_profile_card(
 @bot.tree.command(name="profil", description="Affiche ton profil (image)")
 async def profil(interaction: discord.Interaction, membre: Optional[discord.Member] = None):
     membre = membre or interaction.user
-    urow = get_user(membre.id)
+    urow = await get_user(membre.id)
 
     clan = clan_name_for_user(membre.id)
     role = user_clan_role(membre.id) or "-"
@@ -1429,14 +5381,11 @@ async def clan_create(interaction: discord.Interaction, nom: str):
     if user_clan_id(u.id):
         return await interaction.response.send_message("❌ Tu es déjà dans un clan.", ephemeral=True)
 
-    with db_connect() as conn:
-        try:
-            cur = conn.execute("INSERT INTO clans(name, owner_id, bank) VALUES(?,?,0)", (nom, u.id))
-            clan_id = cur.lastrowid
-            conn.execute("INSERT INTO clan_members(clan_id, user_id, role) VALUES(?,?,?)", (clan_id, u.id, "owner"))
-            conn.commit()
-        except sqlite3.IntegrityError:
-            return await interaction.response.send_message("❌ Ce nom de clan est déjà pris.", ephemeral=True)
+    clan_id = await STORE.run("clan_create", nom, u.id)
+    if clan_id is None:
+        return await interaction.response.send_message("❌ Ce nom de clan est déjà pris.", ephemeral=True)
+    CLANS.add_clan(clan_id, nom, u.id)
+    CLANS.join(u.id, clan_id, "owner")
 
     e = base_embed("Clan créé", user=u)
     e.add_field(name="Nom", value=nom, inline=False)
@@ -1454,44 +5403,125 @@ async def clan_invite(interaction: discord.Interaction, membre: discord.Member):
     if user_clan_id(membre.id):
         return await interaction.response.send_message("❌ Cette personne est déjà dans un clan.", ephemeral=True)
 
-    with db_connect() as conn:
-        conn.execute("""
-            INSERT INTO clan_invites(clan_id, user_id, invited_by)
-            VALUES(?,?,?)
-            ON CONFLICT(clan_id, user_id) DO UPDATE SET invited_by=excluded.invited_by, created_at=strftime('%s','now')
-        """, (cid, membre.id, u.id))
-        conn.commit()
+    await STORE.run("clan_invite", cid, membre.id, u.id)
 
-    cname = clan_info_by_id(cid)[0]["name"]
+    cname = clan_info_by_id(cid)[0].name
     e = base_embed("Invitation envoyée", user=u)
     e.add_field(name="Clan", value=cname, inline=False)
     e.add_field(name="Pour rejoindre", value=f"{membre.mention} doit faire **/clan accept**", inline=False)
     await interaction.response.send_message(embed=e)
 
 
+async def accept_clan_invite(interaction: discord.Interaction, cid: int, edit: bool = False):
+    u = interaction.user
+    reply = interaction.response.edit_message if edit else interaction.response.send_message
+
+    async with USER_LOCKS.hold(u.id):
+        if user_clan_id(u.id):
+            if edit:
+                return await reply(content="❌ Tu es déjà dans un clan.", embed=None, view=None)
+            return await reply("❌ Tu es déjà dans un clan.", ephemeral=True)
+        if CLANS.clan(cid) is None or all(int(r["clan_id"]) != cid for r in await clan_invites_for(u.id)):
+            if edit:
+                return await reply(content="❌ Invitation expirée ou clan supprimé.", embed=None, view=None)
+            return await reply("❌ Invitation expirée ou clan supprimé.", ephemeral=True)
+
+        await STORE.run("clan_accept", cid, u.id)
+        CLANS.join(u.id, cid, "member")
+
+    e = base_embed("Clan rejoint", user=u)
+    e.add_field(name="Clan", value=CLANS.clan(cid).name, inline=False)
+    if edit:
+        return await reply(embed=e, view=None)
+    await reply(embed=e)
+
+
+async def clan_invite_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    choices = []
+    for r in await clan_invites_for(interaction.user.id):
+        clan = CLANS.clan(int(r["clan_id"]))
+        if clan and current.lower() in clan.name.lower():
+            choices.append(app_commands.Choice(name=clan.name, value=clan.name))
+    return choices[:25]
+
+
 @clan_group.command(name="accept", description="Accepter une invitation de clan")
-async def clan_accept(interaction: discord.Interaction):
+@app_commands.describe(clan="Clan à rejoindre (par défaut : la dernière invitation)")
+@app_commands.autocomplete(clan=clan_invite_autocomplete)
+async def clan_accept(interaction: discord.Interaction, clan: Optional[str] = None):
     u = interaction.user
     if user_clan_id(u.id):
         return await interaction.response.send_message("❌ Tu es déjà dans un clan.", ephemeral=True)
 
-    with db_connect() as conn:
-        inv = conn.execute(
-            "SELECT clan_id FROM clan_invites WHERE user_id=? ORDER BY created_at DESC LIMIT 1",
-            (u.id,),
-        ).fetchone()
-        if not inv:
-            return await interaction.response.send_message("❌ Tu n’as aucune invitation.", ephemeral=True)
-
-        cid = int(inv["clan_id"])
-        conn.execute("DELETE FROM clan_invites WHERE user_id=?", (u.id,))
-        conn.execute("INSERT INTO clan_members(clan_id, user_id, role) VALUES(?,?,?)", (cid, u.id, "member"))
-        conn.commit()
+    invites = await clan_invites_for(u.id)
+    if not invites:
+        return await interaction.response.send_message("❌ Tu n’as aucune invitation.", ephemeral=True)
 
-    cname = clan_info_by_id(cid)[0]["name"]
-    e = base_embed("Clan rejoint", user=u)
-    e.add_field(name="Clan", value=cname, inline=False)
-    await interaction.response.send_message(embed=e)
+    if clan is None:
+        cid = int(invites[0]["clan_id"])
+    else:
+        wanted = clan.strip().lower()
+        cid = None
+        for r in invites:
+            entry = CLANS.clan(int(r["clan_id"]))
+            if entry and entry.name.lower() == wanted:
+                cid = entry.id
+                break
+        if cid is None:
+            return await interaction.response.send_message("❌ Aucune invitation de ce clan.", ephemeral=True)
+
+    await accept_clan_invite(interaction, cid)
+
+
+class ClanInvitesView(discord.ui.View):
+    def __init__(self, user_id: int, invites: List[sqlite3.Row], timeout: int = 120):
+        super().__init__(timeout=timeout)
+        self.user_id = user_id
+        options = []
+        for r in invites:
+            clan = CLANS.clan(int(r["clan_id"]))
+            if clan is None:
+                continue
+            options.append(discord.SelectOption(
+                label=clan.name,
+                value=str(clan.id),
+                description=f"{clan.members} membre(s) • banque {fmt_int(clan.bank)}",
+            ))
+        self.pick.options = options[:25]
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("❌ Ces invitations ne sont pas les tiennes.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.select(placeholder="Choisis un clan à rejoindre")
+    async def pick(self, interaction: discord.Interaction, select: discord.ui.Select):
+        self.stop()
+        await accept_clan_invite(interaction, int(select.values[0]), edit=True)
+
+
+@clan_group.command(name="invites", description="Voir tes invitations de clan en attente")
+async def clan_invites(interaction: discord.Interaction):
+    u = interaction.user
+    invites = [r for r in await clan_invites_for(u.id) if CLANS.clan(int(r["clan_id"]))]
+    if not invites:
+        return await interaction.response.send_message("📭 Aucune invitation en attente.", ephemeral=True)
+
+    lines = []
+    for r in invites:
+        clan = CLANS.clan(int(r["clan_id"]))
+        created = int(r["created_at"]) or now_ts()
+        lines.append(f"**{clan.name}** — invité par <@{int(r['invited_by'])}> • expire <t:{created + CLAN_INVITE_TTL}:R>")
+
+    e = base_embed("Invitations de clan", "\n".join(lines), user=u)
+    if user_clan_id(u.id):
+        e.add_field(name="Info", value="Tu es déjà dans un clan : quitte-le pour en rejoindre un autre.", inline=False)
+        return await interaction.response.send_message(embed=e, ephemeral=True)
+    await interaction.response.send_message(embed=e, view=ClanInvitesView(u.id, invites), ephemeral=True)
+
+
+CLAN_LEFT_EMBED = StaticEmbed(base_embed("Clan", "✅ Tu as quitté ton clan."))
 
 
 @clan_group.command(name="leave", description="Quitter ton clan (owner ne peut pas)")
@@ -1504,11 +5534,10 @@ async def clan_leave(interaction: discord.Interaction):
     if is_clan_owner(cid, u.id):
         return await interaction.response.send_message("❌ Le owner ne peut pas quitter. Utilise /clan transfer ou /clan delete.", ephemeral=True)
 
-    with db_connect() as conn:
-        conn.execute("DELETE FROM clan_members WHERE clan_id=? AND user_id=?", (cid, u.id))
-        conn.commit()
+    await STORE.run("clan_leave", cid, u.id)
+    CLANS.leave(u.id)
 
-    await interaction.response.send_message(embed=base_embed("Clan", "✅ Tu as quitté ton clan.", user=u))
+    await interaction.response.send_message(embed=CLAN_LEFT_EMBED.get(u))
 
 
 @clan_group.command(name="info", description="Infos sur ton clan")
@@ -1519,11 +5548,11 @@ async def clan_info(interaction: discord.Interaction):
         return await interaction.response.send_message("❌ Tu n’es dans aucun clan.", ephemeral=True)
 
     clan, count, mods = clan_info_by_id(cid)
-    bank = int(clan["bank"])
+    bank = clan.bank
     role = user_clan_role(u.id)
 
     e = base_embed("Clan", user=u)
-    e.add_field(name="Nom", value=clan["name"], inline=False)
+    e.add_field(name="Nom", value=clan.name, inline=False)
     e.add_field(name="Banque", value=f"{fmt_int(bank)} {CURRENCY_NAME} {CURRENCY_EMOJI}", inline=False)
     e.add_field(name="Membres", value=str(count), inline=True)
     e.add_field(name="Mods", value=f"{mods}/{CLAN_MAX_MODS}", inline=True)
@@ -1531,25 +5560,112 @@ async def clan_info(interaction: discord.Interaction):
     await interaction.response.send_message(embed=e)
 
 
+CLAN_ROSTER_PAGE_SIZE = 10
+
+
+class ClanMembersView(discord.ui.View):
+    def __init__(self, user_id: int, clan_id: int, role: Optional[str], timeout: int = 120):
+        super().__init__(timeout=timeout)
+        self.user_id = user_id
+        self.clan_id = clan_id
+        self.role = role
+        self.cursors: List[Optional[Tuple[str, int]]] = [None]  # début de chaque page visitée
+        self.rows: List[sqlite3.Row] = []
+        self.has_next = False
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("❌ Lance ta propre commande /clan members.", ephemeral=True)
+            return False
+        return True
+
+    async def load_page(self):
+        rows = await clan_roster_page(self.clan_id, self.role, self.cursors[-1], CLAN_ROSTER_PAGE_SIZE + 1)
+        self.has_next = len(rows) > CLAN_ROSTER_PAGE_SIZE
+        self.rows = rows[:CLAN_ROSTER_PAGE_SIZE]
+        self.prev_page.disabled = len(self.cursors) <= 1
+        self.next_page.disabled = not self.has_next
+
+    def total(self) -> int:
+        clan = CLANS.clan(self.clan_id)
+        if clan is None:
+            return 0
+        if self.role == "owner":
+            return 1
+        if self.role == "mod":
+            return clan.mods
+        if self.role == "member":
+            return clan.members - clan.mods - 1
+        return clan.members
+
+    def render(self) -> discord.Embed:
+        clan = CLANS.clan(self.clan_id)
+        total = self.total()
+        pages = max(1, -(-total // CLAN_ROSTER_PAGE_SIZE))
+        title = f"Membres • {clan.name if clan else '?'}"
+        if self.role:
+            title += f" ({self.role})"
+        badges = {"owner": "👑", "mod": "🛡️", "member": "•"}
+        lines = [f"{badges.get(r['role'], '•')} <@{int(r['user_id'])}> — <t:{int(r['joined_at'])}:d>" for r in self.rows]
+        e = base_embed(title, "\n".join(lines) or "Aucun membre.")
+        e.set_footer(text=f"Page {len(self.cursors)}/{pages} • {total} membre(s) • Coinsbot • Casino")
+        return e
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await self.load_page()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.has_next and self.rows:
+            last = self.rows[-1]
+            self.cursors.append((last["role"], int(last["user_id"])))
+        await self.load_page()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+
+@clan_group.command(name="members", description="Liste des membres de ton clan")
+@app_commands.describe(role="Filtrer par rôle")
+@app_commands.choices(role=[
+    app_commands.Choice(name="owner", value="owner"),
+    app_commands.Choice(name="mod", value="mod"),
+    app_commands.Choice(name="member", value="member"),
+])
+async def clan_members(interaction: discord.Interaction, role: Optional[str] = None):
+    u = interaction.user
+    cid = user_clan_id(u.id)
+    if not cid:
+        return await interaction.response.send_message("❌ Tu n’es dans aucun clan.", ephemeral=True)
+
+    view = ClanMembersView(user_id=u.id, clan_id=cid, role=role)
+    await view.load_page()
+    await interaction.response.send_message(embed=view.render(), view=view)
+
+
 @clan_group.command(name="deposit", description="Déposer des coins dans la banque du clan (tout membre)")
 @app_commands.describe(montant="Montant à déposer")
 async def clan_deposit(interaction: discord.Interaction, montant: int):
     u = interaction.user
-    ensure_user(u.id)
+    await ensure_user(u.id)
     cid = user_clan_id(u.id)
     if not cid:
         return await interaction.response.send_message("❌ Tu n’es dans aucun clan.", ephemeral=True)
     if montant <= 0:
         return await interaction.response.send_message("❌ Montant invalide.", ephemeral=True)
 
-    bal = int(get_user(u.id)["balance"])
-    if montant > bal:
-        return await interaction.response.send_message("❌ T’as pas assez de coins.", ephemeral=True)
+    async with USER_LOCKS.hold(u.id), CLAN_LOCKS.hold(cid):
+        bal = int((await get_user(u.id))["balance"])
+        if montant > bal:
+            return await interaction.response.send_message("❌ T’as pas assez de coins.", ephemeral=True)
 
-    set_balance(u.id, bal - montant)
-    clan_bank_add(cid, montant)
+        if await add_balance_if(u.id, -montant, montant, action="clan_deposit") is None:
+            return await interaction.response.send_message("❌ T’as pas assez de coins.", ephemeral=True)
+        await clan_bank_add(cid, montant, action="deposit")
 
-    bank = clan_bank_get(cid)
+        bank = clan_bank_get(cid)
     e = base_embed("Banque du clan", user=u)
     e.add_field(name="Dépôt", value=f"-{fmt_int(montant)} {CURRENCY_EMOJI} depuis ton solde", inline=False)
     e.add_field(name="Banque clan", value=f"{fmt_int(bank)} {CURRENCY_NAME} {CURRENCY_EMOJI}", inline=False)
@@ -1560,7 +5676,7 @@ async def clan_deposit(interaction: discord.Interaction, montant: int):
 @app_commands.describe(montant="Montant à retirer")
 async def clan_withdraw(interaction: discord.Interaction, montant: int):
     u = interaction.user
-    ensure_user(u.id)
+    await ensure_user(u.id)
     cid = user_clan_id(u.id)
     if not cid:
         return await interaction.response.send_message("❌ Tu n’es dans aucun clan.", ephemeral=True)
@@ -1569,14 +5685,16 @@ async def clan_withdraw(interaction: discord.Interaction, montant: int):
     if montant <= 0:
         return await interaction.response.send_message("❌ Montant invalide.", ephemeral=True)
 
-    bank = clan_bank_get(cid)
-    if montant > bank:
-        return await interaction.response.send_message("❌ La banque du clan n’a pas assez.", ephemeral=True)
+    async with USER_LOCKS.hold(u.id), CLAN_LOCKS.hold(cid):
+        bank = clan_bank_get(cid)
+        if montant > bank:
+            return await interaction.response.send_message("❌ La banque du clan n’a pas assez.", ephemeral=True)
 
-    clan_bank_add(cid, -montant)
-    new_bal = add_balance(u.id, montant, action="clan_withdraw")
+        if await clan_bank_add(cid, -montant, action="withdraw", required=montant) is None:
+            return await interaction.response.send_message("❌ La banque du clan n’a pas assez.", ephemeral=True)
+        new_bal = await add_balance(u.id, montant, action="clan_withdraw")
 
-    bank2 = clan_bank_get(cid)
+        bank2 = clan_bank_get(cid)
     e = base_embed("Banque du clan", user=u)
     e.add_field(name="Retrait", value=f"+{fmt_int(montant)} {CURRENCY_EMOJI} vers ton solde", inline=False)
     e.add_field(name="Solde", value=fmt_money(int(new_bal)), inline=False)
@@ -1599,20 +5717,17 @@ async def clan_setmod(interaction: discord.Interaction, membre: discord.Member):
     if mods >= CLAN_MAX_MODS:
         return await interaction.response.send_message(f"❌ Max {CLAN_MAX_MODS} mods par clan.", ephemeral=True)
 
-    with db_connect() as conn:
-        row = conn.execute("SELECT role FROM clan_members WHERE clan_id=? AND user_id=?", (cid, membre.id)).fetchone()
-        if not row:
-            return await interaction.response.send_message("❌ Cette personne n’est pas dans ton clan.", ephemeral=True)
-        if row["role"] == "owner":
-            return await interaction.response.send_message("❌ Le owner est déjà owner.", ephemeral=True)
-        if row["role"] == "mod":
-            return await interaction.response.send_message("❌ Cette personne est déjà MOD.", ephemeral=True)
-
-        conn.execute("UPDATE clan_members SET role='mod' WHERE clan_id=? AND user_id=?", (cid, membre.id))
-        conn.commit()
+    role = user_clan_role(membre.id)
+    if role == "owner":
+        return await interaction.response.send_message("❌ Le owner est déjà owner.", ephemeral=True)
+    if role == "mod":
+        return await interaction.response.send_message("❌ Cette personne est déjà MOD.", ephemeral=True)
+
+    await STORE.run("clan_set_role", cid, membre.id, "mod")
+    CLANS.set_role(membre.id, "mod")
 
     e = base_embed("Gestion clan", user=u)
-    e.add_field(name="Mod ajouté", value=f"{membre.mention} est maintenant **MOD** de **{clan['name']}**", inline=False)
+    e.add_field(name="Mod ajouté", value=f"{membre.mention} est maintenant **MOD** de **{clan.name}**", inline=False)
     await interaction.response.send_message(embed=e)
 
 
@@ -1627,13 +5742,11 @@ async def clan_unmod(interaction: discord.Interaction, membre: discord.Member):
     if user_clan_id(membre.id) != cid:
         return await interaction.response.send_message("❌ Cette personne n’est pas dans ton clan.", ephemeral=True)
 
-    with db_connect() as conn:
-        row = conn.execute("SELECT role FROM clan_members WHERE clan_id=? AND user_id=?", (cid, membre.id)).fetchone()
-        if not row or row["role"] != "mod":
-            return await interaction.response.send_message("❌ Cette personne n’est pas MOD.", ephemeral=True)
+    if user_clan_role(membre.id) != "mod":
+        return await interaction.response.send_message("❌ Cette personne n’est pas MOD.", ephemeral=True)
 
-        conn.execute("UPDATE clan_members SET role='member' WHERE clan_id=? AND user_id=?", (cid, membre.id))
-        conn.commit()
+    await STORE.run("clan_set_role", cid, membre.id, "member")
+    CLANS.set_role(membre.id, "member")
 
     e = base_embed("Gestion clan", user=u)
     e.add_field(name="Mod retiré", value=f"{membre.mention} est redevenu **member**.", inline=False)
@@ -1653,15 +5766,13 @@ async def clan_transfer(interaction: discord.Interaction, membre: discord.Member
     if membre.id == u.id:
         return await interaction.response.send_message("❌ Tu es déjà owner.", ephemeral=True)
 
-    with db_connect() as conn:
-        clan = conn.execute("SELECT name FROM clans WHERE id=?", (cid,)).fetchone()
-        conn.execute("UPDATE clan_members SET role='member' WHERE clan_id=? AND user_id=?", (cid, u.id))
-        conn.execute("UPDATE clan_members SET role='owner' WHERE clan_id=? AND user_id=?", (cid, membre.id))
-        conn.execute("UPDATE clans SET owner_id=? WHERE id=?", (membre.id, cid))
-        conn.commit()
+    clan = CLANS.clan(cid)
+    await STORE.run("clan_transfer", cid, u.id, membre.id)
+    CLANS.set_role(u.id, "member")
+    CLANS.set_role(membre.id, "owner")
 
     e = base_embed("Gestion clan", user=u)
-    e.add_field(name="Transfert", value=f"✅ {membre.mention} est maintenant **OWNER** de **{clan['name']}**", inline=False)
+    e.add_field(name="Transfert", value=f"✅ {membre.mention} est maintenant **OWNER** de **{clan.name}**", inline=False)
     await interaction.response.send_message(embed=e)
 
 
@@ -1678,11 +5789,9 @@ async def clan_rename(interaction: discord.Interaction, nouveau_nom: str):
     if not (3 <= len(nouveau_nom) <= 20):
         return await interaction.response.send_message("❌ Nom invalide (3-20 caractères).", ephemeral=True)
 
-    with db_connect() as conn:
-        if conn.execute("SELECT 1 FROM clans WHERE name=? AND id != ?", (nouveau_nom, cid)).fetchone():
-            return await interaction.response.send_message("❌ Ce nom est déjà pris.", ephemeral=True)
-        conn.execute("UPDATE clans SET name=? WHERE id=?", (nouveau_nom, cid))
-        conn.commit()
+    if not await STORE.run("clan_rename", cid, nouveau_nom):
+        return await interaction.response.send_message("❌ Ce nom est déjà pris.", ephemeral=True)
+    CLANS.rename(cid, nouveau_nom)
 
     e = base_embed("Gestion clan", user=u)
     e.add_field(name="Renommé", value=f"✅ Ton clan s'appelle maintenant **{nouveau_nom}**.", inline=False)
@@ -1698,21 +5807,1159 @@ async def clan_delete(interaction: discord.Interaction):
     if not is_clan_owner(cid, u.id):
         return await interaction.response.send_message("❌ Seul le owner peut supprimer le clan.", ephemeral=True)
 
-    with db_connect() as conn:
-        clan = conn.execute("SELECT name FROM clans WHERE id=?", (cid,)).fetchone()
-        conn.execute("DELETE FROM clan_invites WHERE clan_id=?", (cid,))
-        conn.execute("DELETE FROM clan_members WHERE clan_id=?", (cid,))
-        conn.execute("DELETE FROM clans WHERE id=?", (cid,))
-        conn.commit()
+    clan = CLANS.clan(cid)
+    await STORE.run("clan_delete", cid)
+    CLANS.remove_clan(cid)
 
     e = base_embed("Gestion clan", user=u)
-    e.add_field(name="Clan supprimé", value=f"🗑️ **{clan['name']}** a été supprimé.", inline=False)
+    e.add_field(name="Clan supprimé", value=f"🗑️ **{clan.name}** a été supprimé.", inline=False)
     await interaction.response.send_message(embed=e)
 
 
 bot.tree.add_command(clan_group)
 
 
+# =========================
+# ADMIN
+# =========================
+admin_group = app_commands.Group(
+    name="admin",
+    description="Commandes d'administration",
+    guild_only=True,
+    default_permissions=discord.Permissions(administrator=True),
+)
+
+
+def is_admin(interaction: discord.Interaction) -> bool:
+    perms = getattr(interaction.user, "guild_permissions", None)
+    return bool(perms and perms.administrator)
+
+
+def find_app_command(qualified_name: str):
+    # "profil" ou "clan info"
+    parts = qualified_name.strip().lstrip("/").split()
+    if not parts:
+        return None
+    cmd = bot.tree.get_command(parts[0])
+    for part in parts[1:]:
+        if not isinstance(cmd, app_commands.Group):
+            return None
+        cmd = cmd.get_command(part)
+    return cmd if isinstance(cmd, app_commands.Command) else None
+
+
+# =========================
+# ADMIN: PROFILING (cProfile à la demande)
+# =========================
+# Le callback de la commande ciblée n'est remplacé que pendant une session :
+# hors session, aucun code de profiling n'est sur le chemin des commandes.
+class _ProfiledCoro:
+    """Pilote une coroutine en n'activant le profiler que pendant ses propres
+    étapes, pour ne pas compter ce que la boucle exécute pendant les await."""
+
+    def __init__(self, coro, prof: cProfile.Profile):
+        self.coro = coro
+        self.prof = prof
+
+    def __await__(self):
+        value, exc = None, None
+        while True:
+            self.prof.enable()
+            try:
+                if exc is not None:
+                    yielded = self.coro.throw(exc)
+                else:
+                    yielded = self.coro.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.prof.disable()
+            try:
+                value, exc = (yield yielded), None
+            except BaseException as e:
+                value, exc = None, e
+
+
+@dataclass
+class ProfileSession:
+    command: app_commands.Command
+    original: object
+    samples: int
+    reserved: int = 0  # échantillons attribués, y compris ceux encore en cours
+    done: int = 0
+    stats: Optional[pstats.Stats] = None
+    started_at: float = 0.0
+    requested_by: Optional[discord.Interaction] = None
+    path: Optional[str] = None
+
+
+PROFILE_SESSION: Optional[ProfileSession] = None
+PROFILE_LAST: Optional[ProfileSession] = None
+
+
+def _profiled(session: ProfileSession):
+    original = session.original
+
+    async def callback(*args, **kwargs):
+        # place réservée avant l'await : des appels concurrents ne dépassent pas `samples`
+        if session.reserved >= session.samples:
+            return await original(*args, **kwargs)
+        session.reserved += 1
+        prof = cProfile.Profile()
+        try:
+            return await _ProfiledCoro(original(*args, **kwargs), prof)
+        finally:
+            session.done += 1
+            try:
+                if session.stats is None:
+                    session.stats = pstats.Stats(prof)
+                else:
+                    session.stats.add(prof)
+            except TypeError:
+                pass  # profil vide (rien d'exécuté sous le profileur) : pstats refuse de le charger
+            if session.done >= session.samples:
+                bot.loop.create_task(profile_finish(session))
+
+    return callback
+
+
+def profile_start(cmd: app_commands.Command, samples: int, requested_by: Optional[discord.Interaction] = None) -> ProfileSession:
+    global PROFILE_SESSION
+    profile_stop()
+    session = ProfileSession(
+        command=cmd,
+        original=cmd._callback,
+        samples=samples,
+        started_at=time.time(),
+        requested_by=requested_by,
+    )
+    cmd._callback = _profiled(session)
+    PROFILE_SESSION = session
+    return session
+
+
+def profile_stop() -> Optional[ProfileSession]:
+    global PROFILE_SESSION
+    session = PROFILE_SESSION
+    if session is None:
+        return None
+    session.command._callback = session.original
+    PROFILE_SESSION = None
+    return session
+
+
+def profile_dump(session: ProfileSession) -> Optional[str]:
+    if session.stats is None:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = session.command.qualified_name.replace(" ", "_")
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(session.started_at))
+    path = os.path.join(PROFILE_DIR, f"{name}-{stamp}.prof")
+    session.stats.dump_stats(path)
+    session.path = path
+    return path
+
+
+def profile_top(stats: pstats.Stats, n: int = PROFILE_TOP_N) -> List[Tuple[str, int, float, float]]:
+    """
+    returns: [(fonction, appels, tottime, cumtime)] trié par cumtime
+    """
+    rows = []
+    for (filename, line, func), (_, nc, tt, ct, _) in stats.stats.items():
+        if filename == "~":
+            label = func
+        else:
+            label = f"{func} ({os.path.basename(filename)}:{line})"
+        rows.append((label, nc, tt, ct))
+    rows.sort(key=lambda r: r[3], reverse=True)
+    return rows[:n]
+
+
+def profile_embed(session: ProfileSession) -> discord.Embed:
+    e = base_embed(f"Profil • /{session.command.qualified_name}")
+    e.add_field(name="Échantillons", value=f"{session.done}/{session.samples}", inline=True)
+    if session.path:
+        e.add_field(name="Fichier", value=f"`{session.path}`", inline=True)
+    if session.stats is None:
+        e.description = "Aucun échantillon capturé."
+        return e
+
+    lines = [
+        f"`{ct * 1000:8.2f} ms` `{tt * 1000:7.2f} ms` ×{nc} {label}"
+        for label, nc, tt, ct in profile_top(session.stats)
+    ]
+    per_call = session.stats.total_tt * 1000 / max(1, session.done)
+    e.description = f"Temps CPU moyen : **{per_call:.2f} ms** / interaction\n(cumul • propre • appels)\n\n" + "\n".join(lines)
+    if len(e.description) > 4000:
+        e.description = e.description[:4000] + "…"
+    return e
+
+
+async def profile_finish(session: ProfileSession):
+    global PROFILE_LAST
+    if PROFILE_SESSION is session:
+        profile_stop()
+    profile_dump(session)
+    PROFILE_LAST = session
+
+    # le webhook d'une interaction reste valable 15 min
+    inter = session.requested_by
+    if inter is not None and time.time() - session.started_at < 14 * 60:
+        try:
+            await inter.followup.send(embed=profile_embed(session), ephemeral=True)
+        except discord.HTTPException:
+            pass
+
+
+@admin_group.command(name="sync", description="Force la synchronisation des slash commands")
+@app_commands.describe(portee="global (toutes les guilds, lent) ou serveur (ce serveur, instantané)")
+@app_commands.choices(portee=[
+    app_commands.Choice(name="global", value="global"),
+    app_commands.Choice(name="serveur", value="serveur"),
+])
+async def admin_sync(interaction: discord.Interaction, portee: str = "global"):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("❌ Réservé aux administrateurs.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
+    guild = interaction.guild if portee == "serveur" else None
+    try:
+        await bot.sync_commands(guild=guild, force=True)
+    except discord.HTTPException as e:
+        return await interaction.followup.send(f"❌ Sync échoué : {e}", ephemeral=True)
+
+    cible = f"serveur {interaction.guild.name}" if guild else "global"
+    await interaction.followup.send(embed=base_embed("Slash commands", f"✅ Sync {cible} effectué."), ephemeral=True)
+
+
+profile_group = app_commands.Group(name="profile", description="Profiling cProfile à la demande", parent=admin_group)
+
+
+@profile_group.command(name="start", description="Profile les N prochaines exécutions d'une commande")
+@app_commands.describe(commande="Nom de la commande (ex: profil, top, clan info)", echantillons="Nombre d'exécutions à profiler")
+async def profile_start_cmd(interaction: discord.Interaction, commande: str, echantillons: int = 5):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("❌ Réservé aux administrateurs.", ephemeral=True)
+
+    cmd = find_app_command(commande)
+    if cmd is None:
+        return await interaction.response.send_message("❌ Commande inconnue.", ephemeral=True)
+    if cmd.parent is profile_group:
+        return await interaction.response.send_message("❌ Impossible de profiler le profiler.", ephemeral=True)
+
+    samples = max(1, min(PROFILE_MAX_SAMPLES, echantillons))
+    profile_start(cmd, samples, requested_by=interaction)
+
+    e = base_embed("Profiling activé", user=interaction.user)
+    e.add_field(name="Commande", value=f"/{cmd.qualified_name}", inline=True)
+    e.add_field(name="Échantillons", value=str(samples), inline=True)
+    e.add_field(name="Rapport", value="Envoyé ici à la fin, ou via `/admin profile report`.", inline=False)
+    await interaction.response.send_message(embed=e, ephemeral=True)
+
+
+@profile_group.command(name="stop", description="Arrête la session de profiling en cours")
+async def profile_stop_cmd(interaction: discord.Interaction):
+    global PROFILE_LAST
+    if not is_admin(interaction):
+        return await interaction.response.send_message("❌ Réservé aux administrateurs.", ephemeral=True)
+
+    session = profile_stop()
+    if session is None:
+        return await interaction.response.send_message("Aucune session en cours.", ephemeral=True)
+
+    profile_dump(session)
+    PROFILE_LAST = session
+    await interaction.response.send_message(embed=profile_embed(session), ephemeral=True)
+
+
+@profile_group.command(name="report", description="Affiche le rapport de la dernière session de profiling")
+async def profile_report_cmd(interaction: discord.Interaction):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("❌ Réservé aux administrateurs.", ephemeral=True)
+
+    session = PROFILE_SESSION or PROFILE_LAST
+    if session is None:
+        return await interaction.response.send_message("Aucun profil disponible.", ephemeral=True)
+    await interaction.response.send_message(embed=profile_embed(session), ephemeral=True)
+
+
+# =========================
+# ADMIN: OPÉRATIONS EN MASSE
+# =========================
+# Fonctions synchrones (utilisables par la CLI) : chaque lot est une transaction
+# courte suivie d'une pause, le bot continue de servir les commandes entre deux lots.
+def _chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def all_user_ids(batch: int = BULK_CHUNK) -> Iterator[int]:
+    last = -1
+    while True:
+        with db_connect() as conn:
+            rows = conn.execute(
+                "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                (last, batch),
+            ).fetchall()
+        if not rows:
+            return
+        for r in rows:
+            yield int(r["user_id"])
+        last = int(rows[-1]["user_id"])
+
+
+def bulk_airdrop(user_ids: Iterable[int], amount: int, action: str = "airdrop") -> int:
+    """
+    returns: nombre de joueurs crédités
+    """
+    if amount <= 0:
+        raise ValueError("un airdrop ne peut que créditer")
+    total = 0
+    now = now_ts()
+    for chunk in _chunked(user_ids, BULK_CHUNK):
+        with db_connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO users(user_id, balance, xp, level, created_at) VALUES(?,?,0,1,?)",
+                [(uid, START_BALANCE, now) for uid in chunk],
+            )
+            conn.executemany("UPDATE users SET balance = balance + ? WHERE user_id=?", [(amount, uid) for uid in chunk])
+            conn.executemany("INSERT INTO logs(user_id, action, delta) VALUES(?,?,?)", [(uid, action, amount) for uid in chunk])
+            conn.commit()
+        total += len(chunk)
+        time.sleep(BULK_PAUSE)
+    return total
+
+
+def season_reset(season: str) -> int:
+    """
+    Archive users (solde, xp, niveau, tirages) dans season_snapshots puis remet
+    tout le monde à zéro, par plages de user_id. Relancer la même saison après
+    une interruption reprend sans perdre l'archive (INSERT OR IGNORE).
+    returns: nombre de joueurs archivés
+    """
+    total = 0
+    last = -1
+    while True:
+        with db_connect() as conn:
+            row = conn.execute(
+                "SELECT MAX(user_id) AS hi, COUNT(*) AS n FROM "
+                "(SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?)",
+                (last, BULK_CHUNK),
+            ).fetchone()
+            if not row["n"]:
+                return total
+            hi = int(row["hi"])
+            span = (last, hi)
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO season_snapshots(season, user_id, balance, xp, level, draws)
+                SELECT ?, user_id, balance, xp, level, draws FROM users WHERE user_id > ? AND user_id <= ?
+                """,
+                (season,) + span,
+            )
+            conn.execute(
+                """
+                INSERT INTO logs(user_id, action, delta)
+                SELECT user_id, 'season_reset', ? - balance FROM users
+                WHERE user_id > ? AND user_id <= ? AND balance != ?
+                """,
+                (START_BALANCE,) + span + (START_BALANCE,),
+            )
+            conn.execute(
+                "UPDATE users SET balance=?, xp=0, level=1, draws=0, cf_streak=0 WHERE user_id > ? AND user_id <= ?",
+                (START_BALANCE,) + span,
+            )
+            conn.commit()
+        total += int(row["n"])
+        last = hi
+        time.sleep(BULK_PAUSE)
+
+
+def iter_balance_csv(fp) -> Iterator[Tuple[int, int]]:
+    # colonnes user_id,balance ; en-tête optionnel ; lignes invalides ignorées
+    for rec in csv.reader(fp):
+        if len(rec) < 2:
+            continue
+        try:
+            yield int(rec[0].strip()), int(rec[1].strip())
+        except ValueError:
+            continue
+
+
+def import_balances(rows: Iterable[Tuple[int, int]], mode: str = "set") -> int:
+    """
+    mode "set" : remplace le solde, "add" : ajoute au solde.
+    Montants négatifs refusés (ValueError) : valider le fichier avant d'appeler.
+    returns: nombre de lignes appliquées
+    """
+    total = 0
+    now = now_ts()
+    for chunk in _chunked(rows, BULK_CHUNK):
+        if any(amt < 0 for _, amt in chunk):
+            raise ValueError("montant négatif dans l'import")
+        with db_connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO users(user_id, balance, xp, level, created_at) VALUES(?,?,0,1,?)",
+                [(uid, START_BALANCE, now) for uid, _ in chunk],
+            )
+            if mode == "add":
+                conn.executemany("INSERT INTO logs(user_id, action, delta) VALUES(?,'import',?)", chunk)
+                conn.executemany("UPDATE users SET balance = balance + ? WHERE user_id=?", [(amt, uid) for uid, amt in chunk])
+            else:
+                conn.executemany(
+                    "INSERT INTO logs(user_id, action, delta) SELECT user_id, 'import', ? - balance FROM users WHERE user_id=?",
+                    [(amt, uid) for uid, amt in chunk],
+                )
+                conn.executemany("UPDATE users SET balance=? WHERE user_id=?", [(amt, uid) for uid, amt in chunk])
+            conn.commit()
+        total += len(chunk)
+        time.sleep(BULK_PAUSE)
+    return total
+
+
+@admin_group.command(name="airdrop", description="Donne des coins à un rôle ou à tous les joueurs")
+@app_commands.describe(montant="Montant par joueur", role="Rôle ciblé (vide = tous les joueurs enregistrés)")
+async def admin_airdrop(interaction: discord.Interaction, montant: int, role: Optional[discord.Role] = None):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("❌ Réservé aux administrateurs.", ephemeral=True)
+    if montant <= 0:
+        return await interaction.response.send_message("❌ Le montant doit être positif.", ephemeral=True)
+
+    if role is not None:
+        ids = [m.id for m in role.members if not m.bot]
+        if not ids:
+            return await interaction.response.send_message(
+                "❌ Aucun membre en cache pour ce rôle (l'intent members est-il activé ?).", ephemeral=True
+            )
+        source: Iterable[int] = ids
+    else:
+        source = all_user_ids()
+
+    await interaction.response.defer(ephemeral=True)
+    t0 = time.perf_counter()
+    n = await asyncio.to_thread(bulk_airdrop, source, montant)
+    TOP_USERS.invalidate()  # écritures hors bus
+    dt = time.perf_counter() - t0
+
+    cible = role.mention if role else "tous les joueurs"
+    e = base_embed("Airdrop", f"✅ **{fmt_int(montant)}** {CURRENCY_EMOJI} versés à **{fmt_int(n)}** joueur(s) ({cible}).")
+    e.add_field(name="Durée", value=f"{dt:.1f}s ({n / max(dt, 1e-6):,.0f} lignes/s)".replace(",", " "), inline=False)
+    await interaction.followup.send(embed=e, ephemeral=True)
+
+
+@admin_group.command(name="season_reset", description="Archive les soldes/niveaux puis remet l'économie à zéro ⚠️")
+@app_commands.describe(saison="Nom de la saison archivée (ex: 2026-S1)", confirmer="Coche pour lancer le reset")
+async def admin_season_reset(interaction: discord.Interaction, saison: str, confirmer: bool = False):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("❌ Réservé aux administrateurs.", ephemeral=True)
+    saison = saison.strip()
+    if not (1 <= len(saison) <= 32):
+        return await interaction.response.send_message("❌ Nom de saison invalide (1-32).", ephemeral=True)
+    if not confirmer:
+        return await interaction.response.send_message(
+            f"⚠️ Tous les soldes seront archivés sous **{saison}** puis remis à {fmt_money(START_BALANCE)}. "
+            "Relance avec `confirmer: True`.",
+            ephemeral=True,
+        )
+
+    await interaction.response.defer(ephemeral=True)
+    t0 = time.perf_counter()
+    n = await asyncio.to_thread(season_reset, saison)
+    TOP_USERS.invalidate()  # écritures hors bus
+    dt = time.perf_counter() - t0
+    e = base_embed("Nouvelle saison", f"✅ **{fmt_int(n)}** joueur(s) archivé(s) sous **{saison}** et remis à zéro.")
+    e.add_field(name="Durée", value=f"{dt:.1f}s", inline=False)
+    await interaction.followup.send(embed=e, ephemeral=True)
+
+
+@admin_group.command(name="import_balances", description="Importe des soldes depuis un CSV (user_id,balance)")
+@app_commands.describe(fichier="CSV user_id,balance", mode="set = remplace le solde, add = ajoute")
+@app_commands.choices(mode=[
+    app_commands.Choice(name="set", value="set"),
+    app_commands.Choice(name="add", value="add"),
+])
+async def admin_import_balances(interaction: discord.Interaction, fichier: discord.Attachment, mode: str = "set"):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("❌ Réservé aux administrateurs.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
+    raw = await fichier.read()
+    t0 = time.perf_counter()
+    fp = io.TextIOWrapper(io.BytesIO(raw), encoding="utf-8-sig", newline="")
+    # validé en entier avant la première écriture : un import refusé ne laisse rien à moitié appliqué
+    rows = list(iter_balance_csv(fp))
+    negatives = sum(1 for _, amt in rows if amt < 0)
+    if negatives:
+        return await interaction.followup.send(
+            f"❌ {fmt_int(negatives)} ligne(s) avec un montant négatif : import annulé.", ephemeral=True
+        )
+    n = await asyncio.to_thread(import_balances, rows, mode)
+    TOP_USERS.invalidate()  # écritures hors bus
+    dt = time.perf_counter() - t0
+    e = base_embed("Import de soldes", f"✅ **{fmt_int(n)}** ligne(s) importée(s) (mode {mode}).")
+    e.add_field(name="Durée", value=f"{dt:.1f}s", inline=False)
+    await interaction.followup.send(embed=e, ephemeral=True)
+
+
+# =========================
+# ADMIN: COIN DROPS / GIVEAWAYS
+# =========================
+# Les clics sont résolus en mémoire : Drop.claim ne fait aucun await, donc sur la
+# boucle asyncio le compteur et l'ensemble anti-doublon ne sont jamais vus à moitié
+# à jour, même avec des centaines de clics dans la même seconde. Rien n'est écrit
+# avant la clôture : les gagnants sont payés en une transaction (soldes + ledger).
+DROP_FIRST, DROP_GIVEAWAY = "premiers", "tirage"
+
+
+class Drop:
+    def __init__(self, drop_id: int, mode: str, amount: int, slots: int, ends_at: int, host_id: int):
+        self.id = drop_id
+        self.mode = mode
+        self.amount = amount
+        self.slots = slots
+        self.ends_at = ends_at
+        self.host_id = host_id
+        self.entrants: set = set()
+        self.order: List[int] = []  # premiers : gagnants dans l'ordre des clics ; tirage : inscrits
+        self.winners: List[int] = []
+        self.full = asyncio.Event()
+        self.closed = False
+        self.paid = False
+        self.dirty = False  # clics pas encore reflétés dans le message
+        self.message: Optional[discord.Message] = None
+        self.clicks = 0
+        self.edits = 0
+
+    def claim(self, user_id: int) -> str:
+        """returns: "won", "entered", "dup", "full" ou "closed" """
+        self.clicks += 1
+        if self.closed:
+            return "closed"
+        if user_id in self.entrants:
+            return "dup"
+        if self.mode == DROP_FIRST and len(self.order) >= self.slots:
+            return "full"
+        self.entrants.add(user_id)
+        self.order.append(user_id)
+        self.dirty = True
+        if self.mode == DROP_FIRST:
+            if len(self.order) >= self.slots:
+                self.full.set()
+            return "won"
+        return "entered"
+
+    def draw(self) -> List[int]:
+        if self.mode == DROP_FIRST:
+            return self.order[:self.slots]
+        return random.sample(self.order, min(self.slots, len(self.order)))
+
+
+DROP_REPLIES = {
+    "won": "🎉 Gagné ! **{amount}** {emoji} te seront versés à la clôture.",
+    "entered": "🎟️ Participation enregistrée, tirage à la fin.",
+    "dup": "⏳ Tu as déjà participé.",
+    "full": "❌ Trop tard, toutes les places sont prises.",
+    "closed": "❌ Ce drop est terminé.",
+}
+
+
+def drop_embed(drop: Drop) -> discord.Embed:
+    prize = f"**{fmt_int(drop.amount)}** {CURRENCY_EMOJI}"
+    if drop.mode == DROP_FIRST:
+        title = "🪙 Coin drop"
+        desc = f"Les **{drop.slots}** premiers à cliquer gagnent {prize} chacun !"
+        count = f"{len(drop.order)}/{drop.slots} réclamé(s)"
+    else:
+        title = "🎁 Giveaway"
+        desc = f"**{drop.slots}** gagnant(s) tiré(s) au sort, {prize} chacun."
+        count = f"{fmt_int(len(drop.order))} participant(s)"
+    e = base_embed(title, desc)
+    if not drop.closed:
+        e.add_field(name="Participation", value=count, inline=True)
+        e.add_field(name="Fin", value=f"<t:{drop.ends_at}:R>", inline=True)
+        return e
+    if drop.winners:
+        shown = " ".join(f"<@{uid}>" for uid in drop.winners[:50])
+        more = len(drop.winners) - 50
+        e.add_field(name="Gagnants", value=shown + (f" … (+{more})" if more > 0 else ""), inline=False)
+        if not drop.paid:
+            e.add_field(name="Paiement", value="⚠️ En échec, un admin doit créditer les gagnants.", inline=False)
+    else:
+        e.add_field(name="Gagnants", value="Personne 😢", inline=False)
+    e.add_field(name="Participation", value=count, inline=False)
+    return e
+
+
+class DropView(discord.ui.View):
+    def __init__(self, drop: Drop):
+        super().__init__(timeout=None)
+        self.drop = drop
+
+    @discord.ui.button(label="Réclamer", emoji="🪙", style=discord.ButtonStyle.success)
+    async def claim(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await drop_click(self.drop, interaction)
+
+
+async def drop_click(drop: Drop, interaction: discord.Interaction):
+    status = drop.claim(interaction.user.id)
+    text = DROP_REPLIES[status].format(amount=fmt_int(drop.amount), emoji=CURRENCY_EMOJI)
+    await interaction.response.send_message(text, ephemeral=True)
+
+
+class DropManager:
+    """Drops en cours : une tâche par drop édite le message au plus une fois par
+    `edit_interval` (seulement s'il y a eu des clics) puis clôture et paie."""
+
+    def __init__(self, edit_interval: float = DROP_EDIT_INTERVAL):
+        self.edit_interval = edit_interval
+        self.active: Dict[int, Drop] = {}
+        self._ids = itertools.count(1)
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def create(self, mode: str, amount: int, slots: int, minutes: float, host_id: int) -> Drop:
+        drop = Drop(next(self._ids), mode, amount, slots, now_ts() + int(minutes * 60), host_id)
+        self.active[drop.id] = drop
+        return drop
+
+    def start(self, drop: Drop, message: discord.Message):
+        drop.message = message
+        self._tasks[drop.id] = asyncio.get_running_loop().create_task(self._run(drop))
+
+    async def _edit(self, drop: Drop, view: Optional[discord.ui.View]):
+        drop.edits += 1
+        try:
+            await drop.message.edit(embed=drop_embed(drop), view=view)
+        except discord.HTTPException:
+            pass
+
+    async def _run(self, drop: Drop):
+        while not drop.full.is_set():
+            left = drop.ends_at - time.time()
+            if left <= 0:
+                break
+            try:
+                await asyncio.wait_for(drop.full.wait(), timeout=min(self.edit_interval, left))
+            except asyncio.TimeoutError:
+                pass
+            if drop.dirty and not drop.full.is_set():
+                drop.dirty = False
+                await self._edit(drop, DropView(drop))
+        await self.settle(drop)
+
+    async def settle(self, drop: Drop):
+        if drop.closed:
+            return
+        drop.closed = True  # les clics suivants répondent "closed" pendant le paiement
+        drop.winners = drop.draw()  # tiré une seule fois : les nouvelles tentatives paient les mêmes
+        if drop.winners:
+            await self._pay(drop)
+        self.active.pop(drop.id, None)
+        self._tasks.pop(drop.id, None)
+        await self._edit(drop, None)
+
+    async def _pay(self, drop: Drop):
+        action = "drop" if drop.mode == DROP_FIRST else "giveaway"
+        deltas = [(uid, drop.amount) for uid in drop.winners]
+        for attempt in range(DROP_PAY_RETRIES + 1):
+            try:
+                await add_balances(deltas, action)
+                drop.paid = True
+                return
+            except Exception as e:
+                print(f"⚠️ Paiement du drop #{drop.id} en échec ({e!r}), essai {attempt + 1}/{DROP_PAY_RETRIES + 1}")
+                if attempt < DROP_PAY_RETRIES:
+                    await asyncio.sleep(DROP_PAY_RETRY_DELAY * 2 ** attempt)
+        print(f"❌ Drop #{drop.id} non payé : {fmt_int(drop.amount)} à chacun de {drop.winners}")
+
+    async def close_all(self):
+        for drop in list(self.active.values()):
+            task = self._tasks.get(drop.id)
+            if drop.closed:
+                if task is not None:
+                    await task  # paiement en cours : on le laisse finir plutôt que de l'interrompre
+                continue
+            if task is not None:
+                task.cancel()
+            if drop.message is not None:
+                await self.settle(drop)
+
+
+DROPS = DropManager()
+
+
+@admin_group.command(name="drop", description="Lance un coin drop (premiers arrivés) ou un giveaway (tirage)")
+@app_commands.describe(
+    montant="Gain par gagnant",
+    gagnants=f"Nombre de gagnants (max {DROP_MAX_WINNERS})",
+    duree=f"Durée en minutes (max {DROP_MAX_DURATION})",
+    mode="premiers = les N premiers clics, tirage = N gagnants au hasard à la fin",
+)
+@app_commands.choices(mode=[
+    app_commands.Choice(name="premiers", value=DROP_FIRST),
+    app_commands.Choice(name="tirage", value=DROP_GIVEAWAY),
+])
+async def admin_drop(interaction: discord.Interaction, montant: int, gagnants: int = 1, duree: int = 10,
+                     mode: str = DROP_FIRST):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("❌ Réservé aux administrateurs.", ephemeral=True)
+    if montant <= 0:
+        return await interaction.response.send_message("❌ Montant invalide.", ephemeral=True)
+    if not (1 <= gagnants <= DROP_MAX_WINNERS):
+        return await interaction.response.send_message(f"❌ Gagnants : 1 à {DROP_MAX_WINNERS}.", ephemeral=True)
+    if not (1 <= duree <= DROP_MAX_DURATION):
+        return await interaction.response.send_message(f"❌ Durée : 1 à {DROP_MAX_DURATION} minutes.", ephemeral=True)
+    if interaction.channel is None:
+        return await interaction.response.send_message("❌ Salon introuvable.", ephemeral=True)
+
+    drop = DROPS.create(mode, montant, gagnants, duree, interaction.user.id)
+    # message du bot (pas la réponse à l'interaction) : éditable au-delà des 15 min du jeton
+    try:
+        message = await interaction.channel.send(embed=drop_embed(drop), view=DropView(drop))
+    except discord.HTTPException:
+        DROPS.active.pop(drop.id, None)
+        return await interaction.response.send_message("❌ Impossible de poster dans ce salon.", ephemeral=True)
+    DROPS.start(drop, message)
+    await interaction.response.send_message(f"✅ Drop #{drop.id} lancé.", ephemeral=True)
+
+
+# =========================
+# ADMIN: EXPORT
+# =========================
+# Chaque table est lue par pages de rowid (une requête courte par page, lue avec
+# fetchmany) et écrite au fil de l'eau : mémoire constante quelle que soit la taille.
+# Pas d'instantané global : chaque page est cohérente, pas l'export entier.
+class _CsvGzSink:
+    ext = "csv.gz"
+
+    def __init__(self, path: str, columns: List[str]):
+        self.f = gzip.open(path, "wt", compresslevel=6, encoding="utf-8", newline="")
+        self.w = csv.writer(self.f)
+        self.w.writerow(columns)
+
+    def write(self, rows: List[tuple]):
+        self.w.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+
+class _JsonlGzSink:
+    ext = "jsonl.gz"
+
+    def __init__(self, path: str, columns: List[str]):
+        self.f = gzip.open(path, "wt", compresslevel=6, encoding="utf-8")
+        self.columns = columns
+
+    def write(self, rows: List[tuple]):
+        cols = self.columns
+        self.f.writelines(json.dumps(dict(zip(cols, r)), ensure_ascii=False) + "\n" for r in rows)
+
+    def close(self):
+        self.f.close()
+
+
+class _ParquetSink:
+    ext = "parquet"
+
+    def __init__(self, path: str, columns: List[str]):
+        import pyarrow.parquet  # optionnel : seulement pour --format parquet
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.columns = columns
+        self.writer = None
+
+    def write(self, rows: List[tuple]):
+        if not rows:
+            return
+        data = {c: [r[i] for r in rows] for i, c in enumerate(self.columns)}
+        if self.writer is None:
+            table = self.pa.Table.from_pydict(data)
+            self.writer = self.pq.ParquetWriter(self.path, table.schema, compression="zstd")
+        else:
+            table = self.pa.Table.from_pydict(data, schema=self.writer.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+EXPORT_FORMATS = {"csv": _CsvGzSink, "jsonl": _JsonlGzSink, "parquet": _ParquetSink}
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@dataclass
+class ExportResult:
+    table: str
+    path: str
+    rows: int
+    seconds: float
+
+
+def _logs_first_id(conn: sqlite3.Connection, ts: int) -> int:
+    # logs.ts suit l'ordre d'insertion : recherche dichotomique sur la clé primaire
+    # au lieu d'un index sur ts (qui coûterait à chaque écriture du ledger)
+    row = conn.execute("SELECT MIN(id) AS lo, MAX(id) AS hi FROM logs").fetchone()
+    if row["lo"] is None:
+        return 0
+    lo, hi = int(row["lo"]), int(row["hi"]) + 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        r = conn.execute("SELECT id, ts FROM logs WHERE id >= ? ORDER BY id LIMIT 1", (mid,)).fetchone()
+        if r is None or int(r["ts"]) >= ts:
+            hi = mid
+        else:
+            lo = int(r["id"]) + 1
+    return lo
+
+
+def export_table(table: str, out_dir: str, fmt: str = "csv",
+                 since: Optional[int] = None, until: Optional[int] = None) -> ExportResult:
+    """
+    since/until (timestamps unix) ne filtrent que logs.
+    returns: ExportResult
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"table inconnue: {table}")
+    sink_cls = EXPORT_FORMATS[fmt]
+    path = os.path.join(out_dir, f"{table}.{sink_cls.ext}")
+    t0 = time.perf_counter()
+
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        columns = [r["name"] for r in conn.execute(f"PRAGMA table_info({table})")]
+        where, params, last = "", [], -1
+        stop_id = None
+        if table == "logs":
+            if since is not None:
+                last = _logs_first_id(conn, since) - 1
+                where += " AND ts >= ?"
+                params.append(since)
+            if until is not None:
+                stop_id = _logs_first_id(conn, until)
+                where += " AND ts < ?"
+                params.append(until)
+        sql = f"SELECT rowid, {', '.join(columns)} FROM {table} WHERE rowid > ?{where}"
+        if stop_id is not None:
+            sql += f" AND rowid < {int(stop_id)}"
+        sql += " ORDER BY rowid LIMIT ?"
+
+        sink = sink_cls(path, columns)
+        total = 0
+        try:
+            while True:
+                cur = conn.execute(sql, [last, *params, EXPORT_PAGE])
+                page = 0
+                while True:
+                    rows = cur.fetchmany(1000)
+                    if not rows:
+                        break
+                    last = rows[-1][0]
+                    sink.write([tuple(r)[1:] for r in rows])
+                    page += len(rows)
+                total += page
+                if page < EXPORT_PAGE:
+                    break
+        finally:
+            sink.close()
+    finally:
+        conn.close()
+    return ExportResult(table, path, total, time.perf_counter() - t0)
+
+
+def export_economy(out_dir: Optional[str] = None, fmt: str = "csv", tables: Iterable[str] = EXPORT_TABLES,
+                   since: Optional[int] = None, until: Optional[int] = None) -> List[ExportResult]:
+    out_dir = out_dir or os.path.join(EXPORT_DIR, time.strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    return [export_table(t, out_dir, fmt, since, until) for t in tables]
+
+
+def fmt_export_line(r: ExportResult) -> str:
+    rate = r.rows / max(r.seconds, 1e-6)
+    return f"{r.table}: {fmt_int(r.rows)} lignes en {r.seconds:.2f}s ({fmt_int(int(rate))} lignes/s)"
+
+
+@admin_group.command(name="export", description="Exporte l'économie (CSV/JSONL compressés) pour l'analytique")
+@app_commands.describe(
+    format="csv, jsonl ou parquet (si pyarrow est installé)",
+    table="Une seule table (vide = toutes)",
+    jours="Ne garder que les logs des N derniers jours",
+)
+@app_commands.choices(
+    format=[app_commands.Choice(name=f, value=f) for f in EXPORT_FORMATS],
+    table=[app_commands.Choice(name=t, value=t) for t in EXPORT_TABLES],
+)
+async def admin_export(interaction: discord.Interaction, format: str = "csv",
+                       table: Optional[str] = None, jours: Optional[int] = None):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("❌ Réservé aux administrateurs.", ephemeral=True)
+    if format == "parquet" and not parquet_available():
+        return await interaction.response.send_message("❌ pyarrow n'est pas installé sur le bot.", ephemeral=True)
+    if jours is not None and jours <= 0:
+        return await interaction.response.send_message("❌ Nombre de jours invalide.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
+    since = now_ts() - jours * 86400 if jours else None
+    tables = (table,) if table else EXPORT_TABLES
+    results = await asyncio.to_thread(export_economy, None, format, tables, since)
+
+    out_dir = os.path.dirname(results[0].path)
+    e = base_embed("Export", "\n".join(fmt_export_line(r) for r in results))
+    e.add_field(name="Dossier", value=f"`{out_dir}`", inline=False)
+
+    # joint les fichiers s'ils passent la limite d'upload du serveur
+    limit = interaction.guild.filesize_limit if interaction.guild else 8 * 1024 * 1024
+    sizes = [os.path.getsize(r.path) for r in results]
+    files = []
+    if sum(sizes) <= limit and len(results) <= 10:
+        files = [discord.File(r.path, filename=os.path.basename(r.path)) for r in results]
+    await interaction.followup.send(embed=e, files=files, ephemeral=True)
+
+
+@admin_group.command(name="backup", description="Lance une sauvegarde à chaud de la base")
+async def admin_backup(interaction: discord.Interaction):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("❌ Réservé aux administrateurs.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
+    try:
+        res = await asyncio.to_thread(backup_db)
+    except Exception as e:
+        return await interaction.followup.send(f"❌ Sauvegarde échouée : `{e}`", ephemeral=True)
+    removed = await asyncio.to_thread(rotate_backups)
+    e = base_embed("Sauvegarde", f"✅ `{res.path}` ({res.size / 1e6:.1f} Mo, intégrité OK)")
+    e.add_field(name="Durée", value=f"{res.seconds:.1f}s ({res.restarts} reprise(s))", inline=True)
+    e.add_field(name="Rotation", value=f"{len(removed)} supprimée(s), {BACKUP_KEEP} conservées max", inline=True)
+    await interaction.followup.send(embed=e, ephemeral=True)
+
+
+@admin_group.command(name="maintenance", description="État de la maintenance SQLite (ou lancement forcé)")
+@app_commands.describe(forcer="Lancer un passage complet maintenant, même en heure de pointe")
+async def admin_maintenance(interaction: discord.Interaction, forcer: bool = False):
+    if not is_admin(interaction):
+        return await interaction.response.send_message("❌ Réservé aux administrateurs.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
+    done = None
+    if forcer:
+        # même verrou que la boucle : jamais deux passages en parallèle, jamais de conversion ici
+        done = await asyncio.to_thread(MAINTENANCE.run, True)
+    st = await asyncio.to_thread(Maintenance.stats)
+
+    rate = COMMAND_RATE.rate(MAINT_QUIET_WINDOW)
+    e = base_embed("Maintenance SQLite")
+    e.add_field(name="Débit", value=f"{rate:.2f} cmd/s ({'creux' if is_quiet_period() else 'actif'})", inline=True)
+    e.add_field(name="WAL", value=f"{st['wal_bytes'] / 1e6:.1f} Mo", inline=True)
+    e.add_field(
+        name="Fichier",
+        value=f"{fmt_int(st['pages'])} pages, {fmt_int(st['freelist'])} libres, auto_vacuum={st['auto_vacuum']}",
+        inline=False,
+    )
+    last = MAINTENANCE.last_report if done is None else done
+    if last:
+        e.add_field(name="Dernier passage", value="\n".join(f"{k}: {v}" for k, v in last.items())[:1024], inline=False)
+    await interaction.followup.send(embed=e, ephemeral=True)
+
+
+bot.tree.add_command(admin_group)
+
+
+# =========================
+# CLUSTER (démon de stockage + process de shards)
+# =========================
+# Le démon possède le fichier SQLite : il exécute les opérations Store une par une
+# (écrivain unique) et fait tourner les jobs SQLite. Après une écriture de clan il
+# publie l'opération aux autres process, qui rejouent la mise à jour sur leur CLANS.
+def apply_clan_event(op: str, args: list, result):
+    if op == "clan_create" and result is not None:
+        name, owner_id = args
+        CLANS.add_clan(result, name, owner_id)
+        CLANS.join(owner_id, result, "owner")
+    elif op == "clan_rename" and result:
+        CLANS.rename(args[0], args[1])
+    elif op == "clan_delete":
+        CLANS.remove_clan(args[0])
+    elif op == "clan_bank_add" and result is not None:
+        CLANS.bank_add(args[0], args[1])
+        EVENTS.publish(ClanBankChanged(args[0], args[1], clan_bank_get(args[0])))
+    elif op == "clan_accept":
+        CLANS.join(args[1], args[0], "member")
+    elif op == "clan_leave":
+        CLANS.leave(args[1])
+    elif op == "clan_set_role":
+        CLANS.set_role(args[1], args[2])
+    elif op == "clan_transfer":
+        CLANS.set_role(args[1], "member")
+        CLANS.set_role(args[2], "owner")
+    elif op == "clan_banks":
+        CLANS.refresh_banks(result)
+
+
+CLAN_EVENT_OPS = frozenset({
+    "clan_create", "clan_rename", "clan_delete", "clan_bank_add",
+    "clan_accept", "clan_leave", "clan_set_role", "clan_transfer",
+})
+
+
+class StoreDaemon:
+    def __init__(self, store: Store, path: str):
+        self.store = store
+        self.path = path
+        self.subscribers: Dict[asyncio.StreamWriter, str] = {}
+        self.requests = 0
+
+    def publish(self, op: str, args: list, result, origin: Optional[str] = None):
+        line = json.dumps({"event": op, "args": args, "result": result}).encode() + b"\n"
+        for writer, client in list(self.subscribers.items()):
+            if client == origin:
+                continue  # l'émetteur a déjà mis son cache à jour
+            if writer.is_closing():
+                self.subscribers.pop(writer, None)
+                continue
+            writer.write(line)
+
+    async def execute(self, op: str, args: list, origin: Optional[str]):
+        if op == "ping":
+            return "pong"
+        if op not in STORE_OPS:
+            raise StoreError(f"opération inconnue : {op}")
+        fn = getattr(self.store, op)
+        # les commandes arrivent ici en opérations : c'est le débit vu par la maintenance du démon
+        COMMAND_RATE.hit()
+        result = await fn(*args) if op in STORE_ASYNC_OPS else fn(*args)
+        result = _jsonable(result)
+        self.requests += 1
+        if op in CLAN_EVENT_OPS:
+            self.publish(op, args, result, origin)
+        return result
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                req = json.loads(line)
+                if req.get("op") == "subscribe":
+                    self.subscribers[writer] = req.get("client", "")
+                    continue
+                try:
+                    reply = {"ok": await self.execute(req["op"], req.get("args", []), req.get("client"))}
+                except Exception as e:
+                    reply = {"error": f"{type(e).__name__}: {e}"}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.subscribers.pop(writer, None)
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        server = await asyncio.start_unix_server(self.handle, path=self.path, limit=STORE_LINE_LIMIT)
+        print(f"🗄️ Démon de stockage sur {self.path} (base {DB_PATH})")
+        async with server:
+            await server.serve_forever()
+
+
+STORE_DAEMON: Optional[StoreDaemon] = None
+
+
+async def follow_store_events(store: RemoteStore):
+    resync = False
+    while True:
+        try:
+            reader, writer = await asyncio.open_unix_connection(store.path, limit=STORE_LINE_LIMIT)
+            writer.write(json.dumps({"op": "subscribe", "client": store.client_id}).encode() + b"\n")
+            await writer.drain()
+            if resync:
+                # événements manqués pendant la coupure : rechargement complet du cache
+                await asyncio.to_thread(CLANS.load)
+            resync = True
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                if msg["event"] == "clan_banks":
+                    # banques relues après un tick d'économie : lecture asynchrone, pas sur la boucle
+                    msg["result"] = await store.run("clan_banks")
+                apply_clan_event(msg["event"], msg["args"], msg["result"])
+        except (OSError, StoreError) as e:
+            print(f"⚠️ Démon de stockage injoignable : {e}")
+        await asyncio.sleep(1)
+
+
+async def run_store_daemon(path: str):
+    global STORE, STORE_DAEMON
+    store = STORE = SqliteStore()
+    store.init()
+    CLANS.load()
+    STORE_DAEMON = StoreDaemon(store, path)
+    for job in (
+        run_backfills(), clan_invite_sweeper(), clan_economy_loop(), season_loop(), backup_loop(), maintenance_loop()
+    ):
+        asyncio.create_task(job)
+    await STORE_DAEMON.serve()
+
+
+def run_cluster(processes: int, shard_count: int, socket_path: str, db: Optional[str] = None):
+    """
+    Lance le démon de stockage puis `processes` process de bot, chacun avec une
+    tranche des `shard_count` shards. Ctrl+C / SIGTERM arrête tout le monde.
+    """
+    base = [sys.executable, os.path.abspath(__file__)] + (["--db", db] if db else [])
+    daemon = subprocess.Popen(base + ["store-daemon", "--socket", socket_path])
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.1)
+
+    children = [daemon]
+    for i in range(processes):
+        ids = [s for s in range(shard_count) if s % processes == i]
+        env = dict(
+            os.environ,
+            COINSBOT_STORE="remote",
+            COINSBOT_STORE_SOCKET=socket_path,
+            COINSBOT_SHARD_COUNT=str(shard_count),
+            COINSBOT_SHARD_IDS=",".join(map(str, ids)),
+        )
+        children.append(subprocess.Popen(base, env=env))
+        print(f"🚀 Process {i} : shards {ids}")
+
+    def stop(*_):
+        for c in children:
+            if c.poll() is None:
+                c.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while all(c.poll() is None for c in children):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop()
+        for c in children:
+            c.wait()
+
+
 # =========================
 # RUN
 # =========================
@@ -1720,4 +6967,236 @@ import os
 
 TOKEN = os.getenv("DISCORD_TOKEN", "MET_TON_TOKEN_ICI")
 
-bot.run(TOKEN)
\ No newline at end of file
+
+# Outils d'admin hors-ligne : python main.py <commande> ... (sans argument : lance le bot)
+def cli_airdrop(args):
+    if args.amount <= 0:
+        raise SystemExit("❌ Le montant doit être positif.")
+    db_init()
+    if args.users_file:
+        with open(args.users_file, "r", encoding="utf-8") as f:
+            ids: Iterable[int] = (int(line) for line in f if line.strip().isdigit())
+            n = bulk_airdrop(ids, args.amount)
+    else:
+        n = bulk_airdrop(all_user_ids(), args.amount)
+    print(f"✅ {n} joueur(s) crédité(s) de {args.amount}")
+
+
+def cli_season_reset(args):
+    db_init()
+    n = season_reset(args.season)
+    print(f"✅ {n} joueur(s) archivé(s) sous {args.season}")
+
+
+def cli_import_balances(args):
+    db_init()
+    t0 = time.perf_counter()
+    with open(args.csv, "r", encoding="utf-8-sig", newline="") as f:
+        # première passe : rien n'est écrit si une ligne est négative
+        negatives = sum(1 for _, amt in iter_balance_csv(f) if amt < 0)
+        if negatives:
+            raise SystemExit(f"❌ {negatives} ligne(s) avec un montant négatif : import annulé.")
+        f.seek(0)
+        n = import_balances(iter_balance_csv(f), args.mode)
+    dt = time.perf_counter() - t0
+    print(f"✅ {n} ligne(s) importée(s) en {dt:.1f}s ({n / max(dt, 1e-6):.0f} lignes/s)")
+
+
+def _cli_ts(value: str) -> int:
+    # timestamp unix ou date ISO (2026-01-31, 2026-01-31T12:00)
+    if value.isdigit():
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"date invalide: {value}")
+
+
+def cli_export(args):
+    if args.format == "parquet" and not parquet_available():
+        raise SystemExit("❌ pyarrow n'est pas installé (pip install pyarrow)")
+    tables = args.tables or EXPORT_TABLES
+    unknown = [t for t in tables if t not in EXPORT_TABLES]
+    if unknown:
+        raise SystemExit(f"❌ table(s) inconnue(s): {', '.join(unknown)}")
+    for r in export_economy(args.out, args.format, tables, args.since, args.until):
+        print(f"✅ {fmt_export_line(r)} -> {r.path}")
+
+
+def cli_backup(args):
+    db_init()
+    res = backup_db(args.out)
+    removed = rotate_backups() if args.out is None else []
+    print(f"✅ {res.path} ({res.size / 1e6:.1f} Mo) en {res.seconds:.1f}s, {res.restarts} reprise(s), {len(removed)} supprimée(s)")
+
+
+def cli_restore(args):
+    if not args.yes:
+        raise SystemExit(f"⚠️ {DB_PATH} sera remplacée par {args.backup}. Arrête le bot puis relance avec --yes.")
+    previous = restore_db(args.backup)
+    print(f"✅ {DB_PATH} restaurée depuis {args.backup} (ancienne base : {previous})")
+
+
+def cli_maintenance(args):
+    db_init()
+    print(f"avant : {Maintenance.stats()}")
+    print(f"✅ {MAINTENANCE.run(quiet=True, convert=args.convertir)}")
+    print(f"après : {Maintenance.stats()}")
+
+
+def replay_games(seed: str, game: str, user_id: int, client_seed: str, nonce: int, count: int, rounds: int,
+                 mise: int, choix: str, streak: int = 0) -> Iterator[Tuple[int, List[Tuple[str, int, int]]]]:
+    """returns: (nonce, [(tirage, mise engagée, gain net)] par tour) pour `count` parties consécutives du joueur"""
+    for n in range(nonce, nonce + count):
+        rng = rng_for(seed, game, user_id, client_seed, n)
+        state = {"streak": streak}
+        yield n, [fair_round(game, rng, mise, choix, state) for _ in range(rounds)]
+
+
+def cli_replay(args):
+    game, seed_id, nonce = args.game, args.seed_id, args.nonce
+    user_id, client_seed = args.user, args.client_seed
+    if args.seed is None:
+        STORE.init()
+    if args.log_id is not None:
+        row = STORE.get_ledger_row(args.log_id)
+        if row is None or row["seed_id"] is None:
+            raise SystemExit(f"❌ ligne de ledger {args.log_id} introuvable ou sans tirage")
+        seed_id, nonce = int(row["seed_id"]), int(row["nonce"])
+        user_id, client_seed = int(row["user_id"]), row["client_seed"]
+        print(f"ledger #{row['id']} : joueur {row['user_id']}, {row['action']}, {int(row['delta']):+d}")
+    seed = args.seed
+    if seed is None:
+        if seed_id is None:
+            raise SystemExit("❌ il faut un log_id, --seed-id ou --seed")
+        rec = STORE.get_rng_seed(seed_id)
+        if rec is None:
+            raise SystemExit(f"❌ graine #{seed_id} inconnue")
+        seed, game = rec["seed"], game or rec["game"]
+        ok = rng_commitment(seed) == rec["commitment"]
+        state = "révélée" if rec["revealed_at"] else "pas encore révélée"
+        print(f"graine #{seed_id} ({rec['game']}, {state}) : sha256 {'✅ conforme' if ok else '❌ NON CONFORME'}")
+    if game not in RNG_GAMES:
+        raise SystemExit(f"❌ --game parmi {', '.join(RNG_GAMES)}")
+
+    # la mise et le choix ne sont pas dans le ledger : sans --mise on n'affiche que le tirage
+    show_net = args.log_id is None or args.mise is not None
+    mise = args.mise or 100
+    t0 = time.perf_counter()
+    if args.count == 1:
+        for n, rounds in replay_games(seed, game, user_id, client_seed, nonce, 1, args.rounds, mise, args.choix, args.streak):
+            for i, (label, staked, net) in enumerate(rounds, start=1):
+                print(f"{game} #{n} tour {i} : {label}" + (f" → {net:+d} (mise {staked})" if staked and show_net else ""))
+            if len(rounds) > 1 and show_net:
+                print(f"bilan : {sum(net for _, _, net in rounds):+d}")
+        return
+
+    # lot : RTP mesuré sur `count` parties consécutives (simulateur)
+    staked = net = played = 0
+    for _, rounds in replay_games(seed, game, user_id, client_seed, nonce, args.count, args.rounds, mise, args.choix, args.streak):
+        for _, s, r in rounds:
+            staked += s
+            net += r
+            played += 1
+    dt = time.perf_counter() - t0
+    rtp = (staked + net) / staked if staked else 0.0
+    print(
+        f"{game} : {fmt_int(args.count)} parties, {fmt_int(played)} tours, mise {fmt_int(staked)}, "
+        f"net {net:+d} → RTP {rtp:.4%} ({fmt_int(int(played / max(dt, 1e-9)))} tours/s)"
+    )
+
+
+def cli_store_daemon(args):
+    asyncio.run(run_store_daemon(args.socket))
+
+
+def cli_cluster(args):
+    shards = args.shards or args.processes
+    if shards < args.processes:
+        raise SystemExit("❌ Il faut au moins un shard par process.")
+    run_cluster(args.processes, shards, args.socket, args.db)
+
+
+def build_cli() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="main.py", description="Coinsbot (sans commande : lance le bot)")
+    parser.add_argument("--db", default=None, help=f"base SQLite (défaut : {DB_PATH})")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("airdrop", help="Créditer tous les joueurs (ou une liste d'ids)")
+    p.add_argument("amount", type=int)
+    p.add_argument("--users-file", help="un user_id par ligne")
+    p.set_defaults(func=cli_airdrop)
+
+    p = sub.add_parser("season-reset", help="Archiver puis remettre l'économie à zéro")
+    p.add_argument("season")
+    p.set_defaults(func=cli_season_reset)
+
+    p = sub.add_parser("import-balances", help="Importer des soldes depuis un CSV user_id,balance")
+    p.add_argument("csv")
+    p.add_argument("--mode", choices=("set", "add"), default="set")
+    p.set_defaults(func=cli_import_balances)
+
+    p = sub.add_parser("export", help="Exporter les tables (CSV/JSONL gzip, parquet) sans copier la base")
+    p.add_argument("tables", nargs="*", metavar="table", help=f"parmi {', '.join(EXPORT_TABLES)} (défaut : toutes)")
+    p.add_argument("--format", choices=tuple(EXPORT_FORMATS), default="csv")
+    p.add_argument("--out", help=f"dossier de sortie (défaut : {EXPORT_DIR}/<horodatage>)")
+    p.add_argument("--since", type=_cli_ts, help="logs à partir de (unix ou ISO)")
+    p.add_argument("--until", type=_cli_ts, help="logs avant (unix ou ISO)")
+    p.set_defaults(func=cli_export)
+
+    p = sub.add_parser("backup", help="Sauvegarde à chaud vérifiée (rotation dans backups/)")
+    p.add_argument("--out", help="fichier de sortie (pas de rotation)")
+    p.set_defaults(func=cli_backup)
+
+    p = sub.add_parser("restore", help="Restaurer une sauvegarde (bot arrêté)")
+    p.add_argument("backup")
+    p.add_argument("--yes", action="store_true", help="confirmer le remplacement")
+    p.set_defaults(func=cli_restore)
+
+    p = sub.add_parser("maintenance", help="Passage complet de maintenance (ANALYZE, vacuum, checkpoint)")
+    p.add_argument(
+        "--convertir", action="store_true",
+        help="convertir la base en auto_vacuum=INCREMENTAL (VACUUM complet, bot arrêté)",
+    )
+    p.set_defaults(func=cli_maintenance)
+
+    p = sub.add_parser("replay", help="Re-dériver le tirage d'une partie, ou le RTP sur un lot de nonces")
+    p.add_argument("log_id", nargs="?", type=int, help="id de la ligne de ledger (logs) à rejouer")
+    p.add_argument("--seed-id", type=int, help="graine enregistrée (rng_seeds)")
+    p.add_argument("--seed", help="graine brute (simulation sans base)")
+    p.add_argument("--game", choices=RNG_GAMES)
+    p.add_argument("--nonce", type=int, default=0, help="nonce du joueur sous la graine")
+    p.add_argument("--user", type=int, default=0, help="id du joueur (sans log_id)")
+    p.add_argument("--client-seed", default="", help="graine client du joueur (sans log_id)")
+    p.add_argument("--count", type=int, default=1, help="parties consécutives à partir de --nonce (> 1 : RTP du lot)")
+    p.add_argument("--rounds", type=int, default=1, help="tours par partie (sessions autoplay)")
+    p.add_argument("--mise", type=int, default=None, help="mise par tour (défaut 100 ; avec log_id : tirage seul)")
+    p.add_argument("--choix", default="", help="roulette : bulletin (rouge:100 17:50) ; nombre : 1-10 ; rps : pierre/feuille/ciseaux")
+    p.add_argument("--streak", type=int, default=0, help="cf : série de victoires au départ")
+    p.set_defaults(func=cli_replay)
+
+    p = sub.add_parser("store-daemon", help="Démon de stockage (écrivain unique) pour les process de shards")
+    p.add_argument("--socket", default=STORE_SOCKET)
+    p.set_defaults(func=cli_store_daemon)
+
+    p = sub.add_parser("cluster", help="Démon de stockage + N process de bot (AutoShardedBot)")
+    p.add_argument("--processes", type=int, default=2)
+    p.add_argument("--shards", type=int, default=0, help="nombre total de shards (défaut : un par process)")
+    p.add_argument("--socket", default=STORE_SOCKET)
+    p.set_defaults(func=cli_cluster)
+    return parser
+
+
+def cli(argv: List[str]):
+    global DB_PATH
+    args = build_cli().parse_args(argv)
+    if args.db:
+        DB_PATH = args.db
+    if args.command is None:
+        bot.run(TOKEN)
+    else:
+        args.func(args)
+
+
+if __name__ == "__main__":
+    cli(sys.argv[1:])
\ No newline at end of file